@@ -3,7 +3,7 @@ import os
 from crewai import Agent
 from tools.web_search_tool import WebSearchTool
 from tools.web_scraper_tool import WebScraperTool 
-from crewai_tools import TXTSearchTool 
+from tools.knowledge_search_tool import get_knowledge_search_tool
 
 import config
 
@@ -12,17 +12,19 @@ import config
 
 class Agents:
 
-    def __init__(self, llm, search_all_documents_tool, search_specific_document_tool, knowledge_base_dir="knowledge_bases/"):
+    def __init__(self, llm, search_all_documents_tool, search_specific_document_tool, search_across_investments_tool=None, knowledge_base_dir="knowledge_bases/"):
         self.llm = llm
         self.web_search_tool = WebSearchTool()
         self.web_scraper_tool = WebScraperTool()
         self.search_all_documents_tool = search_all_documents_tool
         self.search_specific_document_tool = search_specific_document_tool
+        # Optional, only available once the cross-investment index is built
+        self.portfolio_tools = [search_across_investments_tool] if search_across_investments_tool else []
         self.knowledge_base_dir = knowledge_base_dir
 
     def financial_analyst_agent(self):
         knowledge_base_path = os.path.join(self.knowledge_base_dir, "financial_analysis.txt")
-        knowledge_search_tool = TXTSearchTool(txt=config.KB_PATH_FINANCIAL_ANALYST)
+        knowledge_search_tool = get_knowledge_search_tool(config.KB_PATH_FINANCIAL_ANALYST)
         
         return Agent(
             name="Financial Analyst",
@@ -40,13 +42,14 @@ class Agents:
                 self.web_scraper_tool,
                 self.search_all_documents_tool, 
                 self.search_specific_document_tool,
+                *self.portfolio_tools,
                 knowledge_search_tool]
             # TODO: memory?
         )
     
     def eb5_program_specialist_agent(self):
         knowledge_base_path = os.path.join(self.knowledge_base_dir, "eb5_program.txt")
-        knowledge_search_tool = TXTSearchTool(txt=config.KB_PATH_EB5_PROGRAM)
+        knowledge_search_tool = get_knowledge_search_tool(config.KB_PATH_EB5_PROGRAM)
 
         return Agent(
             name="EB-5 Program Specialist",
@@ -62,6 +65,7 @@ class Agents:
                 self.web_scraper_tool,
                 self.search_all_documents_tool,
                 self.search_specific_document_tool,
+                *self.portfolio_tools,
                 knowledge_search_tool 
             ]
             # TODO: memory?
@@ -69,7 +73,7 @@ class Agents:
     
     def immigration_expert_agent(self):
         knowledge_base_path = os.path.join(self.knowledge_base_dir, "immigration_law.txt")
-        knowledge_search_tool = TXTSearchTool(txt=config.KB_PATH_IMMIGRATION_LAW)
+        knowledge_search_tool = get_knowledge_search_tool(config.KB_PATH_IMMIGRATION_LAW)
 
         return Agent(
             name="Immigration Law Expert",
@@ -87,6 +91,7 @@ class Agents:
                 self.web_scraper_tool,
                 self.search_all_documents_tool,
                 self.search_specific_document_tool,
+                *self.portfolio_tools,
                 knowledge_search_tool 
             ]
             # TODO: memory?
@@ -94,7 +99,7 @@ class Agents:
     
     def risk_assessor_agent(self):
         knowledge_base_path = os.path.join(self.knowledge_base_dir, "risk_assessment.txt")
-        knowledge_search_tool = TXTSearchTool(txt=config.KB_PATH_RISK_ASSESSMENT)
+        knowledge_search_tool = get_knowledge_search_tool(config.KB_PATH_RISK_ASSESSMENT)
 
         return Agent(
             name="Risk Assessor",
@@ -110,6 +115,7 @@ class Agents:
                 self.web_scraper_tool,
                 self.search_all_documents_tool,
                 self.search_specific_document_tool,
+                *self.portfolio_tools,
                 knowledge_search_tool 
             ]
             # TODO: memory?
@@ -0,0 +1,14 @@
+from .scheduler import AnalysisScheduler
+from .results_store import ResultsStore
+
+__all__ = ['AnalysisScheduler', 'ResultsStore', 'analyze_investments', 'limit_llm_concurrency']
+
+def __getattr__(name):
+    # The runner imports crewai and the limiter langchain, so they are only imported when used
+    if name == 'analyze_investments':
+        from .runner import analyze_investments
+        return analyze_investments
+    if name == 'limit_llm_concurrency':
+        from .limits import limit_llm_concurrency
+        return limit_llm_concurrency
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,116 @@
+import time
+import logging
+import threading
+from langchain_core.callbacks import BaseCallbackHandler
+
+import config
+
+logger = logging.getLogger(__name__)
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def backend_name(llm):
+    """Returns the backend an LLM calls, as named in `config.LLM_CONCURRENCY_LIMITS` (e.g. 'ollama')."""
+    llm_type = str(getattr(llm, '_llm_type', type(llm).__name__)).lower()
+    for backend in config.LLM_CONCURRENCY_LIMITS:
+        if backend in llm_type:
+            return backend
+    return llm_type
+
+
+def get_backend_limiter(backend):
+    """Returns the process-wide limiter of a backend, shared by every crew that calls it."""
+    with _limiters_lock:
+        if backend not in _limiters:
+            limit = config.LLM_CONCURRENCY_LIMITS.get(backend, config.LLM_DEFAULT_CONCURRENCY)
+            _limiters[backend] = BackendLimiter(backend, limit)
+        return _limiters[backend]
+
+
+def limit_llm_concurrency(llm):
+    """Makes every call of `llm` go through its backend's limiter. Returns the limiter."""
+    limiter = get_backend_limiter(backend_name(llm))
+    callbacks = list(llm.callbacks or [])
+    if limiter not in callbacks:
+        llm.callbacks = callbacks + [limiter]
+    logger.info(f"LLM calls to backend '{limiter.backend}' are limited to {limiter.limit} at a time")
+    return limiter
+
+
+class BackendLimiter(BaseCallbackHandler):
+    """
+    Caps the number of concurrent calls to one LLM backend, across all crews.
+
+    Attached to an LLM as a callback: the slot is taken when a call starts (blocking the
+    calling crew until one frees up) and released when it ends or fails. Crews therefore
+    only wait for the backend while actually calling it, not while running tools.
+
+    A thread holds at most one slot: the prompts of a batch call (`generate` with several
+    prompts, which starts them all before running any) share the slot of their thread,
+    and the backend's client bounds their concurrency itself.
+    """
+
+    run_inline = True # Must run in the calling thread, so that acquiring blocks the call
+
+    def __init__(self, backend, limit):
+        self.backend = backend
+        self.limit = limit
+        self._semaphore = threading.BoundedSemaphore(limit)
+        self._lock = threading.Lock()
+        self._owners = {} # run_id -> thread holding the slot it runs in
+        self._holds = {} # thread -> number of its runs in flight
+        self.calls = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _acquire(self, run_id):
+        thread = threading.get_ident()
+        with self._lock:
+            held = self._holds.get(thread, 0) > 0
+        waited = 0.0
+        if not held:
+            start = time.monotonic()
+            self._semaphore.acquire()
+            waited = time.monotonic() - start
+        with self._lock:
+            self._owners[run_id] = thread
+            self._holds[thread] = self._holds.get(thread, 0) + 1
+            self.calls += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+
+    def _release(self, run_id):
+        with self._lock:
+            thread = self._owners.pop(run_id, None)
+            if thread is None:
+                return
+            self._holds[thread] -= 1
+            if self._holds[thread]:
+                return
+            del self._holds[thread]
+        self._semaphore.release()
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._acquire(run_id)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._acquire(run_id)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._release(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._release(run_id)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': self.backend,
+                'limit': self.limit,
+                'calls': self.calls,
+                'in_flight': len(self._owners),
+                'mean_wait_s': self.total_wait / self.calls if self.calls else 0.0,
+                'max_wait_s': self.max_wait,
+            }
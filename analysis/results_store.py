@@ -0,0 +1,133 @@
+import os
+import json
+import time
+import logging
+import threading
+
+import config
+
+logger = logging.getLogger(__name__)
+
+RESULTS_FILE = "results.jsonl"
+INDEX_FILE = "results_index.json"
+EXCERPT_CHARS = 500 # of each task output, in the cross-investment index
+
+
+class ResultsStore:
+    """
+    Append-only store of the analysis results of a report, written as they're produced.
+
+    Each investment has a `<report_dir>/<name>/results.jsonl`: one record per task, appended
+    as soon as the task completes (from its crewai callback), then one for the investment's
+    result. With `fsync='record'` (`config.RESULTS_FSYNC`), every record is on disk before
+    the crew moves on, so a crash loses at most the task in progress; `'none'` leaves it to
+    the OS. A run restarted after a crash reads the completed tasks back and only runs the
+    others. A truncated last line (a crash mid-write) is ignored.
+
+    `build_index` collects the results of every investment into `<report_dir>/results_index.json`,
+    for comparisons across investments without reading each crew's output files.
+    """
+
+    def __init__(self, report_dir, fsync=None):
+        """
+        Args:
+            report_dir (str): The report directory; one subdirectory per investment.
+            fsync (str, optional): 'record' (fsync each record) or 'none'. Defaults to `config.RESULTS_FSYNC`.
+        """
+        self.report_dir = report_dir
+        self.fsync = fsync or config.RESULTS_FSYNC
+        if self.fsync not in ('record', 'none'):
+            raise ValueError(f"Unknown fsync policy {self.fsync!r}, expected 'record' or 'none'")
+        self._lock = threading.Lock() # Tasks of a crew may complete concurrently
+
+    def results_file(self, investment):
+        return os.path.join(self.report_dir, investment['name'], RESULTS_FILE)
+
+    def _append(self, investment, record):
+        path = self.results_file(investment)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        line = json.dumps(dict(record, time=time.time())) + "\n"
+        with self._lock:
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+                if self.fsync == 'record':
+                    os.fsync(f.fileno())
+
+    def records(self, investment):
+        """Returns the investment's records, oldest first."""
+        path = self.results_file(investment)
+        if not os.path.exists(path):
+            return []
+        records = []
+        with open(path, 'r', encoding='utf-8') as f:
+            for number, line in enumerate(f, 1):
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    logger.warning(f"Ignoring truncated record {number} of {path}")
+        return records
+
+    def record_task(self, investment, task_key, agent, output):
+        """Persists the output of a completed task."""
+        self._append(investment, {'type': 'task', 'task': task_key, 'agent': agent, 'output': output})
+
+    def record_result(self, investment, result):
+        """Persists the result of the whole investment, once all its tasks completed."""
+        self._append(investment, {'type': 'result', 'result': result})
+
+    def completed_tasks(self, investment):
+        """Returns {task key: task record} of the investment's completed tasks (the latest record of each)."""
+        return {record['task']: record for record in self.records(investment) if record.get('type') == 'task'}
+
+    def result(self, investment):
+        """Returns the investment's latest recorded result, or None."""
+        results = [record['result'] for record in self.records(investment) if record.get('type') == 'result']
+        return results[-1] if results else None
+
+    def task_callback(self, investment, task_key, agent):
+        """Returns a crewai task callback persisting the task's output."""
+        def callback(output):
+            raw = getattr(output, 'raw', None)
+            self.record_task(investment, task_key, agent, raw if raw is not None else str(output))
+            logger.info(f"{investment['name']}: saved the output of {task_key}")
+        return callback
+
+    def build_index(self, investments):
+        """Writes the cross-investment index of the results recorded so far, and returns it.
+
+        The index lists, for each task, every investment's output (and an excerpt), so
+        that e.g. all the risk assessments can be compared side by side.
+        """
+        index = {'investments': [], 'tasks': {}}
+        for investment in investments:
+            completed = self.completed_tasks(investment)
+            result = self.result(investment)
+            index['investments'].append({
+                'id': investment['id'],
+                'name': investment['name'],
+                'complete': result is not None,
+                'tasks': sorted(completed),
+                'token_usage': (result or {}).get('token_usage', {}),
+            })
+            for task_key, record in completed.items():
+                index['tasks'].setdefault(task_key, {})[investment['name']] = {
+                    'agent': record['agent'],
+                    'excerpt': record['output'][:EXCERPT_CHARS],
+                    'output': record['output'],
+                }
+
+        os.makedirs(self.report_dir, exist_ok=True)
+        path = os.path.join(self.report_dir, INDEX_FILE)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp_path, path)
+        return index
+
+
+def compare(report_dir, task_key):
+    """Returns {investment name: output} of a task across the investments of a report's index."""
+    with open(os.path.join(report_dir, INDEX_FILE), 'r', encoding='utf-8') as f:
+        index = json.load(f)
+    return {name: entry['output'] for name, entry in index['tasks'].get(task_key, {}).items()}
@@ -0,0 +1,205 @@
+import os
+import json
+import logging
+from crewai import Crew, Process
+from crewai.tasks.task_output import TaskOutput
+
+from context_assembler import ContextAssembler, SearchAllDocumentsTool, SearchSpecificDocumentTool, SearchAcrossInvestmentsTool
+from context_assembler.token_budget import TokenBudget
+from agents import Agents
+from tools.web_search import get_web_search
+from instrumentation import get_tracer, trace_llm
+from tasks import create_financial_analyst_task, create_immigration_expert_task, create_risk_assessor_task, create_eb5_program_specialist_task
+
+import config
+from .limits import backend_name, limit_llm_concurrency
+from .results_store import ResultsStore
+from .scheduler import AnalysisScheduler
+from .task_graph import plan_task_graph
+
+logger = logging.getLogger(__name__)
+
+
+class InvestmentAnalyzer:
+    """
+    Builds and runs the crew analyzing one investment.
+
+    The context assembler and its search tools are shared by all crews (they are
+    thread-safe); agents are created per crew, since an agent keeps per-run state.
+
+    Each task's output is saved to the results store as soon as the task completes.
+    Tasks completed by an earlier (interrupted) run aren't run again: their saved
+    output is given to the tasks that depend on them.
+    """
+
+    def __init__(self, llm, report_dir, personal_info, store=None, preprocessed_dir='preprocessing/outputs/preprocessed_data'):
+        self.llm = llm
+        self.report_dir = report_dir
+        self.personal_info = personal_info
+        self.store = store or ResultsStore(report_dir)
+        # Prompts are measured (and the overview fit) in the LLM's tokens
+        self.token_budget = TokenBudget(backend_name(llm))
+
+        # Processed input
+        self.assembler = ContextAssembler(preprocessed_dir)
+
+        # Initialize tools (ones related to context assembler)
+        self.search_all_docs_tool = SearchAllDocumentsTool(self.assembler)
+        self.search_specific_doc_tool = SearchSpecificDocumentTool(self.assembler)
+        self.search_across_investments_tool = SearchAcrossInvestmentsTool(self.assembler)
+
+    def __call__(self, investment):
+        investment_name = investment['name']
+        investment_id = investment['id']
+        investment_overview = self.assembler.get_investment_overview(investment_id, token_budget=self.token_budget)
+
+        # Create investment directory within the report directory
+        investment_dir = os.path.join(self.report_dir, investment_name)
+        os.makedirs(investment_dir, exist_ok=True)
+        log_file_path = os.path.join(investment_dir, "log.txt")
+
+        # Task specific output files
+        financial_analysis_output_file = os.path.join(investment_dir, "financial_analysis_results.json")
+        immigration_expert_output_file = os.path.join(investment_dir, "immigration_expert_results.json")
+        risk_assessment_output_file = os.path.join(investment_dir, "risk_assessment_results.json")
+        eb5_program_compliance_output_file = os.path.join(investment_dir, "eb5_program_compliance_results.json")
+
+        # Create agents (4 specialist agents)
+        agents = Agents(self.llm, self.search_all_docs_tool, self.search_specific_doc_tool, self.search_across_investments_tool)
+        financial_analyst = agents.financial_analyst_agent()
+        immigration_expert = agents.immigration_expert_agent()
+        risk_assessor = agents.risk_assessor_agent()
+        eb5_specialist = agents.eb5_program_specialist_agent()
+
+        # Create agent-specific tasks
+        financial_analysis_task = create_financial_analyst_task(
+            investment_id, investment_name, investment_overview, financial_analyst,
+            self.personal_info, financial_analysis_output_file
+        )
+        immigration_expert_analysis_task = create_immigration_expert_task(
+            investment_id, investment_name, investment_overview, immigration_expert,
+            self.personal_info, immigration_expert_output_file
+        )
+        eb5_program_compliance_analysis_task = create_eb5_program_specialist_task(
+            investment_id, investment_name, investment_overview, eb5_specialist,
+            self.personal_info, eb5_program_compliance_output_file
+        )
+        # The risk assessment builds on the other experts' findings, so it runs last
+        risk_assessment_analysis_task = create_risk_assessor_task(
+            investment_id, investment_name, investment_overview, risk_assessor,
+            self.personal_info, risk_assessment_output_file,
+            [financial_analysis_task, immigration_expert_analysis_task, eb5_program_compliance_analysis_task]
+        )
+
+        task_keys = {
+            "financial_analysis": financial_analysis_task,
+            "immigration_expert": immigration_expert_analysis_task,
+            "eb5_program_compliance": eb5_program_compliance_analysis_task,
+            "risk_assessment": risk_assessment_analysis_task,
+        }
+
+        # Resume: completed tasks keep their saved output, the others save theirs on completion
+        completed = self.store.completed_tasks(investment)
+        tasks = []
+        for key, task in task_keys.items():
+            if key in completed:
+                task.output = TaskOutput(description=task.description, raw=completed[key]['output'], agent=task.agent.role)
+            else:
+                task.callback = self.store.task_callback(investment, key, task.agent.role)
+                tasks.append(task)
+        if completed:
+            print(f"{investment_name}: resuming, {len(completed)} of {len(task_keys)} tasks already completed")
+
+        if tasks and config.ANALYSIS_TASK_GRAPH:
+            # The 3 independent experts run concurrently; the risk assessor starts once they're all done
+            tasks = plan_task_graph(tasks)
+
+        if not tasks:
+            return self._result(investment, task_keys, None)
+
+        # Measure every task prompt before any is sent
+        self.token_budget.report(
+            investment_name,
+            {task.agent.role: f"{task.description}\n{task.expected_output}" for task in tasks},
+            pieces={'investment overview': investment_overview, 'personal info': self.personal_info})
+
+        # Crew
+        crew = Crew(
+            agents=[
+                financial_analyst,
+                immigration_expert,
+                eb5_specialist,
+                risk_assessor
+                ],
+            tasks=tasks,
+            verbose=True,
+            output_log_file=log_file_path, # output to log file
+            full_output=True, # didn't work for me, but each task has output_file too.
+            process=Process.sequential, # runs asynchronous tasks concurrently (see task_graph.py)
+            memory=True,
+        )
+
+        # Run the crew
+        result = crew.kickoff()
+        return self._result(investment, task_keys, result)
+
+    def _result(self, investment, task_keys, crew_result):
+        """Returns (and saves) the investment's result, from the saved output of each task."""
+        completed = self.store.completed_tasks(investment)
+        missing = [key for key in task_keys if key not in completed]
+        if missing:
+            raise RuntimeError(f"Tasks without a saved output: {', '.join(missing)}")
+        result = {
+            "raw": completed["risk_assessment"]['output'], # The last task, building on the others
+            "json_dict": (crew_result or {}).get('json_dict', {}),
+            "tasks_output": [
+                {
+                    "task_id": key,
+                    "output": completed[key]['output'],
+                    "agent_name": completed[key]['agent']
+                } for key in task_keys
+            ],
+            "token_usage": (crew_result or {}).get('token_usage', {})
+        }
+        self.store.record_result(investment, result)
+        return result
+
+
+def analyze_investments(investments, llm, report_name, max_concurrent=None):
+    """Analyzes `investments` concurrently (see `AnalysisScheduler`), returning their results in order.
+
+    Args:
+        investments (list[dict]): The investments to analyze, as in options.json.
+        llm: The LLM used by every agent.
+        report_name (str): Name of the report; results are written to outputs/<report_name>.
+        max_concurrent (int, optional): Crews run at a time. Defaults to `config.ANALYSIS_MAX_CONCURRENT_CREWS`.
+
+    Returns:
+        list: One result dict per investment (None for failed ones).
+    """
+    # Load personal information
+    with open('secrets/eb5_personal_info.txt', encoding='utf-8') as f:
+        personal_info = f.read()
+
+    # Create a report directory
+    report_dir = os.path.join("outputs", report_name)
+    os.makedirs(report_dir, exist_ok=True)
+
+    limiter = limit_llm_concurrency(llm)
+    trace_llm(llm, limiter.backend)
+    store = ResultsStore(report_dir)
+    analyzer = InvestmentAnalyzer(llm, report_dir, personal_info, store)
+    scheduler = AnalysisScheduler(analyzer, report_dir, max_concurrent=max_concurrent, limiters=[limiter])
+    results = scheduler.run(investments)
+    index = store.build_index(investments)
+    print(f"Results of {sum(i['complete'] for i in index['investments'])} investment(s) indexed in {report_dir}/results_index.json")
+    if hasattr(llm, 'stats'): # e.g. time to first token of the local LLM (see ollama_wrapper.py)
+        print(f"LLM stats: {json.dumps(llm.stats())}")
+    if hasattr(getattr(llm, 'cache', None), 'stats'): # see llm_cache/
+        print(f"LLM cache: {json.dumps(llm.cache.stats())}")
+    print(f"Web search: {json.dumps(get_web_search().stats())}")
+    trace_file = get_tracer().write_trace(report_dir) # Chrome trace, and a summary table beside it
+    if trace_file:
+        print(f"Trace written to {trace_file}:\n{get_tracer().format_summary()}")
+    print("Completed!")
+    return results
@@ -0,0 +1,178 @@
+import os
+import json
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_FILE = "analysis_results.json"
+SCHEDULE_FILE = "schedule.json"
+
+
+class InvestmentRun:
+    """Status and timing of the analysis of one investment."""
+
+    def __init__(self, investment):
+        self.investment = investment
+        self.status = "pending" # pending -> running -> done | failed; or resumed (from a checkpoint)
+        self.started = None
+        self.finished = None
+        self.error = None
+        self.result = None
+
+    @property
+    def name(self):
+        return self.investment['name']
+
+    @property
+    def elapsed(self):
+        if self.started is None:
+            return None
+        return (self.finished or time.time()) - self.started
+
+    def to_dict(self):
+        return {
+            'id': self.investment['id'],
+            'name': self.name,
+            'status': self.status,
+            'started': self.started,
+            'finished': self.finished,
+            'elapsed_s': self.elapsed,
+            'error': self.error,
+        }
+
+
+class AnalysisScheduler:
+    """
+    Analyzes several investments concurrently, one crew per investment.
+
+    Up to `max_concurrent` crews run at a time, each in its own thread. Crews spend most
+    of their time in tool calls (searches, scraping), so while one waits on a tool
+    another can use the LLM; how many LLM calls actually run at once is capped per
+    backend by the limiters (see `limits.py`), not by the number of crews.
+
+    The result of each investment is checkpointed to `<report_dir>/<name>/analysis_results.json`
+    as soon as its crew finishes; investments with a checkpoint are not analyzed again.
+    (Within a crew, each task's output is saved as soon as it completes, see `results_store.py`.)
+    The status and timing of every investment is kept up to date in `<report_dir>/schedule.json`.
+    """
+
+    def __init__(self, analyze, report_dir, max_concurrent=None, limiters=()):
+        """
+        Args:
+            analyze (Callable[[dict], dict]): Analyzes one investment (from options.json), returning
+                its JSON-serializable result.
+            report_dir (str): The report directory; one subdirectory per investment.
+            max_concurrent (int, optional): Crews run at a time. Defaults to `config.ANALYSIS_MAX_CONCURRENT_CREWS`.
+            limiters (list[BackendLimiter], optional): LLM backend limiters, whose stats are reported.
+        """
+        self.analyze = analyze
+        self.report_dir = report_dir
+        self.max_concurrent = max_concurrent or config.ANALYSIS_MAX_CONCURRENT_CREWS
+        self.limiters = list(limiters)
+        self.runs = []
+        self._lock = threading.Lock()
+
+    def checkpoint_file(self, investment):
+        return os.path.join(self.report_dir, investment['name'], CHECKPOINT_FILE)
+
+    def run(self, investments):
+        """Analyzes `investments`, returning their results in order (None for failed ones)."""
+        self.runs = [InvestmentRun(investment) for investment in investments]
+        self.start = time.time()
+        pending = []
+        for run in self.runs:
+            checkpoint_file = self.checkpoint_file(run.investment)
+            if os.path.exists(checkpoint_file):
+                with open(checkpoint_file, 'r') as f:
+                    run.result = json.load(f)
+                run.status = "resumed"
+                print(f"Loaded existing analysis for {run.name} from {checkpoint_file}")
+            else:
+                pending.append(run)
+
+        print(f"Analyzing {len(pending)} investment(s), {min(self.max_concurrent, len(pending))} at a time "
+              f"({len(self.runs) - len(pending)} resumed from checkpoints)")
+        self.write_schedule()
+        with ThreadPoolExecutor(max_workers=self.max_concurrent, thread_name_prefix="crew") as pool:
+            list(pool.map(self._run_one, pending))
+
+        self.write_schedule()
+        print(self.summary())
+        return [run.result for run in self.runs]
+
+    def _run_one(self, run):
+        self._transition(run, "running")
+        try:
+            result = self.analyze(run.investment)
+            self.save_checkpoint(run.investment, result)
+            run.result = result
+            self._transition(run, "done")
+        except Exception as e:
+            logger.error(f"Analysis of {run.name} failed: {str(e)}", exc_info=True)
+            run.error = str(e)
+            self._transition(run, "failed")
+
+    def save_checkpoint(self, investment, result):
+        """Writes a result atomically, so that an interrupted write never leaves a partial checkpoint."""
+        checkpoint_file = self.checkpoint_file(investment)
+        os.makedirs(os.path.dirname(checkpoint_file), exist_ok=True)
+        tmp_file = checkpoint_file + ".tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(result, f, indent=4)
+        os.replace(tmp_file, checkpoint_file)
+
+    def _transition(self, run, status):
+        with self._lock:
+            if status == "running":
+                run.started = time.time()
+            elif status in ("done", "failed"):
+                run.finished = time.time()
+            run.status = status
+            counts = self.counts()
+            finished = counts['done'] + counts['failed']
+            total = finished + counts['running'] + counts['pending']
+            elapsed = f" in {run.elapsed:.0f}s" if run.finished else ""
+            message = (f"[{finished}/{total}] {run.name}: {status}{elapsed} "
+                       f"({counts['running']} running, {counts['pending']} pending)")
+            logger.info(message)
+            print(message)
+            self.write_schedule()
+
+    def counts(self):
+        counts = dict.fromkeys(("pending", "running", "done", "failed", "resumed"), 0)
+        for run in self.runs:
+            counts[run.status] += 1
+        return counts
+
+    def write_schedule(self):
+        os.makedirs(self.report_dir, exist_ok=True)
+        schedule = {
+            'max_concurrent': self.max_concurrent,
+            'counts': self.counts(),
+            'investments': [run.to_dict() for run in self.runs],
+            'llm_backends': [limiter.stats() for limiter in self.limiters],
+        }
+        tmp_file = os.path.join(self.report_dir, SCHEDULE_FILE + ".tmp")
+        with open(tmp_file, 'w') as f:
+            json.dump(schedule, f, indent=4)
+        os.replace(tmp_file, os.path.join(self.report_dir, SCHEDULE_FILE))
+
+    def summary(self):
+        """Returns a table of the status and time of each investment, and the LLM backends' wait times."""
+        width = max([len(run.name) for run in self.runs] + [10])
+        lines = [f"{'investment':<{width}}  {'status':<8}{'time':>10}"]
+        for run in self.runs:
+            elapsed = f"{run.elapsed:.0f}s" if run.elapsed is not None else "-"
+            lines.append(f"{run.name:<{width}}  {run.status:<8}{elapsed:>10}"
+                         + (f"  {run.error}" if run.error else ""))
+        lines.append(f"Total: {time.time() - self.start:.0f}s wall-clock, "
+                     f"{sum(run.elapsed or 0 for run in self.runs):.0f}s of crew time")
+        for stats in (limiter.stats() for limiter in self.limiters):
+            lines.append(f"LLM backend {stats['backend']} (limit {stats['limit']}): {stats['calls']} calls, "
+                         f"mean wait {stats['mean_wait_s']:.1f}s, max wait {stats['max_wait_s']:.1f}s")
+        return "\n".join(lines)
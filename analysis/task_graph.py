@@ -0,0 +1,50 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def plan_task_graph(tasks):
+    """
+    Schedules a crew's tasks as a dependency graph rather than one after another.
+
+    A task depends on the tasks in its `context`. Tasks are ordered so that every task
+    comes after its dependencies, and every task that has no dependencies of its own but
+    is waited for by a later task is made asynchronous. With `Process.sequential`, crewai
+    starts asynchronous tasks in their own thread and moves straight on to the next task;
+    a task with asynchronous tasks in its context waits for them to finish, then runs.
+    Independent tasks therefore run concurrently, and the crew takes as long as its
+    longest chain of dependent tasks (the critical path) instead of the sum of all tasks.
+
+    Tasks that nothing waits for stay synchronous, since crewai would never join them.
+    A dependency outside `tasks` that already has an output (e.g. a task completed by an
+    earlier run, see `results_store.py`) is satisfied.
+
+    Args:
+        tasks (list): The crew's tasks (crewai `Task`s), in their preferred order.
+
+    Returns:
+        list: The tasks, in an order where each task follows its dependencies.
+
+    Raises:
+        ValueError: If the dependencies have a cycle, or a task depends on an unfinished task not in `tasks`.
+    """
+    ids = {id(task) for task in tasks}
+    completed = {id(dep) for task in tasks for dep in task.context or []
+                 if id(dep) not in ids and getattr(dep, 'output', None) is not None}
+    ordered, placed = [], set(completed)
+    remaining = list(tasks)
+    while remaining:
+        ready = [task for task in remaining if all(id(dep) in placed for dep in task.context or [])]
+        if not ready:
+            unknown = [dep for task in remaining for dep in task.context or [] if id(dep) not in ids]
+            raise ValueError("Task depends on a task outside the crew" if unknown else "Task dependencies have a cycle")
+        for task in ready:
+            ordered.append(task)
+            placed.add(id(task))
+            remaining.remove(task)
+
+    waited_for = {id(dep) for task in ordered for dep in task.context or [] if id(dep) not in completed}
+    for task in ordered:
+        task.async_execution = all(id(dep) in completed for dep in task.context or []) and id(task) in waited_for
+    logger.info(f"Task graph: {sum(task.async_execution for task in ordered)} of {len(ordered)} tasks run concurrently")
+    return ordered
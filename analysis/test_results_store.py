@@ -0,0 +1,45 @@
+import unittest
+import sys
+import os
+import tempfile
+from types import SimpleNamespace
+
+# Add the parent directory to the Python path to allow importing from analysis
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analysis.results_store import ResultsStore, compare
+
+class TestResultsStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store = ResultsStore(self.tmp_dir.name, fsync='record')
+        self.investments = [{'id': '1', 'name': 'A'}, {'id': '2', 'name': 'B'}]
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_resumes_completed_tasks_after_a_crash_mid_write(self):
+        a = self.investments[0]
+        self.store.task_callback(a, 'financial_analysis', 'Financial Analyst')(SimpleNamespace(raw="Sound projections"))
+        self.store.record_task(a, 'financial_analysis', 'Financial Analyst', "Revised projections")
+        self.store.record_task(a, 'risk_assessment', 'Risk Assessor', "Low risk")
+        with open(self.store.results_file(a), 'a') as f:
+            f.write('{"type": "task", "task": "immigr') # Interrupted write
+
+        completed = self.store.completed_tasks(a)
+        self.assertEqual(sorted(completed), ['financial_analysis', 'risk_assessment'])
+        self.assertEqual(completed['financial_analysis']['output'], "Revised projections")
+        self.assertIsNone(self.store.result(a))
+
+    def test_index_compares_tasks_across_investments(self):
+        for investment, risk in zip(self.investments, ["Low risk", "High risk"]):
+            self.store.record_task(investment, 'risk_assessment', 'Risk Assessor', risk)
+        self.store.record_result(self.investments[0], {'raw': "Low risk", 'token_usage': {'total_tokens': 10}})
+
+        index = self.store.build_index(self.investments)
+        self.assertEqual([i['complete'] for i in index['investments']], [True, False])
+        self.assertEqual(compare(self.tmp_dir.name, 'risk_assessment'), {'A': "Low risk", 'B': "High risk"})
+        self.assertEqual(compare(self.tmp_dir.name, 'financial_analysis'), {})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+import threading
+
+# Add the parent directory to the Python path to allow importing from analysis
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analysis.scheduler import AnalysisScheduler
+
+class TestAnalysisScheduler(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.report_dir = self.tmp_dir.name
+        self.investments = [{'id': str(i), 'name': name} for i, name in enumerate(['A', 'B', 'C', 'D'], 1)]
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_runs_concurrently_resumes_and_isolates_failures(self):
+        # B was analyzed by an earlier run
+        os.makedirs(os.path.join(self.report_dir, 'B'))
+        with open(os.path.join(self.report_dir, 'B', 'analysis_results.json'), 'w') as f:
+            json.dump({'raw': 'earlier'}, f)
+
+        # A and C must be running at the same time for either to finish
+        both_running = threading.Barrier(2, timeout=5)
+        def analyze(investment):
+            if investment['name'] in ('A', 'C'):
+                both_running.wait()
+            if investment['name'] == 'D':
+                raise RuntimeError("crew failed")
+            return {'raw': investment['name']}
+
+        scheduler = AnalysisScheduler(analyze, self.report_dir, max_concurrent=2)
+        with open(os.devnull, 'w') as devnull:
+            stdout, sys.stdout = sys.stdout, devnull
+            try:
+                results = scheduler.run(self.investments)
+            finally:
+                sys.stdout = stdout
+
+        self.assertEqual(results, [{'raw': 'A'}, {'raw': 'earlier'}, {'raw': 'C'}, None])
+        with open(os.path.join(self.report_dir, 'C', 'analysis_results.json')) as f:
+            self.assertEqual(json.load(f), {'raw': 'C'})
+        self.assertFalse(os.path.exists(os.path.join(self.report_dir, 'D', 'analysis_results.json')))
+
+        with open(os.path.join(self.report_dir, 'schedule.json')) as f:
+            schedule = json.load(f)
+        self.assertEqual(schedule['counts'], {'pending': 0, 'running': 0, 'done': 2, 'failed': 1, 'resumed': 1})
+        self.assertEqual(schedule['investments'][3]['error'], "crew failed")
+
+if __name__ == '__main__':
+    unittest.main()
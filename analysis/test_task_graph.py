@@ -0,0 +1,45 @@
+import unittest
+import sys
+import os
+from types import SimpleNamespace
+
+# Add the parent directory to the Python path to allow importing from analysis
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analysis.task_graph import plan_task_graph
+
+def task(name, context=None):
+    return SimpleNamespace(name=name, context=context, async_execution=False)
+
+class TestTaskGraph(unittest.TestCase):
+    def test_independent_experts_run_concurrently_before_risk_assessment(self):
+        financial, immigration, eb5 = task('financial'), task('immigration'), task('eb5')
+        risk = task('risk', [financial, immigration, eb5])
+
+        # Listed before its inputs, the risk assessment is still scheduled last
+        ordered = plan_task_graph([risk, financial, immigration, eb5])
+
+        self.assertEqual([t.name for t in ordered], ['financial', 'immigration', 'eb5', 'risk'])
+        self.assertEqual([t.async_execution for t in ordered], [True, True, True, False])
+
+    def test_completed_dependencies_outside_the_crew_are_satisfied(self):
+        financial, immigration, eb5 = task('financial'), task('immigration'), task('eb5')
+        financial.output = "resumed"
+        risk = task('risk', [financial, immigration, eb5])
+
+        ordered = plan_task_graph([risk, immigration, eb5])
+
+        self.assertEqual([t.name for t in ordered], ['immigration', 'eb5', 'risk'])
+        self.assertEqual([t.async_execution for t in ordered], [True, True, False])
+        with self.assertRaises(ValueError): # Unless they're unfinished
+            plan_task_graph([task('risk', [task('financial')])])
+
+    def test_rejects_cycles(self):
+        first = task('first')
+        second = task('second', [first])
+        first.context = [second]
+        with self.assertRaises(ValueError):
+            plan_task_graph([first, second])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+"""
+Measures the startup cost of each `main.py` action: importing `main`, then importing and
+constructing what the action needs before doing any work. Each measurement runs in a
+fresh interpreter, so nothing is shared between runs.
+
+Usage:
+    python benchmarks/startup_benchmark.py [--actions testing abstract] [--repeat 3] [--json results.json]
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules whose import alone costs seconds; reported when an action loads them.
+HEAVY_MODULES = ['torch', 'transformers', 'sentence_transformers', 'crewai', 'crewai_tools', 'langchain',
+                 'langchain_google_genai', 'langchain_openai', 'sklearn', 'tiktoken', 'cv2', 'pytesseract',
+                 'googleapiclient']
+
+# What each action imports and constructs before its first unit of work.
+ACTION_SETUP = {
+    'preprocess': "from preprocessing.document_preprocessor import DocumentPreprocessor\n"
+                  "from context_assembler.ann_index import build_portfolio_index",
+    'index': "from context_assembler.ann_index import build_portfolio_index",
+    'testing': "from context_assembler import ContextAssembler\n"
+               "ContextAssembler('preprocessing/outputs/preprocessed_data')",
+    'abstract': "from context_assembler import ContextAssembler\n"
+                "ContextAssembler('preprocessing/outputs/preprocessed_data')",
+    'analyze': "from analysis import analyze_investments\n"
+               "main.get_llm('local--llama')",
+}
+
+PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+{setup}
+ready = time.perf_counter()
+print(json.dumps({{
+    'import_main_s': imported - start,
+    'setup_s': ready - imported,
+    'total_s': ready - start,
+    'modules': len(sys.modules),
+    'heavy_modules': [m for m in {heavy!r} if m in sys.modules]
+}}))
+"""
+
+
+def measure(action):
+    """Runs one fresh-interpreter measurement of an action's startup. Returns its result dict."""
+    code = PROBE.format(setup=ACTION_SETUP[action], heavy=HEAVY_MODULES)
+    completed = subprocess.run([sys.executable, "-c", code], cwd=REPO_DIR, capture_output=True, text=True)
+    if completed.returncode != 0:
+        return {'error': completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else 'failed'}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def benchmark(actions, repeat):
+    """Measures each action `repeat` times and returns the median timings per action."""
+    results = {}
+    for action in actions:
+        runs = [measure(action) for _ in range(repeat)]
+        ok = [run for run in runs if 'error' not in run]
+        if not ok:
+            results[action] = {'error': runs[0]['error']}
+            continue
+        results[action] = {
+            key: statistics.median(run[key] for run in ok) for key in ('import_main_s', 'setup_s', 'total_s')
+        }
+        results[action]['modules'] = ok[-1]['modules']
+        results[action]['heavy_modules'] = ok[-1]['heavy_modules']
+    return results
+
+
+def print_table(results):
+    print(f"{'action':<12}{'import main':>13}{'setup':>10}{'total':>10}{'modules':>10}  heavy modules loaded")
+    for action, result in results.items():
+        if 'error' in result:
+            print(f"{action:<12}  error: {result['error']}")
+            continue
+        print(f"{action:<12}{result['import_main_s']:>12.2f}s{result['setup_s']:>9.2f}s{result['total_s']:>9.2f}s"
+              f"{result['modules']:>10}  {', '.join(result['heavy_modules']) or '-'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup-time benchmark of the main.py actions")
+    parser.add_argument("--actions", nargs="+", choices=list(ACTION_SETUP), default=list(ACTION_SETUP))
+    parser.add_argument("--repeat", type=int, default=3, help="Fresh-interpreter runs per action (median is reported)")
+    parser.add_argument("--json", help="Also write the results to this JSON file, e.g. to track them over time")
+    args = parser.parse_args()
+
+    results = benchmark(args.actions, args.repeat)
+    print_table(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
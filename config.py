@@ -3,9 +3,19 @@
 # LLM-related values
 MODEL_NAME = "local-llama"
 LLAMA_PATH = "~/.ollama/models/manifests/registry.ollama.ai/library/llama3/8b-instruct-q8_0"
-TEMPERATURE = 0.75 # TODO: Ensure this is actually honored in calls to the models
-MAX_TOKENS = 100000 # TODO: Ensure this is actually honored
-TOP_P=0.95 # TODO: Ensure this is actually honored
+TEMPERATURE = 0.75 # TODO: Ensure this is actually honored in calls to the hosted models (honored by ollama_wrapper.py)
+MAX_TOKENS = 100000 # TODO: Ensure this is actually honored by the hosted models (Ollama uses OLLAMA_NUM_PREDICT)
+TOP_P=0.95 # TODO: Ensure this is actually honored by the hosted models (honored by ollama_wrapper.py)
+
+# Local LLM server (ollama_wrapper.py)
+OLLAMA_BASE_URL = "http://localhost:11434"
+OLLAMA_NUM_CTX = 8192 # context window; Ollama's default (2048) silently truncates the agents' prompts
+OLLAMA_NUM_PREDICT = 2048 # max generated tokens per call; always clamped to the context window
+OLLAMA_KEEP_ALIVE = "30m" # how long the model stays loaded after a call (Ollama's default is 5m)
+OLLAMA_CONNECT_TIMEOUT = 5 # seconds
+OLLAMA_READ_TIMEOUT = 300 # seconds without a streamed token (or, without streaming, for the whole response)
+OLLAMA_MAX_RETRIES = 2 # on connection errors, timeouts and 5xx responses, before any token is received
+OLLAMA_NUM_PARALLEL = 1 # concurrent requests of a batch; match the server's OLLAMA_NUM_PARALLEL
 
 # Knwowledge-base paths
 KB_PATH = "knowledge_bases"
@@ -13,3 +23,102 @@ KB_PATH_FINANCIAL_ANALYST = KB_PATH + "/financial_analysis.txt"
 KB_PATH_EB5_PROGRAM = KB_PATH + "/eb5_program.txt"
 KB_PATH_IMMIGRATION_LAW = KB_PATH + "/immigration_law.txt"
 KB_PATH_RISK_ASSESSMENT = KB_PATH + "/risk_assessment.txt"
+KB_INDEX_DIR = KB_PATH + "/index" # chunks and embeddings of each knowledge base, rebuilt when its text changes
+
+# Context assembler: in-memory cache of the preprocessed corpus of each investment
+CORPUS_CACHE_MAX_INVESTMENTS = 8
+CORPUS_CACHE_MAX_BYTES = 1024 * 1024 * 1024 # 1 GB
+
+# Cross-investment (portfolio) search index
+PORTFOLIO_INDEX_DIR = "preprocessing/outputs/portfolio_index"
+PORTFOLIO_INDEX_N_PROBE = 8 # inverted lists scanned per query; higher = more exact, slower
+
+# Summarization of preprocessed documents ("abstract" phase)
+SUMMARIZATION_MODEL = "facebook/bart-large-cnn"
+SUMMARIZATION_DEVICE = None # None = auto (CUDA, then Apple MPS, then CPU); or e.g. -1 (CPU), 0 (first GPU)
+SUMMARIZATION_BATCH_SIZE = 8
+SUMMARIZATION_MAX_INPUT_TOKENS = 1024 # BART's input window
+SUMMARY_CHUNK_MIN_LENGTH = 200
+SUMMARY_CHUNK_MAX_LENGTH = 600
+SUMMARY_FINAL_MAX_LENGTH = 1000
+SUMMARY_MAX_LENGTH_RATIO = 0.5 # summaries are at most this fraction of their input's tokens...
+SUMMARY_MIN_LENGTH_RATIO = 0.2 # ...and the minimum length at most this fraction
+
+# Preprocessed chunk store (one per investment)
+CHUNK_STORE_EMBEDDING_DTYPE = "float32" # or "float16", halving the embeddings' disk and page-cache footprint
+
+# Chunking of preprocessed documents, in embedding-model tokens
+CHUNK_MAX_TOKENS = None # None = the embedding model's input window (254 tokens for all-MiniLM-L6-v2)
+CHUNK_OVERLAP_TOKENS = 32 # whole sentences, up to this many tokens, are repeated at the start of the next chunk
+
+# Embedding service (shared by preprocessing and the search tools)
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+EMBEDDING_MAX_BATCH_SIZE = 32 # texts per forward pass
+EMBEDDING_MAX_WAIT_MS = 5 # how long a query waits for others to batch with
+EMBEDDING_QUERY_CACHE_SIZE = 1024 # query embeddings kept (LRU)
+
+# Analysis ("analyze" action): investments analyzed concurrently, one crew each
+ANALYSIS_MAX_CONCURRENT_CREWS = 3
+# Max concurrent LLM calls per backend, shared by all crews. A local Ollama server runs one
+# generation at a time (unless OLLAMA_NUM_PARALLEL is set); hosted APIs are rate limited.
+LLM_CONCURRENCY_LIMITS = {"ollama": 1, "openai": 8, "google": 4}
+LLM_DEFAULT_CONCURRENCY = 2 # for other backends
+# Task-graph mode: within a crew, the tasks that don't depend on each other (the financial,
+# immigration and EB-5 program experts) run concurrently, and the risk assessor runs once
+# their outputs are ready. False = one task after another.
+ANALYSIS_TASK_GRAPH = True
+# Each task's output is appended to <report>/<investment>/results.jsonl as soon as it completes
+# (analysis/results_store.py). "record" = fsync every record, "none" = leave flushing to the OS.
+RESULTS_FSYNC = "record"
+
+# Cache of LLM responses (llm_cache/), shared by every backend and run
+LLM_CACHE_ENABLED = True # False (or `main.py analyze --no_llm_cache`) = always call the model
+LLM_CACHE_PATH = "outputs/llm_cache.sqlite"
+LLM_CACHE_TTL_DAYS = 30 # None = responses never expire
+LLM_CACHE_MAX_BYTES = 512 * 1024 * 1024 # least recently used responses are evicted beyond this
+LLM_CACHE_SEMANTIC_THRESHOLD = None # e.g. 0.98 = reuse responses to near-duplicate prompts; None = exact matches only
+
+# Web search (tools/web_search.py), shared by every agent and crew
+WEB_SEARCH_URL = "https://google.serper.dev/search" # Serper-compatible endpoint; overridden by EB5_WEB_SEARCH_URL
+WEB_SEARCH_DEFAULT_RESULTS = 6
+WEB_SEARCH_MAX_RESULTS = 20
+WEB_SEARCH_TIMEOUT = 15 # seconds
+WEB_SEARCH_MAX_RETRIES = 2 # on connection errors, timeouts, 429 and 5xx responses
+WEB_SEARCH_RATE = 5 # searches per second, across all crews (token bucket)
+WEB_SEARCH_BURST = 5 # searches allowed at once before rate limiting
+WEB_SEARCH_CACHE_PATH = "outputs/web_search_cache.sqlite"
+WEB_SEARCH_CACHE_TTL_DAYS = 7 # None = results never expire
+WEB_SEARCH_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Web scraping (tools/web_scraper.py), shared by the agents and preprocessing
+SCRAPER_MAX_CONNECTIONS = 16
+SCRAPER_PER_HOST_CONNECTIONS = 2 # concurrent requests to the same site
+SCRAPER_CONNECT_TIMEOUT = 5 # seconds
+SCRAPER_READ_TIMEOUT = 15 # seconds without receiving data
+SCRAPER_TOTAL_TIMEOUT = 30 # seconds for a whole page, so a slow site can't hang a crew
+SCRAPER_MAX_BYTES = 5 * 1024 * 1024 # larger pages are rejected
+SCRAPER_CACHE_DIR = "cache/web_pages"
+SCRAPER_CACHE_FRESH_SECONDS = 3600 # older cached pages are revalidated (ETag / Last-Modified) before reuse
+
+# Instrumentation (instrumentation/): spans around LLM calls, tools, downloads, PDF extraction,
+# embedding and summarization, written as a Chrome trace (trace.json) and a summary table
+# (trace_summary.txt) beside the report, or in preprocessing/outputs/
+TRACE_ENABLED = True
+TRACE_MAX_SPANS = 500000 # later spans are dropped (and counted)
+
+# Token budgets of the prompts (context_assembler/token_budget.py), per LLM backend
+LLM_CONTEXT_WINDOWS = {"ollama": OLLAMA_NUM_CTX, "openai": 16385, "google": 32768}
+LLM_DEFAULT_CONTEXT_WINDOW = OLLAMA_NUM_CTX
+LLM_TOKENIZERS = {"ollama": "cl100k_base", "openai": "cl100k_base", "google": None} # tiktoken encodings; None = estimate
+LLM_DEFAULT_TOKENIZER = "cl100k_base" # close to llama3's tokenizer, also tiktoken-based
+OVERVIEW_CONTEXT_SHARE = 0.25 # of the context window, for the investment overview inlined in every task
+OVERVIEW_MAX_TOKENS = 6000
+OVERVIEW_MIN_SUMMARY_TOKENS = 60 # every listed document keeps at least this much of its summary
+PROMPT_RESERVED_TOKENS = 3000 # left to the agent scaffolding, tool results and the answer
+# Summaries closest to these topics are kept in full first when the overview is over budget
+OVERVIEW_RANKING_QUERIES = [
+    "capital structure, use of funds and EB-5 loan terms",
+    "job creation and targeted employment area",
+    "exit strategy and repayment of investor capital",
+    "developer track record and project risks",
+]
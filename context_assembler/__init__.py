@@ -1,3 +1,13 @@
-from .context_assembler import ContextAssembler, SearchAllDocumentsTool, SearchSpecificDocumentTool
+from .context_assembler import ContextAssembler
+from .ann_index import PortfolioIndex, build_portfolio_index
+from .token_budget import TokenBudget
 
-__all__ = ['ContextAssembler', 'SearchAllDocumentsTool', 'SearchSpecificDocumentTool']
\ No newline at end of file
+__all__ = ['ContextAssembler', 'SearchAllDocumentsTool', 'SearchSpecificDocumentTool', 'SearchAcrossInvestmentsTool',
+           'PortfolioIndex', 'build_portfolio_index', 'TokenBudget']
+
+def __getattr__(name):
+    # The tools import crewai, so they are only imported when used (see search_tools.py)
+    if name in ('SearchAllDocumentsTool', 'SearchSpecificDocumentTool', 'SearchAcrossInvestmentsTool'):
+        from . import search_tools
+        return getattr(search_tools, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,338 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import logging
+import numpy as np
+
+from .search_engine import normalize_rows, top_k_indices, website_file_name
+from tools.chunk_store import ChunkStore
+
+logger = logging.getLogger(__name__)
+
+CHUNK_KINDS = ['text', 'visual']
+INDEX_FORMAT_VERSION = 1
+POINTER_FILE = 'index.json' # Names the current index generation of an index directory
+
+
+def collect_portfolio_chunks(preprocessed_data_dir):
+    """Gathers every embedded chunk of every preprocessed investment.
+
+    Returns:
+        tuple: (embeddings, records), where `embeddings` is a float32 matrix and `records`
+            is a list of dicts (investment_id, source, kind, chunk_index, text), row-aligned.
+            Chunks without a matching embeddings file are skipped.
+    """
+    records, matrices = [], []
+
+    def add(investment_id, source, kind, chunks, embeddings_file):
+        if not chunks:
+            return
+        if not os.path.exists(embeddings_file):
+            logger.warning(f"No embeddings for {source} ({kind}) of investment {investment_id}, skipping")
+            return
+        add_embedded(investment_id, source, kind, chunks, np.load(embeddings_file))
+
+    def add_embedded(investment_id, source, kind, chunks, embeddings):
+        if not len(chunks):
+            return
+        if embeddings.ndim != 2 or embeddings.shape[0] != len(chunks):
+            logger.warning(f"Embeddings for {source} ({kind}) of investment {investment_id} out of sync, skipping")
+            return
+        matrices.append(normalize_rows(embeddings))
+        records.extend({
+            'investment_id': investment_id,
+            'source': source,
+            'kind': kind,
+            'chunk_index': i,
+            'text': chunk
+        } for i, chunk in enumerate(chunks))
+
+    for investment_id in sorted(os.listdir(preprocessed_data_dir)):
+        investment_dir = os.path.join(preprocessed_data_dir, investment_id)
+        metadata_file = os.path.join(investment_dir, 'metadata.json')
+        if not os.path.exists(metadata_file):
+            continue
+        with open(metadata_file, 'r') as f:
+            metadata = json.load(f)
+
+        store = ChunkStore.open(investment_dir)
+        if store is not None:
+            for doc in store.documents:
+                for kind in CHUNK_KINDS:
+                    add_embedded(investment_id, doc['name'], kind, store.chunks(doc, kind), store.doc_embeddings(doc, kind))
+            continue
+
+        # Investments preprocessed before the chunk store: per-file chunk and embedding files
+        for file_name in metadata['folder_files']:
+            base_name = os.path.splitext(file_name)[0]
+            chunks_file = os.path.join(investment_dir, f"{base_name}_chunks.json")
+            if not os.path.exists(chunks_file):
+                continue
+            with open(chunks_file, 'r') as f:
+                chunks = json.load(f)
+            add(investment_id, file_name, 'text', chunks.get('text_chunks', []),
+                os.path.join(investment_dir, f"{base_name}_text_embeddings.npy"))
+            add(investment_id, file_name, 'visual', chunks.get('visual_chunks', []),
+                os.path.join(investment_dir, f"{base_name}_visual_embeddings.npy"))
+
+        for website in metadata['websites']:
+            website_file = website_file_name(website)
+            chunks_file = os.path.join(investment_dir, f"{website_file}_chunks.json")
+            if not os.path.exists(chunks_file):
+                continue
+            with open(chunks_file, 'r') as f:
+                chunks = json.load(f)
+            add(investment_id, website, 'text', chunks.get('chunks', []),
+                os.path.join(investment_dir, f"{website_file}_embeddings.npy"))
+
+    embeddings = np.vstack(matrices) if matrices else np.zeros((0, 0), dtype=np.float32)
+    return embeddings, records
+
+
+def spherical_kmeans(vectors, n_lists, n_iter=10, seed=0):
+    """Clusters unit vectors by cosine similarity. Returns the normalized centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+    for _ in range(n_iter):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        empty = np.bincount(assignments, minlength=n_lists) == 0
+        # Re-seed empty lists with random vectors so every list stays in use.
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+class PortfolioIndex:
+    """
+    Approximate nearest-neighbour (IVF-flat) index over the chunks of every investment.
+
+    Vectors are grouped into `n_lists` inverted lists around k-means centroids and stored
+    contiguously, list by list. A query only scores the lists of its `n_probe` closest
+    centroids. On disk, the vectors and the chunk texts are memory-mapped at load time.
+
+    Like a `ChunkStore`, each save writes a new generation directory and publishes it by
+    atomically replacing the pointer file, so analyses that map the previous generation
+    (in other processes) keep working, and a crash mid-save leaves the previous index.
+    """
+
+    FILES = ('vectors.npy', 'centroids.npy', 'list_offsets.npy', 'investment_codes.npy', 'source_codes.npy',
+             'kind_codes.npy', 'chunk_indexes.npy', 'text_offsets.npy', 'texts.bin', 'index_info.json')
+
+    def __init__(self, vectors, centroids, list_offsets, investment_codes, source_codes, kind_codes,
+                 chunk_indexes, text_offsets, texts, investment_ids, sources):
+        self.vectors = vectors
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.investment_codes = investment_codes
+        self.source_codes = source_codes
+        self.kind_codes = kind_codes
+        self.chunk_indexes = chunk_indexes
+        self.text_offsets = text_offsets
+        self.texts = texts
+        self.investment_ids = investment_ids
+        self.sources = sources
+
+    def __len__(self):
+        return len(self.vectors)
+
+    @classmethod
+    def build(cls, embeddings, records, n_lists=None, n_iter=10, seed=0):
+        """Builds the index from row-aligned embeddings and chunk records."""
+        vectors = normalize_rows(embeddings) if len(records) else np.zeros((0, 0), dtype=np.float32)
+        if n_lists is None:
+            n_lists = int(np.sqrt(len(records)))
+        n_lists = max(1, min(n_lists, len(records)))
+
+        if len(records):
+            # Train on a sample; k-means quality saturates well below the full corpus size.
+            rng = np.random.default_rng(seed)
+            sample_size = min(len(vectors), 256 * n_lists)
+            sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+            centroids = spherical_kmeans(sample, n_lists, n_iter, seed)
+            assignments = np.argmax(vectors @ centroids.T, axis=1)
+        else:
+            centroids = np.zeros((1, 0), dtype=np.float32)
+            assignments = np.zeros(0, dtype=np.int64)
+
+        order = np.argsort(assignments, kind='stable')
+        list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=len(centroids)))])
+
+        investment_ids = sorted({r['investment_id'] for r in records})
+        sources = sorted({r['source'] for r in records})
+        investment_lookup = {value: code for code, value in enumerate(investment_ids)}
+        source_lookup = {value: code for code, value in enumerate(sources)}
+
+        ordered = [records[i] for i in order]
+        encoded = [r['text'].encode('utf-8') for r in ordered]
+        text_offsets = np.concatenate([[0], np.cumsum([len(t) for t in encoded], dtype=np.int64)]).astype(np.int64)
+
+        return cls(
+            vectors=vectors[order],
+            centroids=centroids,
+            list_offsets=list_offsets.astype(np.int64),
+            investment_codes=np.array([investment_lookup[r['investment_id']] for r in ordered], dtype=np.int32),
+            source_codes=np.array([source_lookup[r['source']] for r in ordered], dtype=np.int32),
+            kind_codes=np.array([CHUNK_KINDS.index(r['kind']) for r in ordered], dtype=np.int8),
+            chunk_indexes=np.array([r['chunk_index'] for r in ordered], dtype=np.int32),
+            text_offsets=text_offsets,
+            texts=np.frombuffer(b''.join(encoded), dtype=np.uint8),
+            investment_ids=investment_ids,
+            sources=sources
+        )
+
+    def save(self, index_dir):
+        """Writes the index as a new generation of `index_dir`, then removes the ones before the previous one."""
+        generation = f"index-{uuid.uuid4().hex[:12]}"
+        generation_dir = os.path.join(index_dir, generation)
+        os.makedirs(generation_dir)
+        self._write(generation_dir)
+
+        pointer_file = os.path.join(index_dir, POINTER_FILE)
+        try:
+            with open(pointer_file, 'r') as f:
+                previous = json.load(f).get('dir')
+        except (FileNotFoundError, json.JSONDecodeError):
+            previous = None
+        with open(pointer_file + '.tmp', 'w') as f:
+            json.dump({'format_version': INDEX_FORMAT_VERSION, 'dir': generation}, f)
+        os.replace(pointer_file + '.tmp', pointer_file)
+
+        for entry in os.listdir(index_dir):
+            path = os.path.join(index_dir, entry)
+            if entry.startswith('index-') and entry not in (generation, previous):
+                shutil.rmtree(path, ignore_errors=True)
+            elif entry in self.FILES: # Unversioned index of an earlier release; open maps survive the unlink
+                os.remove(path)
+        return generation_dir
+
+    def _write(self, index_dir):
+        arrays = {
+            'vectors.npy': self.vectors,
+            'centroids.npy': self.centroids,
+            'list_offsets.npy': self.list_offsets,
+            'investment_codes.npy': self.investment_codes,
+            'source_codes.npy': self.source_codes,
+            'kind_codes.npy': self.kind_codes,
+            'chunk_indexes.npy': self.chunk_indexes,
+            'text_offsets.npy': self.text_offsets,
+        }
+        for file_name, array in arrays.items():
+            np.save(os.path.join(index_dir, file_name), np.ascontiguousarray(array))
+        with open(os.path.join(index_dir, 'texts.bin'), 'wb') as f:
+            f.write(np.asarray(self.texts).tobytes())
+        with open(os.path.join(index_dir, 'index_info.json'), 'w') as f:
+            json.dump({
+                'format_version': INDEX_FORMAT_VERSION,
+                'built_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'chunk_count': len(self),
+                'n_lists': len(self.centroids),
+                'investment_ids': self.investment_ids,
+                'sources': self.sources
+            }, f, indent=2)
+
+    @classmethod
+    def load(cls, index_dir):
+        """Loads the current index saved by `save()`, memory-mapping its vectors and texts."""
+        pointer_file = os.path.join(index_dir, POINTER_FILE)
+        if os.path.exists(pointer_file): # Else an unversioned index, written in place
+            with open(pointer_file, 'r') as f:
+                index_dir = os.path.join(index_dir, json.load(f)['dir'])
+        with open(os.path.join(index_dir, 'index_info.json'), 'r') as f:
+            info = json.load(f)
+        if info.get('format_version') != INDEX_FORMAT_VERSION:
+            raise ValueError(f"Unsupported portfolio index format in {index_dir}, please rebuild it")
+
+        def array(name, mmap_mode=None):
+            return np.load(os.path.join(index_dir, name), mmap_mode=mmap_mode)
+
+        texts_file = os.path.join(index_dir, 'texts.bin')
+        if os.path.getsize(texts_file):
+            texts = np.memmap(texts_file, dtype=np.uint8, mode='r')
+        else:
+            texts = np.zeros(0, dtype=np.uint8)
+        return cls(
+            vectors=array('vectors.npy', mmap_mode='r'),
+            centroids=array('centroids.npy'),
+            list_offsets=array('list_offsets.npy'),
+            investment_codes=array('investment_codes.npy'),
+            source_codes=array('source_codes.npy'),
+            kind_codes=array('kind_codes.npy'),
+            chunk_indexes=array('chunk_indexes.npy'),
+            text_offsets=array('text_offsets.npy'),
+            texts=texts,
+            investment_ids=info['investment_ids'],
+            sources=info['sources']
+        )
+
+    def text(self, row):
+        start, end = self.text_offsets[row], self.text_offsets[row + 1]
+        return bytes(self.texts[start:end]).decode('utf-8')
+
+    def _filter_mask(self, rows, investment_ids=None, document_name=None, kind=None):
+        mask = np.ones(len(rows), dtype=bool)
+        if investment_ids:
+            codes = [self.investment_ids.index(i) for i in investment_ids if i in self.investment_ids]
+            mask &= np.isin(self.investment_codes[rows], codes)
+        if document_name:
+            if document_name.endswith('.pdf'):
+                document_name = os.path.splitext(document_name)[0]
+            codes = [code for code, source in enumerate(self.sources) if source.startswith(document_name)]
+            mask &= np.isin(self.source_codes[rows], codes)
+        if kind:
+            mask &= self.kind_codes[rows] == CHUNK_KINDS.index(kind)
+        return mask
+
+    def search(self, query_embedding, top_k=5, n_probe=8, investment_ids=None, document_name=None, kind=None):
+        """Returns the approximate `top_k` chunks closest to the query.
+
+        Args:
+            query_embedding (np.ndarray): Embedding of the query.
+            top_k (int, optional): Number of results to return. Defaults to 5.
+            n_probe (int, optional): Number of inverted lists to scan. Defaults to 8.
+            investment_ids (list[str], optional): Only return chunks of these investments.
+            document_name (str, optional): Only return chunks of documents / websites with this name.
+            kind (str, optional): Only return 'text' or 'visual' chunks.
+
+        Returns:
+            list[dict]: One dict per result with the investment_id, source, kind, chunk_index,
+                similarity and text, best match first.
+        """
+        if len(self) == 0:
+            return []
+        query = normalize_rows(query_embedding)[0]
+        list_order = np.argsort(-(self.centroids @ query))
+        n_probe = max(1, min(n_probe, len(list_order)))
+
+        while True:
+            probed = list_order[:n_probe]
+            rows = np.concatenate([np.arange(self.list_offsets[l], self.list_offsets[l + 1]) for l in probed])
+            rows = rows[self._filter_mask(rows, investment_ids, document_name, kind)]
+            # Selective filters can leave too few candidates in the closest lists; widen the probe.
+            if len(rows) >= top_k or n_probe == len(list_order):
+                break
+            n_probe = min(n_probe * 2, len(list_order))
+
+        if len(rows) == 0:
+            return []
+        scores = np.asarray(self.vectors[rows]) @ query
+        return [{
+            'investment_id': self.investment_ids[self.investment_codes[row]],
+            'source': self.sources[self.source_codes[row]],
+            'kind': CHUNK_KINDS[self.kind_codes[row]],
+            'chunk_index': int(self.chunk_indexes[row]),
+            'similarity': float(scores[i]),
+            'text': self.text(row)
+        } for i, row in ((i, int(rows[i])) for i in top_k_indices(scores, top_k))]
+
+
+def build_portfolio_index(preprocessed_data_dir, index_dir, n_lists=None):
+    """Builds the cross-investment index from the preprocessed data and saves it to `index_dir`."""
+    embeddings, records = collect_portfolio_chunks(preprocessed_data_dir)
+    index = PortfolioIndex.build(embeddings, records, n_lists=n_lists)
+    index.save(index_dir)
+    logger.info(f"Built portfolio index with {len(index)} chunks in {len(index.centroids)} lists at {index_dir}")
+    return index
@@ -1,23 +1,20 @@
 import os
 import json
 import logging
+import threading
 import numpy as np
-import time
-from sentence_transformers import SentenceTransformer, util
-from crewai_tools import BaseTool
-from typing import Type, Any, ForwardRef
-from pydantic.v1 import BaseModel, Field, create_model, ConfigDict
-from sklearn.metrics.pairwise import cosine_similarity
-from transformers import pipeline
+from typing import Any
+from pydantic.v1 import BaseModel, Field, ConfigDict
 from dotenv import load_dotenv
 
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
-
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from tqdm import tqdm
-import tiktoken
+import config
+from .ann_index import PortfolioIndex
+from .corpus_cache import CorpusCache, InvestmentCorpus
+from .summarizer import get_summarizer
+from .search_engine import InvestmentIndex, SemanticSearchEngine, website_file_name
+from .token_budget import TokenBudget
+from .overview import load_overview, overview_inputs, write_overview
+from tools.chunk_store import ChunkStore
 
 # Logging config
 logging.basicConfig(
@@ -37,10 +34,14 @@ os.environ['OPENAI_API_KEY'] = os.getenv('OPEN_AI_API_KEY')
 os.environ['SERPER_API_KEY'] = os.getenv('SERPER_API_KEY')
 
 def get_llm(model_name="gemini-pro"):
+    # LLM clients are imported here, so that importing this module stays cheap
+    from llm_cache import with_llm_cache
     if model_name == "gemini-pro":
-        return ChatGoogleGenerativeAI(model="gemini-1.5-pro-latest")
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        return with_llm_cache(ChatGoogleGenerativeAI(model="gemini-1.5-pro-latest"))
     elif model_name == "gpt-3.5-turbo":
-        return ChatOpenAI(model_name="gpt-3.5-turbo")
+        from langchain_openai import ChatOpenAI
+        return with_llm_cache(ChatOpenAI(model_name="gpt-3.5-turbo"))
     # Add more model options as needed
 
 class ContextAssembler(BaseModel):
@@ -50,16 +51,40 @@ class ContextAssembler(BaseModel):
     """
     model_config = ConfigDict(from_attributes=True) # Allows 
     preprocessed_data_dir: str = Field(..., description="preprocessing directory, to assemble the context")
-    model: Any = Field(..., description="model used to assemble the context")
-    llm: Any = Field(..., description="internal LLM used to summarize documents to assemble context")
+    llm: Any = Field(None, description="internal LLM used to summarize documents to assemble context, created on first use")
+    corpus_cache: Any = Field(None, description="in-memory cache of the parsed preprocessed data, per investment")
+    search_engine: Any = Field(None, description="vectorized search over the precomputed chunk embeddings")
+    portfolio_index: Any = Field(None, description="approximate search index across all investments, loaded lazily")
+    overviews: Any = Field(None, description="overview artifact of each investment, by id (see overview.py)")
+    rendered_overviews: Any = Field(None, description="rendered overviews, by (investment id, backend, token budget)")
+    overviews_lock: Any = Field(None, description="guards `overviews` and `rendered_overviews`, shared by concurrent crews")
     # class Config:
         # arbitrary_types_allowed = True
 
     def __init__(self, preprocessed_data_dir):
-        super().__init__(preprocessed_data_dir=preprocessed_data_dir, model=SentenceTransformer('all-MiniLM-L6-v2'), llm=get_llm())
-        self.preprocessed_data_dir = preprocessed_data_dir
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
-        self.llm = get_llm()
+        # Nothing heavy is loaded here: the embedding model (shared with every other component)
+        # is loaded on the first search, and the LLM on first use.
+        super().__init__(preprocessed_data_dir=preprocessed_data_dir)
+        self.corpus_cache = CorpusCache(
+            preprocessed_data_dir, self.load_corpus,
+            max_entries=config.CORPUS_CACHE_MAX_INVESTMENTS,
+            max_bytes=config.CORPUS_CACHE_MAX_BYTES
+        )
+        self.search_engine = SemanticSearchEngine(preprocessed_data_dir, None, self.corpus_cache)
+        self.overviews = {}
+        self.rendered_overviews = {}
+        self.overviews_lock = threading.Lock()
+
+    @property
+    def model(self):
+        """The shared `EmbeddingService`, loaded on first use."""
+        return self.search_engine.model
+
+    def get_internal_llm(self):
+        """Returns the internal LLM, creating it on first use."""
+        if self.llm is None:
+            self.llm = get_llm()
+        return self.llm
     
     def assemble_context(self, investment_id, include_full_chunks=False):
         """Compiles all documents and websites per option to return a dictionary of all "context"
@@ -91,18 +116,52 @@ class ContextAssembler(BaseModel):
                             'chunks': list[str] # List of chunks, if include_full_chunks is True
                         }
         """
+        # Served from the corpus cache; only reads from disk when the preprocessed files changed.
+        corpus = self.corpus_cache.get(investment_id)
+
+        context = {
+            'metadata': corpus.metadata,
+            'documents': [],
+            'websites': []
+        }
+        for doc in corpus.documents:
+            doc_info = {'file': doc['file'], 'summary': doc['summary']}
+            if include_full_chunks and 'chunks' in doc:
+                doc_info['chunks'] = doc['chunks']
+            context['documents'].append(doc_info)
+
+        for website in corpus.websites:
+            website_info = {'url': website['url'], 'summary': website['summary']}
+            if include_full_chunks and 'chunks' in website:
+                website_info['chunks'] = website['chunks']
+            context['websites'].append(website_info)
+
+        logger.debug(f"assemble_context() on {investment_id}: {len(context['documents'])} documents, "
+                     f"{len(context['websites'])} websites")
+        return context
+
+    def load_corpus(self, investment_id):
+        """Reads the metadata, summaries and chunks of an investment from disk.
+
+        Used by the corpus cache, whenever an investment is missing from it or stale. Chunks
+        are mapped from the investment's chunk store; investments preprocessed before it
+        existed are read from their per-file *_chunks.json files instead.
+
+        Args:
+            investment_id (str): The ID of the investment.
+
+        Returns:
+            InvestmentCorpus: The parsed preprocessed data of the investment.
+        """
         investment_dir = os.path.join(self.preprocessed_data_dir, investment_id)
-        # DEBUG: logger.info(f"assemble_context() called on {investment_id}.")
         
         # Load metadata
         with open(os.path.join(investment_dir, 'metadata.json'), 'r') as f:
             metadata = json.load(f)
-        
-        context = {
-            'metadata': metadata,
-            'documents': [],
-            'websites': []
-        }
+
+        store = ChunkStore.open(investment_dir)
+        if store is not None:
+            return self.load_store_corpus(investment_id, metadata, store)
 
         # For files:
         # chunks_file = os.path.join(investment_dir, f"{os.path.splitext(file_name)[0]}_chunks.json")
@@ -110,43 +169,72 @@ class ContextAssembler(BaseModel):
         # chunks_file = os.path.join(investment_dir, f"{website_file}_chunks.json")
 
         # 1) Load file chunks and get summaries (and generate from chunks, if needed)
+        documents = []
         for file_name in metadata['folder_files']:
             summary = self.get_or_create_summary(investment_dir, file_name)
             doc_info = {
                 'file': file_name,
                 'summary': summary
             }
-
-            # Still return the full chunks, if requested
-            if include_full_chunks:
-                chunks_file = os.path.join(investment_dir, f"{os.path.splitext(file_name)[0]}_chunks.json")
-                if os.path.exists(chunks_file):
-                    with open(chunks_file, 'r') as f:
-                        doc_info['chunks'] = json.load(f)['text_chunks']
-            context['documents'].append(doc_info)
+            chunks_file = os.path.join(investment_dir, f"{os.path.splitext(file_name)[0]}_chunks.json")
+            if os.path.exists(chunks_file):
+                with open(chunks_file, 'r') as f:
+                    doc_info['chunks'] = json.load(f)['text_chunks']
+            documents.append(doc_info)
 
         # 2) Load website chunks and get summaries (and generate from chunks, if needed)
+        websites = []
         for website in metadata['websites']:
-            website_file = website.replace('https://', '').replace('http://', '').replace('/', '_')
+            website_file = website_file_name(website)
             summary = self.get_or_create_summary(investment_dir, website_file, is_website=True)
             website_info = {
                 'url': website,
                 'summary': summary
             }
+            chunks_file = os.path.join(investment_dir, f"{website_file}_chunks.json")
+            if os.path.exists(chunks_file):
+                with open(chunks_file, 'r') as f:
+                    website_info['chunks'] = json.load(f)['chunks']
+            websites.append(website_info)
 
-            # Still return the full chunks, if requested
-            if include_full_chunks:
-                chunks_file = os.path.join(investment_dir, f"{website_file}_chunks.json")
-                if os.path.exists(chunks_file):
-                    with open(chunks_file, 'r') as f:
-                        website_info['chunks'] = json.load(f)['chunks']
-            context['websites'].append(website_info)
+        logger.info(f"Loaded corpus for investment {investment_id}: {len(documents)} documents, {len(websites)} websites")
+        return InvestmentCorpus(investment_id, metadata, documents, websites)
 
-        logging.info(f"Results for assemble_context() on {investment_id}: {context}")
-        return context
+    def load_store_corpus(self, investment_id, metadata, store):
+        """Builds the corpus of an investment from its chunk store; chunks stay memory-mapped."""
+        investment_dir = os.path.join(self.preprocessed_data_dir, investment_id)
+        documents, websites = [], []
+        for doc in store.documents:
+            summary = self.get_or_create_store_summary(investment_dir, store, doc)
+            if doc['type'] == 'website':
+                websites.append({'url': doc['id'], 'summary': summary, 'chunks': store.chunks(doc)})
+            else:
+                documents.append({'file': doc['name'], 'path': doc['path'], 'summary': summary,
+                                  'chunks': store.chunks(doc)})
 
-        # DEBUG: logger.info(f"Results for assemble_context() on {investment_id} look like: {context}")
-        return context
+        logger.info(f"Mapped corpus for investment {investment_id}: {len(documents)} documents, "
+                    f"{len(websites)} websites, {len(store)} chunks")
+        return InvestmentCorpus(investment_id, metadata, documents, websites, store=store)
+
+    def get_or_create_store_summary(self, investment_dir, store, doc):
+        """Returns the summary of a chunk store document, summarizing its text chunks on first use.
+
+        Summaries are kept under `summaries/`, keyed by the document's id, so equally named
+        documents don't share a summary.
+        """
+        summary_file = os.path.join(investment_dir, 'summaries', f"{doc['key']}.txt")
+        if os.path.exists(summary_file):
+            with open(summary_file, 'r') as f:
+                return f.read()
+
+        chunks = list(store.chunks(doc))
+        if not chunks:
+            return "No content available for summarization."
+        summary = self.summarize_existing_chunks(chunks, doc['name'])
+        os.makedirs(os.path.dirname(summary_file), exist_ok=True)
+        with open(summary_file, 'w') as f:
+            f.write(summary)
+        return summary
     
     def get_or_create_summary(self, investment_dir, file_name, is_website=False):
         """Returns summary of a document or website.
@@ -211,21 +299,13 @@ class ContextAssembler(BaseModel):
             None
 
         Notes:
-            This method uses the BART (Bidirectional and Auto-Regressive Transformer) model for summarization.
-            It first summarizes each individual chunk and then combines the summaries into a single summary.
+            This method uses the BART (Bidirectional and Auto-Regressive Transformer) model for summarization,
+            loaded once per process (see `summarizer.py`). It first summarizes the chunks in batches and then
+            combines the summaries into a single summary, in as many rounds as BART's input window requires.
 
         """
         # [Research] Compared to other summarization models (pegasus, allenai), BART worked best!
-        summaries = []
-        summarizer = pipeline("summarization", model="facebook/bart-large-cnn", device=0)
-
-        for chunk in tqdm(chunks, desc="Processing chunks"):
-            summary = summarizer(chunk, max_length=600, min_length=200)[0]['summary_text']
-            summaries.append(summary)
-        
-        chunk_summaries = " ".join(summaries)
-        final_summary = summarizer(chunk_summaries, max_length=3000, min_length=200)[0]['summary_text']
-        return final_summary
+        return get_summarizer().summarize(chunks, file_name)
 
     # def summarize_with_gemini(self, text):
     #     time.sleep(1)  # Add a 1-second delay between API calls
@@ -233,53 +313,46 @@ class ContextAssembler(BaseModel):
     #         input_variables=["text"],
     #         template="Please provide a concise summary of the following text in about 200 words:\n\n{text}"
     #     )
-    #     chain = LLMChain(llm=self.llm, prompt=prompt)
+    #     chain = LLMChain(llm=self.get_internal_llm(), prompt=prompt)
     #     response = chain.run(text=text)
     #     return response.strip()
 
     def semantic_search(self, context, query, top_k=5):
         """Searches the context assembled by assemble_context() by comparing
-        the embedding of the query against the embeddings of each document.
+        the embedding of the query against the precomputed embeddings of each chunk.
 
         Args:
             context (dict): The context assembled by the `assemble_context()` method.
-                Ensure that this context contains 'chunks' for both documents and websites.
+                If it carries the investment 'metadata', the embeddings written during
+                preprocessing are used and the 'chunks' need not be included. Otherwise,
+                the 'chunks' of its documents and websites are embedded on the fly.
             query (str): The query string to search for.
             top_k (int, optional): The number of top results to return. Defaults to 5.
 
         Returns:
-            list: A list of tuples containing the search results. Each tuple contains the file or URL,
-            the similarity score, and the corresponding chunk of text.
-
-        Raises:
-            KeyError: If the required keys 'documents' or 'websites' are not found in the context.
+            list: A list of tuples containing the search results, best match first. Each tuple
+            contains the file or URL, the similarity score, and the corresponding chunk of text.
 
         """
-        query_embedding = self.model.encode(query, convert_to_tensor=True)
-        # DEBUG: logger.info(f"Semantic Search for for {query} on {context}")
-        
-        results = []
-        # Search over documents
-        for doc in context.get('documents', []):
-            if (not doc.get('chunks', [])):
-                logging.error(f"Need chunks for semantic_search(), not found in context: {context}")
-            for chunk in doc.get('chunks', []):
-                chunk_embedding = self.model.encode(chunk, convert_to_tensor=True)
-                similarity = util.pytorch_cos_sim(query_embedding, chunk_embedding)
-                results.append((doc['file'], similarity.item(), chunk))
-        
-        # Search over websites (if they exist)
-        for website in context.get('websites', []):
-            if (not doc.get('websites', [])):
-                logging.error(f"Need chunks for semantic_search(), not found in context: {context}")
-            for chunk in website.get('chunks', []):
-                chunk_embedding = self.model.encode(chunk, convert_to_tensor=True)
-                similarity = util.pytorch_cos_sim(query_embedding, chunk_embedding)
-                results.append((website['url'], similarity.item(), chunk))
-        
-        results.sort(reverse=True, key=lambda x: x[0])
-        # DEBUG: logger.info(f"Results for {query} on {context}: {results[:top_k]}")
-        return results[:top_k]
+        documents = context.get('documents', [])
+        websites = context.get('websites', [])
+        sources = [doc['file'] for doc in documents] + [website['url'] for website in websites]
+
+        investment_id = context.get('metadata', {}).get('id')
+        if investment_id is not None:
+            return self.search_engine.search(investment_id, query, top_k, sources)
+
+        # No preprocessed investment to back this context, so embed its chunks (one batch per source).
+        parts = []
+        for source, chunks in [(doc['file'], doc.get('chunks', [])) for doc in documents] + \
+                              [(website['url'], website.get('chunks', [])) for website in websites]:
+            if not chunks:
+                logging.error(f"Need chunks for semantic_search(), not found for {source}")
+                continue
+            parts.append((source, chunks, self.model.encode(chunks)))
+
+        index = InvestmentIndex.from_parts(parts)
+        return index.search(self.search_engine.encode_query(query), top_k)
     
     def search_specific_document(self, context, document_name, query, top_k=5):
         """
@@ -303,49 +376,149 @@ class ContextAssembler(BaseModel):
         for doc in context['documents']:
             if doc['file'].startswith(document_name):
                 print("Found document!!!")
-                return self.semantic_search({'documents': [doc]}, query, top_k)
+                return self.semantic_search({'metadata': context.get('metadata', {}), 'documents': [doc]}, query, top_k)
 
         # Search over websites
         for website in context['websites']:
             if website['url'] == document_name:
                 print("Found website!!!")
-                return self.semantic_search({'websites': [website]}, query, top_k)
+                return self.semantic_search({'metadata': context.get('metadata', {}), 'websites': [website]}, query, top_k)
 
         print(f"ERROR: Could not find a document with inputted name {document_name}")
         return []  # Return empty list if document not found
     
-    def get_investment_overview(self, investment_id):
+    def search_across_investments(self, query, top_k=5, investment_ids=None, document_name=None, chunk_kind=None):
+        """
+        Searches the chunks of all investments at once, using the persistent portfolio index.
+
+        Args:
+            query (str): The search query.
+            top_k (int, optional): The number of top search results to return. Defaults to 5.
+            investment_ids (list[str], optional): Only search these investments.
+            document_name (str, optional): Only search documents / websites with this name.
+            chunk_kind (str, optional): Only search 'text' or 'visual' chunks.
+
+        Returns:
+            list: A list of result dicts (investment_id, source, kind, chunk_index, similarity, text).
+
+        Raises:
+            FileNotFoundError: If the portfolio index has not been built yet (`python main.py index`).
+        """
+        if self.portfolio_index is None:
+            self.portfolio_index = PortfolioIndex.load(config.PORTFOLIO_INDEX_DIR)
+        return self.portfolio_index.search(
+            self.search_engine.encode_query(query), top_k,
+            n_probe=config.PORTFOLIO_INDEX_N_PROBE,
+            investment_ids=investment_ids,
+            document_name=document_name,
+            kind=chunk_kind
+        )
+
+    def get_investment_overview(self, investment_id, token_budget=None):
         """Provides a broad overview of the investment, including document
-        descriptions. Helpful to provide to agents early on in the workflow."""
-        
-        print(f"[context_assembler] Getting overview for {investment_id}...") 
-        investment_dir = os.path.join(self.preprocessed_data_dir, investment_id)
+        descriptions. Helpful to provide to agents early on in the workflow.
 
-        # Load metadata
-        with open(os.path.join(investment_dir, 'metadata.json'), 'r') as f:
-            metadata = json.load(f)
+        The overview is rendered from the investment's overview artifact (see `get_overview`),
+        so no summary is read and nothing is recomputed once the artifact is in memory.
+
+        Args:
+            investment_id (str): The investment ID.
+            token_budget (TokenBudget, optional): The target model's budget; the document summaries are
+                ranked and truncated to fit its `overview_tokens`. Defaults to the default backend's budget.
+
+        Returns:
+            str: The overview.
+        """
+        budget = token_budget or TokenBudget()
+        key = (investment_id, budget.backend, budget.overview_tokens)
+        print(f"[context_assembler] Getting overview for {investment_id}...") 
+        artifact = self.get_overview(investment_id) # Drops the rendered overviews if it changed
+        with self.overviews_lock:
+            overview = self.rendered_overviews.get(key)
+        if overview is not None:
+            return overview
         
         # Start an "overview"
-        overview = f"**Investment ID:** {metadata['id']}\n\n"
-        overview = f"**Investment Name:** {metadata['name']}\n\n"
+        overview = f"**Investment ID:** {artifact['id']}\n\n"
+        overview += f"**Investment Name:** {artifact['name']}\n\n"
         overview += "**Document Summaries:**"
         overview += f"""_This includes names of files and websites along with their summaries. 
             These can be searched using SearchAllDocuments or SearchSpecificDocument tools_\n"""
+        footer = f"\n**Investment Sector:** {artifact['sector']}"
 
-        for file_name in metadata['folder_files']:
-            summary = self.get_or_create_summary(investment_dir, file_name, is_website=False)
-            overview += f"- **{file_name}:** {summary}\n\n"
+        available = budget.overview_tokens - budget.count(overview) - budget.count(footer)
+        overview += budget.fit_summaries([(entry['name'], entry['summary']) for entry in artifact['entries']],
+                                         available, rank=lambda summaries: artifact['ranking'])
+        overview += footer
 
-        for website in metadata['websites']:
-            website_file = website.replace('https://', '').replace('http://', '').replace('/', '_')
-            summary = self.get_or_create_summary(investment_dir, website_file, is_website=True)
-            overview += f"- **{website}:** {summary}\n\n"
+        logger.info(f"Overview for {investment_id} ({budget.count(overview)} tokens) is {overview}")
+        with self.overviews_lock:
+            self.rendered_overviews[key] = overview
+        return overview
 
-        investment_sector = self.determine_sector(overview)
-        overview += f"\n**Investment Sector:** {investment_sector}"
+    def get_overview(self, investment_id):
+        """Returns the overview artifact of an investment: from memory, else from its overview.json if
+        current, else built (see `build_overview`).
 
-        logger.info(f"Overview for {investment_id} is {overview}")
-        return overview
+        Like the corpus cache, the copy in memory is revalidated on every call: it's only served while
+        the summaries it was built from are unchanged (see `overview_inputs`)."""
+        investment_dir = os.path.join(self.preprocessed_data_dir, investment_id)
+        with self.overviews_lock:
+            artifact = self.overviews.get(investment_id)
+        if artifact is not None and artifact.get('inputs') == overview_inputs(investment_dir):
+            return artifact
+        artifact = load_overview(investment_dir)
+        if artifact is None:
+            return self.build_overview(investment_id)
+        self.store_overview(investment_id, artifact)
+        return artifact
+
+    def store_overview(self, investment_id, artifact):
+        """Keeps an investment's overview artifact in memory, dropping the overviews rendered from the previous one."""
+        with self.overviews_lock:
+            self.overviews[investment_id] = artifact
+            for key in list(self.rendered_overviews):
+                if key[0] == investment_id:
+                    del self.rendered_overviews[key]
+
+    def build_overview(self, investment_id):
+        """Builds and writes the overview artifact of an investment (overview.json, next to metadata.json).
+
+        It holds the name and summary of each document and website (summarizing the ones
+        without a summary yet), their ranking for the overview's token budget, and the
+        investment's sector. It's current as long as the summaries it was built from are
+        (see `overview.py`); the "abstract" action builds it for every investment.
+
+        Args:
+            investment_id (str): The investment ID.
+
+        Returns:
+            dict: The artifact.
+        """
+        corpus = self.corpus_cache.get(investment_id)
+        metadata = corpus.metadata
+        entries = [{'name': doc['file'], 'summary': doc['summary']} for doc in corpus.documents] + \
+                  [{'name': website['url'], 'summary': website['summary']} for website in corpus.websites]
+
+        # The sector is determined from the complete summaries
+        sector_text = f"**Investment Name:** {metadata['name']}\n\n" + " ".join(entry['summary'] for entry in entries)
+        artifact = {
+            'id': metadata['id'],
+            'name': metadata['name'],
+            'sector': self.determine_sector(sector_text),
+            'entries': entries,
+            'ranking': self.rank_summaries([entry['summary'] for entry in entries]) if len(entries) > 1 else [0] * len(entries),
+        }
+        artifact = write_overview(os.path.join(self.preprocessed_data_dir, investment_id), artifact)
+        self.store_overview(investment_id, artifact)
+        logger.info(f"Built the overview of investment {investment_id} ({len(entries)} summaries)")
+        return artifact
+
+    def rank_summaries(self, summaries):
+        """Orders summaries by their similarity to the overview's key topics (`config.OVERVIEW_RANKING_QUERIES`), best first."""
+        topics = self.model.encode(config.OVERVIEW_RANKING_QUERIES)
+        scores = (self.model.encode(summaries) @ topics.T).max(axis=1)
+        return np.argsort(-scores, kind='stable').tolist()
 
     def determine_sector(self, overview):
         """Determines the investment sector based on keywords and phrases."""
@@ -368,69 +541,17 @@ class ContextAssembler(BaseModel):
         else:
             return "Unknown"
 
-### Exposed Tool #1: Searching across all investment documents!
-class SearchAllDocumentsSchema(BaseModel):
-    """Input for SearchAllDocumentsTool."""
-    investment_id: str = Field(..., description="ID of the investment to search within. NOTE = This is NOT the investment name, it's the ID!")
-    query: str = Field(..., description="Search query.")
-    top_k: int = Field(5, description="Number of top results to return.")
-
-class SearchAllDocumentsTool(BaseTool):
-    name: str = "Search All Documents"
-    description: str = "Performs a semantic search across all documents in the investment context."
-    args_schema: Type[BaseModel] = SearchAllDocumentsSchema
-    context_assembler: ContextAssembler = Field(..., description="context assembler", init_var=True)
-
-    def __init__(self, context_assembler):
-        super().__init__()
-        self.context_assembler = context_assembler
-
-    def _run(self, **kwargs: Any) -> Any:
-        investment_id = kwargs.get("investment_id")
-        query = kwargs.get("query")
-        top_k = kwargs.get("top_k", 5)  # Default to 5 if not specified
-
-        # print(f"~~~~ [Tool Use] SearchAllDocs for {investment_id}: {query} and {top_k} ~~~~")
-        investment_context = self.context_assembler.assemble_context(
-            investment_id,
-            include_full_chunks=True # TODO: Not sure if we really need this / even support this mode for assemble_context()
-        )
-        result = self.context_assembler.semantic_search(investment_context, query, top_k)
-        # print(f"~~~~ [Tool Use] Output for SearchAllDocs for {investment_id}: {query} and {top_k} ~~~~")
-        # print(f"~~~~ [Tool Use] Results: {result} ~~~~")
-        return result
-
-
-### Exposed Tool #2: Searching a specific investment documetn!
-class SearchSpecificDocumentSchema(BaseModel):
-    """Input for SearchSpecificDocumentTool."""
-    investment_id: str = Field(..., description="ID of the investment to search within.  NOTE = This is NOT the investment name, it's the ID!")
-    document_name: str = Field(..., description="Name of the document to search.")
-    query: str = Field(..., description="Search query.")
-    top_k: int = Field(5, description="Number of top results to return.")
-
-class SearchSpecificDocumentTool(BaseTool):
-    name: str = "Search Specific Document"
-    description: str = "Performs a semantic search within a specific document."
-    args_schema: Type[BaseModel] = SearchSpecificDocumentSchema
-    context_assembler: ContextAssembler = Field(..., description="context assembler", init_var=True)
-
-    def __init__(self, context_assembler):
-        super().__init__()
-        self.context_assembler = context_assembler
-
-    def _run(self, **kwargs: Any) -> Any:
-        investment_id = kwargs.get("investment_id")
-        document_name = kwargs.get("document_name")
-        query = kwargs.get("query")
-        top_k = kwargs.get("top_k", 5)
-
-        investment_context = self.context_assembler.assemble_context(investment_id)
-        return self.context_assembler.search_specific_document(investment_context, document_name, query, top_k)
-
+def __getattr__(name):
+    # The crewai tools are defined in search_tools.py, so that only the analysis (not
+    # preprocessing, summarization or testing) pays for importing crewai.
+    if name in ('SearchAllDocumentsTool', 'SearchSpecificDocumentTool', 'SearchAcrossInvestmentsTool'):
+        from . import search_tools
+        return getattr(search_tools, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Usage example
 if __name__ == "__main__":
+    from context_assembler.search_tools import SearchAllDocumentsTool, SearchSpecificDocumentTool
     assembler = ContextAssembler('preprocessing/outputs/preprocessed_data')
     investment_id = '1' # Example investment ID
 
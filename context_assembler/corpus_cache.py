@@ -0,0 +1,158 @@
+import os
+import logging
+import threading
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+
+SIGNATURE_SUBDIRS = ('summaries',) # Written next to the preprocessed files, see ContextAssembler
+
+
+def directory_signature(directory):
+    """Returns a hashable snapshot (name, mtime, size) of every file in `directory` and its summaries.
+
+    Any preprocessed file or summary being added, removed or rewritten changes the signature.
+    """
+    signature = []
+    for subdir in ('',) + SIGNATURE_SUBDIRS:
+        try:
+            with os.scandir(os.path.join(directory, subdir)) as entries:
+                signature.extend(
+                    (os.path.join(subdir, entry.name), entry.stat().st_mtime_ns, entry.stat().st_size)
+                    for entry in entries if entry.is_file()
+                )
+        except FileNotFoundError:
+            pass
+    return tuple(sorted(signature))
+
+
+class InvestmentCorpus:
+    """
+    Parsed, in-memory copy of everything preprocessed for one investment.
+
+    `documents` and `websites` hold the same dicts `assemble_context()` returns, always
+    including their 'chunks'. When the investment has a `ChunkStore`, it is kept as `store`
+    and the chunks are zero-copy views of it. The search `index` is built lazily on the
+    first query.
+    """
+
+    def __init__(self, investment_id, metadata, documents, websites, store=None):
+        self.investment_id = investment_id
+        self.metadata = metadata
+        self.documents = documents
+        self.websites = websites
+        self.store = store
+        self.index = None
+
+    @property
+    def nbytes(self):
+        """Approximate resident size of the corpus (text plus embeddings).
+
+        Memory-mapped chunk texts and embeddings are paged in and out by the OS, so they don't count.
+        """
+        size = 0
+        for entry in self.documents + self.websites:
+            size += len(entry.get('summary') or '')
+            chunks = entry.get('chunks', [])
+            if isinstance(chunks, list):
+                size += sum(len(chunk) for chunk in chunks)
+        if self.index is not None and not isinstance(self.index.embeddings, np.memmap):
+            size += self.index.embeddings.nbytes
+        return size
+
+
+class CorpusCache:
+    """
+    LRU cache of `InvestmentCorpus` objects, keyed by investment_id.
+
+    Entries are evicted least-recently-used first once either `max_entries` or the
+    `max_bytes` memory budget is exceeded (the most recent entry is always kept). An
+    entry is reloaded when the mtimes of the investment's preprocessed files change.
+    """
+
+    def __init__(self, preprocessed_data_dir, loader, max_entries=8, max_bytes=1024 ** 3):
+        self.preprocessed_data_dir = preprocessed_data_dir
+        self.loader = loader
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # investment_id -> (signature, corpus)
+        self._loading = {}  # investment_id -> Future of the corpus being loaded
+        self._lock = threading.RLock()
+
+    def get(self, investment_id):
+        """Returns the corpus of an investment, loading it if it is missing or stale.
+
+        The cache lock is only held to look up and store entries: investments load
+        concurrently, and concurrent requests for the same investment wait for a single load.
+        """
+        investment_dir = os.path.join(self.preprocessed_data_dir, investment_id)
+        signature = directory_signature(investment_dir)
+        with self._lock:
+            entry = self._entries.get(investment_id)
+            if entry is not None and entry[0] == signature:
+                self.hits += 1
+                self._entries.move_to_end(investment_id)
+                return entry[1]
+            future = self._loading.get(investment_id)
+            owner = future is None
+            if owner:
+                self.misses += 1
+                future = self._loading[investment_id] = Future()
+        if not owner:
+            return future.result()
+
+        try:
+            if entry is not None:
+                logger.info(f"Preprocessed files of investment {investment_id} changed, reloading corpus")
+            corpus = self.loader(investment_id)
+            # Loading may write missing summaries, so take the signature again afterwards.
+            signature = directory_signature(investment_dir)
+            with self._lock:
+                self._entries[investment_id] = (signature, corpus)
+                self._entries.move_to_end(investment_id)
+                self.enforce_budget()
+            future.set_result(corpus)
+            return corpus
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._loading.pop(investment_id, None)
+
+    def invalidate(self, investment_id=None):
+        """Drops one investment from the cache, or all of them."""
+        with self._lock:
+            if investment_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(investment_id, None)
+
+    def total_bytes(self):
+        with self._lock:
+            return sum(corpus.nbytes for _, corpus in self._entries.values())
+
+    def enforce_budget(self):
+        """Evicts least-recently-used entries until the cache fits its limits."""
+        with self._lock:
+            while len(self._entries) > 1 and (
+                    len(self._entries) > self.max_entries or self.total_bytes() > self.max_bytes):
+                investment_id, _ = self._entries.popitem(last=False)
+                self.evictions += 1
+                logger.info(f"Evicted investment {investment_id} from the corpus cache")
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.total_bytes(),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
@@ -0,0 +1,57 @@
+import os
+import glob
+import json
+import hashlib
+import logging
+
+import config
+
+logger = logging.getLogger(__name__)
+
+OVERVIEW_FILE = 'overview.json'
+OVERVIEW_FORMAT_VERSION = 1
+
+
+def overview_inputs(investment_dir):
+    """Returns the manifest of what an investment's overview is built from.
+
+    That is the hash of its metadata.json (which lists its documents and websites) and
+    the size and modification time of each summary. Preprocessing deletes the summary of
+    every new or changed source, so any change to the inputs changes the manifest.
+    """
+    with open(os.path.join(investment_dir, 'metadata.json'), 'rb') as f:
+        inputs = {'metadata.json': hashlib.sha256(f.read()).hexdigest()}
+    summary_files = glob.glob(os.path.join(investment_dir, 'summaries', '*.txt')) + \
+                    glob.glob(os.path.join(investment_dir, '*_summary.txt')) # Before the chunk store
+    for path in sorted(summary_files):
+        stat = os.stat(path)
+        inputs[os.path.relpath(path, investment_dir)] = [stat.st_size, stat.st_mtime_ns]
+    return inputs
+
+
+def load_overview(investment_dir):
+    """Returns the investment's overview artifact, or None if it's missing or stale."""
+    path = os.path.join(investment_dir, OVERVIEW_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        overview = json.load(f)
+    if overview.get('version') != OVERVIEW_FORMAT_VERSION or \
+            overview.get('ranking_queries') != config.OVERVIEW_RANKING_QUERIES:
+        return None
+    if overview.get('inputs') != overview_inputs(investment_dir):
+        logger.info(f"Overview of {investment_dir} is stale, its summaries changed")
+        return None
+    return overview
+
+
+def write_overview(investment_dir, overview):
+    """Writes an overview artifact atomically, recording the manifest of its inputs."""
+    overview = dict(overview, version=OVERVIEW_FORMAT_VERSION, ranking_queries=config.OVERVIEW_RANKING_QUERIES,
+                    inputs=overview_inputs(investment_dir))
+    path = os.path.join(investment_dir, OVERVIEW_FILE)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(overview, f, indent=2)
+    os.replace(tmp_path, path)
+    return overview
@@ -0,0 +1,200 @@
+import os
+import logging
+import numpy as np
+
+from tools.chunk_store import ChunkView
+from embedding_service import get_embedding_service
+
+logger = logging.getLogger(__name__)
+
+
+def website_file_name(url):
+    """Returns the file-name stem used by preprocessing for a website URL."""
+    return url.replace('https://', '').replace('http://', '').replace('/', '_')
+
+
+def normalize_rows(matrix):
+    """Returns a float32 copy of `matrix` with every row scaled to unit length."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def top_k_indices(scores, top_k):
+    """Returns the indices of the `top_k` highest scores, best first.
+
+    Uses `argpartition` so only the selected candidates get sorted.
+    """
+    if top_k <= 0 or scores.size == 0:
+        return np.array([], dtype=np.int64)
+    if top_k < scores.size:
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+    else:
+        candidates = np.arange(scores.size)
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+
+class InvestmentIndex:
+    """
+    Exact cosine-similarity index over every chunk of a single investment.
+
+    All chunk embeddings live in one contiguous, row-normalized matrix (possibly memory-
+    mapped from a `ChunkStore`), so scoring a query is a single matrix-vector product.
+    `source_ranges` maps each document / website to its (start, end) row ranges in that
+    matrix; equally named documents share a source and so have several ranges.
+    """
+
+    def __init__(self, embeddings, sources, chunks, normalized=False):
+        if not len(chunks):
+            self.embeddings = np.zeros((0, 0), dtype=np.float32)
+        else:
+            self.embeddings = embeddings if normalized else normalize_rows(embeddings)
+        self.sources = list(sources)
+        self.chunks = chunks
+        self.source_ranges = {}
+        for row, source in enumerate(self.sources):
+            ranges = self.source_ranges.setdefault(source, [])
+            if ranges and ranges[-1][1] == row:
+                ranges[-1] = (ranges[-1][0], row + 1)
+            else:
+                ranges.append((row, row + 1))
+
+    def __len__(self):
+        return len(self.chunks)
+
+    @classmethod
+    def from_parts(cls, parts):
+        """Builds an index from a list of (source, chunks, embeddings) tuples."""
+        sources, chunks, matrices = [], [], []
+        for source, source_chunks, embeddings in parts:
+            if not source_chunks:
+                continue
+            sources.extend([source] * len(source_chunks))
+            chunks.extend(source_chunks)
+            matrices.append(normalize_rows(embeddings))
+        embeddings = np.vstack(matrices) if matrices else np.zeros((0, 0), dtype=np.float32)
+        return cls(embeddings, sources, chunks, normalized=True)
+
+    @classmethod
+    def from_store(cls, store):
+        """Builds an index over the text chunks of a `ChunkStore`, without copying them.
+
+        The text chunks are the store's first rows, so the index is a view of its
+        (already normalized) embeddings and texts.
+        """
+        text_rows = store.text_rows
+        sources = [None] * text_rows
+        for doc in store.documents:
+            start, end = store.row_range(doc, 'text')
+            sources[start:end] = [doc['name']] * (end - start)
+        return cls(store.embeddings[:text_rows], sources, ChunkView(store, 0, text_rows), normalized=True)
+
+    def _ranges_for(self, sources):
+        return sorted(r for source in set(sources) for r in self.source_ranges.get(source, []))
+
+    def search(self, query_embedding, top_k=5, sources=None):
+        """Returns the `top_k` best chunks as (source, similarity, chunk) tuples.
+
+        Args:
+            query_embedding (np.ndarray): Embedding of the query (need not be normalized).
+            top_k (int, optional): Number of results to return. Defaults to 5.
+            sources (Iterable[str], optional): Restrict the search to these documents / websites.
+        """
+        if not self.chunks:
+            return []
+        query = normalize_rows(query_embedding)[0]
+
+        offset, rows = 0, None
+        if sources is None:
+            scores = self.embeddings @ query
+        else:
+            ranges = self._ranges_for(sources)
+            if not ranges:
+                return []
+            if len(ranges) == 1:
+                # A single document: score a slice (a view) rather than gathering rows.
+                offset, end = ranges[0]
+                scores = self.embeddings[offset:end] @ query
+            else:
+                rows = np.concatenate([np.arange(start, end) for start, end in ranges])
+                scores = self.embeddings[rows] @ query
+
+        results = []
+        for i in top_k_indices(scores, top_k):
+            row = offset + int(i) if rows is None else int(rows[i])
+            results.append((self.sources[row], float(scores[i]), self.chunks[row]))
+        return results
+
+
+class SemanticSearchEngine:
+    """
+    Serves semantic search over the preprocessed investments.
+
+    Indexes are built from the corpora held by a `CorpusCache`, using the chunk embeddings
+    written by `DocumentPreprocessor` (zero-copy from the investment's `ChunkStore`, or
+    from the legacy per-file .npy files), and live as long as their cached corpus does.
+    """
+
+    def __init__(self, preprocessed_data_dir, model, corpus_cache):
+        self.preprocessed_data_dir = preprocessed_data_dir
+        self._model = model # An `EmbeddingService`; None for the shared one, loaded on first use
+        self.corpus_cache = corpus_cache
+
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = get_embedding_service()
+        return self._model
+
+    def encode_query(self, query):
+        """Embeds a query through the embedding service (micro-batched, and cached across tools)."""
+        return self.model.encode_query(query)
+
+    def get_index(self, investment_id):
+        """Returns the `InvestmentIndex` of an investment, building it on first use."""
+        corpus = self.corpus_cache.get(investment_id)
+        if corpus.index is None:
+            corpus.index = self.build_index(corpus)
+            self.corpus_cache.enforce_budget()
+        return corpus.index
+
+    def build_index(self, corpus):
+        """Combines the chunks of a corpus with their embeddings from disk into an `InvestmentIndex`."""
+        if corpus.store is not None:
+            index = InvestmentIndex.from_store(corpus.store)
+            logger.info(f"Mapped search index for investment {corpus.investment_id}: {len(index)} chunks")
+            return index
+
+        investment_dir = os.path.join(self.preprocessed_data_dir, corpus.investment_id)
+
+        parts = []
+        for doc in corpus.documents:
+            base_name = os.path.splitext(doc['file'])[0]
+            embeddings_file = os.path.join(investment_dir, f"{base_name}_text_embeddings.npy")
+            parts.append(self._load_part(doc['file'], doc.get('chunks', []), embeddings_file))
+
+        for website in corpus.websites:
+            embeddings_file = os.path.join(investment_dir, f"{website_file_name(website['url'])}_embeddings.npy")
+            parts.append(self._load_part(website['url'], website.get('chunks', []), embeddings_file))
+
+        index = InvestmentIndex.from_parts(p for p in parts if p is not None)
+        logger.info(f"Built search index for investment {corpus.investment_id}: {len(index)} chunks")
+        return index
+
+    def _load_part(self, source, chunks, embeddings_file):
+        if not chunks:
+            return None
+        embeddings = np.load(embeddings_file) if os.path.exists(embeddings_file) else None
+        if embeddings is None or embeddings.ndim != 2 or embeddings.shape[0] != len(chunks):
+            # Embeddings are missing or stale; re-embed this source once, in a single batch.
+            logger.warning(f"Embeddings for {source} missing or out of sync, re-encoding {len(chunks)} chunks")
+            embeddings = self.model.encode(chunks)
+        return source, chunks, embeddings
+
+    def search(self, investment_id, query, top_k=5, sources=None):
+        """Searches the chunks of an investment, optionally restricted to some sources."""
+        index = self.get_index(investment_id)
+        return index.search(self.encode_query(query), top_k, sources)
@@ -0,0 +1,110 @@
+from typing import Type, Any, Optional
+from crewai_tools import BaseTool
+from pydantic.v1 import BaseModel, Field
+
+from instrumentation import traced_tool_run
+from .context_assembler import ContextAssembler, logger
+
+### Exposed Tool #1: Searching across all investment documents!
+class SearchAllDocumentsSchema(BaseModel):
+    """Input for SearchAllDocumentsTool."""
+    investment_id: str = Field(..., description="ID of the investment to search within. NOTE = This is NOT the investment name, it's the ID!")
+    query: str = Field(..., description="Search query.")
+    top_k: int = Field(5, description="Number of top results to return.")
+
+class SearchAllDocumentsTool(BaseTool):
+    name: str = "Search All Documents"
+    description: str = "Performs a semantic search across all documents in the investment context."
+    args_schema: Type[BaseModel] = SearchAllDocumentsSchema
+    context_assembler: ContextAssembler = Field(..., description="context assembler", init_var=True)
+
+    def __init__(self, context_assembler):
+        super().__init__()
+        self.context_assembler = context_assembler
+
+    @traced_tool_run
+    def _run(self, **kwargs: Any) -> Any:
+        investment_id = kwargs.get("investment_id")
+        query = kwargs.get("query")
+        top_k = kwargs.get("top_k", 5)  # Default to 5 if not specified
+
+        # print(f"~~~~ [Tool Use] SearchAllDocs for {investment_id}: {query} and {top_k} ~~~~")
+        investment_context = self.context_assembler.assemble_context(
+            investment_id,
+            include_full_chunks=True # TODO: Not sure if we really need this / even support this mode for assemble_context()
+        )
+        result = self.context_assembler.semantic_search(investment_context, query, top_k)
+        # print(f"~~~~ [Tool Use] Output for SearchAllDocs for {investment_id}: {query} and {top_k} ~~~~")
+        # print(f"~~~~ [Tool Use] Results: {result} ~~~~")
+        return result
+
+
+### Exposed Tool #2: Searching a specific investment documetn!
+class SearchSpecificDocumentSchema(BaseModel):
+    """Input for SearchSpecificDocumentTool."""
+    investment_id: str = Field(..., description="ID of the investment to search within.  NOTE = This is NOT the investment name, it's the ID!")
+    document_name: str = Field(..., description="Name of the document to search.")
+    query: str = Field(..., description="Search query.")
+    top_k: int = Field(5, description="Number of top results to return.")
+
+class SearchSpecificDocumentTool(BaseTool):
+    name: str = "Search Specific Document"
+    description: str = "Performs a semantic search within a specific document."
+    args_schema: Type[BaseModel] = SearchSpecificDocumentSchema
+    context_assembler: ContextAssembler = Field(..., description="context assembler", init_var=True)
+
+    def __init__(self, context_assembler):
+        super().__init__()
+        self.context_assembler = context_assembler
+
+    @traced_tool_run
+    def _run(self, **kwargs: Any) -> Any:
+        investment_id = kwargs.get("investment_id")
+        document_name = kwargs.get("document_name")
+        query = kwargs.get("query")
+        top_k = kwargs.get("top_k", 5)
+
+        investment_context = self.context_assembler.assemble_context(investment_id)
+        return self.context_assembler.search_specific_document(investment_context, document_name, query, top_k)
+
+
+
+### Exposed Tool #3: Searching across the documents of all investments!
+class SearchAcrossInvestmentsSchema(BaseModel):
+    """Input for SearchAcrossInvestmentsTool."""
+    query: str = Field(..., description="Search query.")
+    top_k: int = Field(5, description="Number of top results to return.")
+    investment_ids: Optional[str] = Field(None, description="Optional comma-separated IDs of the investments to search within (NOT the investment names). Searches all investments if omitted.")
+    document_name: Optional[str] = Field(None, description="Optional name of a document or website to restrict the search to.")
+    chunk_kind: Optional[str] = Field(None, description="Optional kind of content to search: 'text' (document text) or 'visual' (text extracted from images, charts and tables).")
+
+class SearchAcrossInvestmentsTool(BaseTool):
+    name: str = "Search Across Investments"
+    description: str = "Performs a semantic search across the documents of all investments, e.g. to compare terms between offerings."
+    args_schema: Type[BaseModel] = SearchAcrossInvestmentsSchema
+    context_assembler: ContextAssembler = Field(..., description="context assembler", init_var=True)
+
+    def __init__(self, context_assembler):
+        super().__init__()
+        self.context_assembler = context_assembler
+
+    @traced_tool_run
+    def _run(self, **kwargs: Any) -> Any:
+        investment_ids = kwargs.get("investment_ids")
+        if investment_ids:
+            investment_ids = [i.strip() for i in str(investment_ids).split(",") if i.strip()]
+        chunk_kind = kwargs.get("chunk_kind")
+        if chunk_kind not in (None, "", "text", "visual"):
+            return f"Error: chunk_kind must be 'text' or 'visual', got '{chunk_kind}'"
+
+        try:
+            return self.context_assembler.search_across_investments(
+                kwargs.get("query"),
+                kwargs.get("top_k", 5),
+                investment_ids=investment_ids or None,
+                document_name=kwargs.get("document_name") or None,
+                chunk_kind=chunk_kind or None
+            )
+        except FileNotFoundError:
+            logger.error("Portfolio index not found, build it with `python main.py index`")
+            return "Error: The cross-investment index has not been built yet."
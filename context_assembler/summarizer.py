@@ -0,0 +1,137 @@
+import logging
+import threading
+from tqdm import tqdm
+
+import config
+from instrumentation import span
+
+logger = logging.getLogger(__name__)
+
+_summarizer = None
+_summarizer_lock = threading.Lock()
+
+MIN_SUMMARY_TOKENS = 16 # floor of a summary's max_length, however short its input
+
+
+def pick_device():
+    """Returns the pipeline device: the configured one, else CUDA / Apple MPS when available, else CPU."""
+    if config.SUMMARIZATION_DEVICE is not None:
+        return config.SUMMARIZATION_DEVICE
+    import torch
+    if torch.cuda.is_available():
+        return 0
+    if getattr(torch.backends, 'mps', None) is not None and torch.backends.mps.is_available():
+        return 'mps'
+    return -1
+
+
+def get_summarizer():
+    """Returns the process-wide `ChunkSummarizer`, loading the model on first use."""
+    global _summarizer
+    with _summarizer_lock:
+        if _summarizer is None:
+            _summarizer = ChunkSummarizer()
+        return _summarizer
+
+
+class ChunkSummarizer:
+    """
+    Map-reduce summarization of document chunks with a single, shared model.
+
+    Consecutive chunks are packed into groups that fit the model's input window, which
+    are summarized in batches (map). The summaries are then packed the same way and
+    summarized again, round after round, until a single group fits (reduce). The input
+    window is never exceeded, and each summary is shorter than its input.
+    """
+
+    def __init__(self, model_name=None, batch_size=None, device=None):
+        # Imported here so that importing this module doesn't load transformers / torch.
+        from transformers import pipeline
+
+        self.model_name = model_name or config.SUMMARIZATION_MODEL
+        self.batch_size = batch_size or config.SUMMARIZATION_BATCH_SIZE
+        self.device = pick_device() if device is None else device
+        logger.info(f"Loading summarization model {self.model_name} on device {self.device}")
+        self.pipeline = pipeline("summarization", model=self.model_name, device=self.device)
+        self.tokenizer = self.pipeline.tokenizer
+        self.max_input_tokens = min(self.tokenizer.model_max_length, config.SUMMARIZATION_MAX_INPUT_TOKENS)
+        # Intermediate summaries must be short enough that several of them fit in one window.
+        self.reduce_max_length = self.max_input_tokens // 4
+        self._lock = threading.Lock() # The pipeline isn't thread-safe; concurrent crews share it
+
+    def count_tokens(self, text):
+        return len(self.tokenizer(text, add_special_tokens=False)['input_ids'])
+
+    def summarize_batch(self, texts, max_length, min_length, desc=None):
+        """Summarizes `texts` in batches of `batch_size`, returning one summary per text.
+
+        `max_length` and `min_length` are clamped to fractions of each input's length
+        (`config.SUMMARY_MAX_LENGTH_RATIO` / `SUMMARY_MIN_LENGTH_RATIO`), so that short
+        inputs aren't padded out into long summaries. Texts are batched by length, so
+        that a batch's inputs share about the same limits.
+        """
+        lengths = [min(self.count_tokens(text), self.max_input_tokens) for text in texts]
+        order = sorted(range(len(texts)), key=lengths.__getitem__)
+        summaries = [None] * len(texts)
+        batches = range(0, len(texts), self.batch_size)
+        for start in tqdm(batches, desc=desc, disable=desc is None):
+            indices = order[start:start + self.batch_size]
+            batch = [texts[i] for i in indices]
+            batch_max, batch_min = self.clamp_lengths(lengths[indices[0]], max_length, min_length)
+            with self._lock, span("summarize.batch", "summarization", items=len(batch), max_length=batch_max):
+                outputs = self.pipeline(batch, max_length=batch_max, min_length=batch_min,
+                                        truncation=True, batch_size=len(batch))
+            for i, output in zip(indices, outputs):
+                summaries[i] = output['summary_text']
+        return summaries
+
+    @staticmethod
+    def clamp_lengths(input_tokens, max_length, min_length):
+        """Returns (max_length, min_length) of the summary of an input of `input_tokens` tokens."""
+        max_length = max(MIN_SUMMARY_TOKENS, min(max_length, int(input_tokens * config.SUMMARY_MAX_LENGTH_RATIO)))
+        min_length = min(min_length, int(input_tokens * config.SUMMARY_MIN_LENGTH_RATIO), max_length // 2)
+        return max_length, min_length
+
+    def pack(self, summaries):
+        """Greedily groups consecutive summaries into texts that fit the input window."""
+        packs, current, current_tokens = [], [], 0
+        for summary in summaries:
+            tokens = self.count_tokens(summary)
+            if current and current_tokens + tokens > self.max_input_tokens:
+                packs.append(" ".join(current))
+                current, current_tokens = [], 0
+            current.append(summary)
+            current_tokens += tokens
+        if current:
+            packs.append(" ".join(current))
+        return packs
+
+    def summarize(self, chunks, file_name=None):
+        """Summarizes a document, given as a list of text chunks, into a single summary."""
+        if not chunks:
+            return ""
+        with span("summarize.document", "summarization", file=file_name, items=len(chunks)):
+            return self._summarize(chunks, file_name)
+
+    def _summarize(self, chunks, file_name):
+        # Consecutive chunks are packed into full input windows: the model reads whole
+        # windows, and each summary covers as much of the document as it can.
+        packs = self.pack(chunks)
+        final_max_length = min(config.SUMMARY_FINAL_MAX_LENGTH, self.max_input_tokens)
+        if len(packs) == 1:
+            return self.summarize_batch(packs, final_max_length, config.SUMMARY_CHUNK_MIN_LENGTH)[0]
+
+        summaries = self.summarize_batch(
+            packs, config.SUMMARY_CHUNK_MAX_LENGTH, config.SUMMARY_CHUNK_MIN_LENGTH,
+            desc=f"Processing chunks{f' of {file_name}' if file_name else ''}")
+
+        packs = self.pack(summaries)
+        rounds = 0
+        while len(packs) > 1:
+            rounds += 1
+            summaries = self.summarize_batch(
+                packs, self.reduce_max_length, min(config.SUMMARY_CHUNK_MIN_LENGTH, self.reduce_max_length // 2))
+            packs = self.pack(summaries)
+        logger.info(f"Summarized {len(chunks)} chunks of {file_name} with {rounds} intermediate reduce round(s)")
+
+        return self.summarize_batch(packs, final_max_length, config.SUMMARY_CHUNK_MIN_LENGTH)[0]
@@ -0,0 +1,77 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+import numpy as np
+
+# Add the parent directory to the Python path to allow importing from context_assembler
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from context_assembler.ann_index import PortfolioIndex, build_portfolio_index, collect_portfolio_chunks
+
+class TestPortfolioIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.data_dir = os.path.join(self.tmp_dir.name, 'preprocessed_data')
+        self.index_dir = os.path.join(self.tmp_dir.name, 'portfolio_index')
+        rng = np.random.default_rng(0)
+
+        for investment_id in ['1', '2']:
+            investment_dir = os.path.join(self.data_dir, investment_id)
+            os.makedirs(investment_dir)
+            with open(os.path.join(investment_dir, 'metadata.json'), 'w') as f:
+                json.dump({"id": investment_id, "name": f"Investment {investment_id}",
+                           "folder_files": ["Exhibit A.pdf"], "websites": ["https://example.com/deal"]}, f)
+            with open(os.path.join(investment_dir, 'Exhibit A_chunks.json'), 'w') as f:
+                json.dump({"text_chunks": [f"Text {investment_id}-{i}" for i in range(40)],
+                           "visual_chunks": [f"Chart {investment_id}"]}, f)
+            np.save(os.path.join(investment_dir, 'Exhibit A_text_embeddings.npy'), rng.normal(size=(40, 16)))
+            np.save(os.path.join(investment_dir, 'Exhibit A_visual_embeddings.npy'), rng.normal(size=(1, 16)))
+            with open(os.path.join(investment_dir, 'example.com_deal_chunks.json'), 'w') as f:
+                json.dump({"chunks": [f"Website {investment_id}"]}, f)
+            np.save(os.path.join(investment_dir, 'example.com_deal_embeddings.npy'), rng.normal(size=(1, 16)))
+
+        self.query = rng.normal(size=16)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_full_probe_matches_exact_search(self):
+        build_portfolio_index(self.data_dir, self.index_dir, n_lists=6)
+        index = PortfolioIndex.load(self.index_dir)
+        self.assertEqual(len(index), 84)
+
+        embeddings, records = collect_portfolio_chunks(self.data_dir)
+        normalized = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+        scores = normalized @ (self.query / np.linalg.norm(self.query))
+        expected = [records[i]['text'] for i in np.argsort(-scores)[:5]]
+
+        results = index.search(self.query, top_k=5, n_probe=6)
+        self.assertEqual([r['text'] for r in results], expected)
+
+    def test_filters(self):
+        build_portfolio_index(self.data_dir, self.index_dir, n_lists=6)
+        index = PortfolioIndex.load(self.index_dir)
+
+        results = index.search(self.query, top_k=5, n_probe=1, investment_ids=['2'], kind='visual')
+        self.assertEqual([(r['investment_id'], r['kind'], r['text']) for r in results], [('2', 'visual', 'Chart 2')])
+
+        results = index.search(self.query, top_k=5, document_name='https://example.com/deal')
+        self.assertEqual(sorted(r['text'] for r in results), ['Website 1', 'Website 2'])
+
+    def test_rebuild_keeps_the_index_being_read(self):
+        build_portfolio_index(self.data_dir, self.index_dir, n_lists=6)
+        old = PortfolioIndex.load(self.index_dir)
+        expected = [r['text'] for r in old.search(self.query, top_k=3, n_probe=6)]
+
+        build_portfolio_index(self.data_dir, self.index_dir, n_lists=4)
+        self.assertEqual([r['text'] for r in old.search(self.query, top_k=3, n_probe=6)], expected)
+        self.assertEqual(len(PortfolioIndex.load(self.index_dir).centroids), 4)
+
+        build_portfolio_index(self.data_dir, self.index_dir, n_lists=4)
+        generations = [d for d in os.listdir(self.index_dir) if d.startswith('index-')]
+        self.assertEqual(len(generations), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,6 +3,8 @@ from unittest.mock import patch, MagicMock
 import sys
 import os
 import json
+import tempfile
+import numpy as np
 import torch
 
 # Add the parent directory to the Python path to allow importing from context_assembler
@@ -52,18 +54,14 @@ class TestContextAssembler(unittest.TestCase):
         self.assertIn('chunks', context['documents'][0])
         self.assertIn('chunks', context['websites'][0])
 
-    @patch('context_assembler.context_assembler.util.pytorch_cos_sim')
-    def test_semantic_search(self, mock_cos_sim):
+    def test_semantic_search(self):
         mock_context = {
             'documents': [{'file': 'doc1.pdf', 'chunks': ['This is a test chunk']}],
             'websites': [{'url': 'https://example.com', 'chunks': ['This is another test chunk']}]
         }
 
-        # Mock the encode method to return a tensor of the correct type
-        self.assembler.model.encode.return_value = torch.tensor([1.0, 0.0, 0.0], dtype=torch.float32)
-
-        # Mock the pytorch_cos_sim function
-        mock_cos_sim.return_value = torch.tensor([[0.8]])
+        # Mock the embedding model to return one embedding per input text
+        self.assembler.model.model.encode.side_effect = lambda texts, **kwargs: np.array([[1.0, 0.0, 0.0]] * len(texts))
 
         results = self.assembler.semantic_search(mock_context, 'test query', top_k=2)
 
@@ -71,10 +69,71 @@ class TestContextAssembler(unittest.TestCase):
         self.assertIsInstance(results[0], tuple)
         self.assertEqual(len(results[0]), 3)  # source, similarity, chunk
 
+    def test_semantic_search_uses_precomputed_embeddings(self):
+        with tempfile.TemporaryDirectory() as data_dir:
+            investment_dir = os.path.join(data_dir, '1')
+            os.makedirs(investment_dir)
+            with open(os.path.join(investment_dir, 'metadata.json'), 'w') as f:
+                json.dump({"id": "1", "name": "Test Investment", "folder_files": ["doc1.pdf"], "websites": []}, f)
+            with open(os.path.join(investment_dir, 'doc1_chunks.json'), 'w') as f:
+                json.dump({"text_chunks": ["About jobs", "About risks", "About funds"]}, f)
+            with open(os.path.join(investment_dir, 'doc1_summary.txt'), 'w') as f:
+                f.write('Summary of doc1')
+            np.save(os.path.join(investment_dir, 'doc1_text_embeddings.npy'),
+                    np.array([[1.0, 0.0], [0.0, 1.0], [0.6, 0.8]], dtype=np.float32))
+
+            assembler = ContextAssembler(data_dir)
+            assembler.model.model.encode.reset_mock(side_effect=True)
+            assembler.model.model.encode.return_value = np.array([[0.0, 2.0]])
+            context = {'metadata': {'id': '1'}, 'documents': [{'file': 'doc1.pdf'}]}
+
+            results = assembler.semantic_search(context, 'risks', top_k=2)
+            assembler.semantic_search(context, 'risks again', top_k=2)
+            assembler.semantic_search(context, '  Risks ', top_k=2) # Served from the query cache
+
+            self.assertEqual([chunk for _, _, chunk in results], ['About risks', 'About funds'])
+            self.assertAlmostEqual(results[0][1], 1.0, places=5)
+            # Only the queries are embedded; chunk embeddings come from the .npy file
+            self.assertEqual(assembler.model.model.encode.call_count, 2)
+
+    def test_assemble_context_is_cached_until_files_change(self):
+        with tempfile.TemporaryDirectory() as data_dir:
+            investment_dir = os.path.join(data_dir, '1')
+            os.makedirs(investment_dir)
+            with open(os.path.join(investment_dir, 'metadata.json'), 'w') as f:
+                json.dump({"id": "1", "name": "Test Investment", "folder_files": ["doc1.pdf"], "websites": []}, f)
+            with open(os.path.join(investment_dir, 'doc1_summary.txt'), 'w') as f:
+                f.write('Summary of doc1')
+            with open(os.path.join(investment_dir, 'doc1_chunks.json'), 'w') as f:
+                json.dump({"text_chunks": ["Chunk 1"]}, f)
+
+            assembler = ContextAssembler(data_dir)
+            mock_load_corpus = MagicMock(wraps=assembler.corpus_cache.loader)
+            assembler.corpus_cache.loader = mock_load_corpus
+            assembler.assemble_context('1', include_full_chunks=True)
+            context = assembler.assemble_context('1', include_full_chunks=True)
+            self.assertEqual(mock_load_corpus.call_count, 1)
+            self.assertEqual(context['documents'][0]['chunks'], ["Chunk 1"])
+
+            with open(os.path.join(investment_dir, 'doc1_chunks.json'), 'w') as f:
+                json.dump({"text_chunks": ["Chunk 1", "Chunk 2 (amended)"]}, f)
+            os.utime(os.path.join(investment_dir, 'doc1_chunks.json'), ns=(0, 0))
+
+            context = assembler.assemble_context('1', include_full_chunks=True)
+            self.assertEqual(mock_load_corpus.call_count, 2)
+            self.assertEqual(context['documents'][0]['chunks'], ["Chunk 1", "Chunk 2 (amended)"])
+
+    @patch('context_assembler.context_assembler.overview_inputs', return_value={'summaries/doc1.txt': [15, 1]})
+    @patch('context_assembler.context_assembler.write_overview',
+           side_effect=lambda investment_dir, overview: dict(overview, inputs={'summaries/doc1.txt': [15, 1]}))
+    @patch('context_assembler.context_assembler.load_overview', return_value=None)
+    @patch('context_assembler.context_assembler.ContextAssembler.rank_summaries', return_value=[0, 1])
     @patch('context_assembler.context_assembler.open')
     @patch('context_assembler.context_assembler.json.load')
     @patch('context_assembler.context_assembler.ContextAssembler.get_or_create_summary')
-    def test_get_investment_overview(self, mock_get_or_create_summary, mock_json_load, mock_open):
+    def test_get_investment_overview(self, mock_get_or_create_summary, mock_json_load, mock_open,
+                                     mock_rank_summaries, mock_load_overview, mock_write_overview,
+                                     mock_overview_inputs):
         mock_json_load.return_value = {
             "id": "1",
             "name": "Test Investment",
@@ -90,6 +149,16 @@ class TestContextAssembler(unittest.TestCase):
         self.assertIn('Summary of doc1', overview)
         self.assertIn('Summary of website', overview)
 
+        # Built once, then served from memory
+        self.assertEqual(mock_write_overview.call_count, 1)
+        self.assertEqual(self.assembler.get_investment_overview('1'), overview)
+        self.assertEqual(mock_get_or_create_summary.call_count, 2)
+
+        # Rebuilt once a summary changed
+        mock_overview_inputs.return_value = {'summaries/doc1.txt': [20, 2]}
+        self.assembler.get_investment_overview('1')
+        self.assertEqual(mock_write_overview.call_count, 2)
+
     @patch('context_assembler.context_assembler.ContextAssembler.semantic_search')
     def test_search_specific_document(self, mock_semantic_search):
         mock_context = {
@@ -0,0 +1,39 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+
+# Add the parent directory to the Python path to allow importing from context_assembler
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from context_assembler.overview import load_overview, write_overview
+
+class TestOverviewArtifact(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.investment_dir = self.tmp_dir.name
+        os.makedirs(os.path.join(self.investment_dir, 'summaries'))
+        self.write('metadata.json', json.dumps({'id': '1', 'name': 'Test', 'folder_files': ['a.pdf'], 'websites': []}))
+        self.write('summaries/a.txt', 'Summary of a')
+        write_overview(self.investment_dir, {'id': '1', 'name': 'Test', 'sector': 'Unknown',
+                                             'entries': [{'name': 'a.pdf', 'summary': 'Summary of a'}], 'ranking': [0]})
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write(self, name, content):
+        with open(os.path.join(self.investment_dir, name), 'w') as f:
+            f.write(content)
+
+    def test_current_until_a_summary_changes(self):
+        self.assertEqual(load_overview(self.investment_dir)['sector'], 'Unknown')
+        self.write('summaries/a.txt', 'A new, longer summary of a')
+        self.assertIsNone(load_overview(self.investment_dir))
+
+    def test_stale_when_a_document_is_added(self):
+        self.write('metadata.json', json.dumps({'id': '1', 'name': 'Test', 'folder_files': ['a.pdf', 'b.pdf'], 'websites': []}))
+        self.assertIsNone(load_overview(self.investment_dir))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import unittest
+import sys
+import os
+
+# Add the parent directory to the Python path to allow importing from context_assembler
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from context_assembler.token_budget import TokenBudget
+
+class TestTokenBudget(unittest.TestCase):
+    def setUp(self):
+        # The 'google' backend has no local tokenizer: 4 characters per token
+        self.budget = TokenBudget('google', context_window=1000, overview_tokens=200)
+
+    def test_everything_fits(self):
+        entries = [('a.pdf', 'Short summary.'), ('b.pdf', 'Another one.')]
+        self.assertEqual(self.budget.fit_summaries(entries, 200),
+                         "- **a.pdf:** Short summary.\n\n- **b.pdf:** Another one.\n\n")
+
+    def test_ranked_summaries_are_truncated_to_budget(self):
+        long_summary = "The project creates jobs. " * 40
+        entries = [('memo.pdf', long_summary), ('plan.pdf', long_summary), ('site.com', long_summary)]
+
+        # plan.pdf ranks first, so it gets what's left once every summary has its excerpt
+        rendered = self.budget.fit_summaries(entries, 260, rank=lambda summaries: [1, 0, 2])
+
+        self.assertLessEqual(self.budget.count(rendered), 260)
+        parts = rendered.split("- **")[1:]
+        self.assertEqual([part.split(":**")[0] for part in parts], ['memo.pdf', 'plan.pdf', 'site.com'])
+        self.assertTrue(all(part.rstrip().endswith("[…]") for part in parts))
+        self.assertGreater(len(parts[1]), len(parts[0]))
+        self.assertEqual(len(parts[0]), len(parts[2]))
+
+        # Without room for every name, the lowest ranked are only counted
+        rendered = self.budget.fit_summaries(entries, 20, rank=lambda summaries: [1, 0, 2])
+        self.assertLessEqual(self.budget.count(rendered), 20)
+        self.assertIn('plan.pdf', rendered)
+        self.assertNotIn('site.com', rendered)
+        self.assertIn('more document(s)', rendered)
+
+if __name__ == '__main__':
+    unittest.main()
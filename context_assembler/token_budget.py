@@ -0,0 +1,154 @@
+import logging
+
+import config
+
+logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 4 # estimate used without a tokenizer
+TRUNCATION_MARK = " […]"
+
+_encodings = {}
+
+
+def load_encoding(name):
+    """Returns the tiktoken encoding `name`, or None if tiktoken (or the encoding's data) is unavailable."""
+    if name is None:
+        return None
+    if name not in _encodings:
+        try:
+            import tiktoken
+            _encodings[name] = tiktoken.get_encoding(name)
+        except Exception as e:
+            logger.warning(f"Tokenizer {name} unavailable ({e}), estimating {CHARS_PER_TOKEN} characters per token")
+            _encodings[name] = None
+    return _encodings[name]
+
+
+class TokenBudget:
+    """
+    Measures prompt pieces in the tokens of a target model, and fits them into its context window.
+
+    The overview of an investment (one summary per document) is inlined into every task
+    prompt, so it gets a fixed share of the context window (`overview_tokens`); the rest
+    is left to the task instructions, the agent's scaffolding, its tool calls and its answer.
+    """
+
+    def __init__(self, backend=None, context_window=None, overview_tokens=None):
+        """
+        Args:
+            backend (str, optional): The LLM backend, as named in `config.LLM_CONTEXT_WINDOWS` (e.g. 'ollama').
+                Unknown backends (and None) get `config.LLM_DEFAULT_CONTEXT_WINDOW`.
+            context_window (int, optional): Overrides the backend's context window, in tokens.
+            overview_tokens (int, optional): Overrides the investment overview's budget, in tokens.
+        """
+        self.backend = backend
+        self.context_window = context_window or config.LLM_CONTEXT_WINDOWS.get(backend, config.LLM_DEFAULT_CONTEXT_WINDOW)
+        self.overview_tokens = overview_tokens or min(
+            config.OVERVIEW_MAX_TOKENS, int(self.context_window * config.OVERVIEW_CONTEXT_SHARE))
+        self.encoding = load_encoding(config.LLM_TOKENIZERS.get(backend, config.LLM_DEFAULT_TOKENIZER))
+
+    def count(self, text):
+        if self.encoding is None:
+            return -(-len(text) // CHARS_PER_TOKEN)
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text, max_tokens):
+        """Returns `text` cut to at most `max_tokens` tokens (mark included), at a sentence end where possible."""
+        if self.count(text) <= max_tokens:
+            return text
+        max_tokens -= self.count(TRUNCATION_MARK)
+        if max_tokens <= 0:
+            return ""
+        if self.encoding is None:
+            cut = text[:max_tokens * CHARS_PER_TOKEN]
+        else:
+            cut = self.encoding.decode(self.encoding.encode(text, disallowed_special=())[:max_tokens])
+        sentence_end = cut.rfind(". ")
+        if sentence_end > len(cut) // 2:
+            cut = cut[:sentence_end + 1]
+        return cut.rstrip() + TRUNCATION_MARK
+
+    def fit_summaries(self, entries, budget, rank=None):
+        """Renders (name, summary) entries as a markdown list of at most `budget` tokens.
+
+        When everything fits, every summary is kept whole. Otherwise, the entries are taken
+        in the order given by `rank`: every name is listed first (agents need them to search
+        a specific document), then each summary gets `config.OVERVIEW_MIN_SUMMARY_TOKENS`,
+        then the remaining budget completes the summaries, best ranked first. Entries are
+        rendered in their original order.
+
+        Args:
+            entries (list[tuple[str, str]]): The (name, summary) of each document / website.
+            budget (int): The tokens available.
+            rank (Callable[[list[str]], list[int]], optional): Orders the summaries, most
+                important first; only called when they don't fit. Defaults to their order.
+
+        Returns:
+            str: The rendered list.
+        """
+        lines = [f"- **{name}:** " for name, _ in entries]
+        summaries = [summary for _, summary in entries]
+        full = "".join(f"{line}{summary}\n\n" for line, summary in zip(lines, summaries))
+        if self.count(full) <= budget:
+            return full
+
+        order = list(rank(summaries)) if rank else list(range(len(entries)))
+        summary_tokens = [self.count(summary) for summary in summaries]
+        left = budget
+
+        # 1) Names, best ranked first; the others are only counted
+        listed, omitted = [], []
+        omitted_note = "- _{} more document(s), not listed here_\n"
+        reserve = self.count(omitted_note.format(len(entries)))
+        for i in order:
+            cost = self.count(lines[i] + "\n\n")
+            if cost <= left - reserve:
+                listed.append(i)
+                left -= cost
+            else:
+                omitted.append(i)
+        if omitted:
+            left -= reserve
+
+        # 2) A short excerpt of each summary, then 3) the rest of the summaries, best ranked first
+        allowed = dict.fromkeys(listed, 0)
+        for cap in (config.OVERVIEW_MIN_SUMMARY_TOKENS, None):
+            for i in listed:
+                want = summary_tokens[i] if cap is None else min(summary_tokens[i], cap)
+                extra = max(0, min(want - allowed[i], left))
+                allowed[i] += extra
+                left -= extra
+
+        rendered = "".join(f"{lines[i]}{self.truncate(summaries[i], allowed[i])}\n\n"
+                           for i in range(len(entries)) if i in allowed)
+        if omitted:
+            rendered += omitted_note.format(len(omitted))
+        truncated = sum(allowed[i] < summary_tokens[i] for i in listed)
+        logger.info(f"Overview summaries cut from {self.count(full)} to ~{budget - left} tokens: "
+                    f"{truncated} truncated, {len(omitted)} omitted")
+        return rendered
+
+    def report(self, label, prompts, pieces=None):
+        """Measures prompts before they're sent, warning about those that leave too little of the context window.
+
+        Args:
+            label (str): What the prompts are for (e.g. the investment's name), for the log.
+            prompts (dict[str, str]): The prompts (e.g. task descriptions), by name.
+            pieces (dict[str, str], optional): Parts of the prompts to measure too (e.g. the overview).
+
+        Returns:
+            dict: The token count of each prompt and piece, and the context window.
+        """
+        counts = {name: self.count(text) for name, text in (pieces or {}).items()}
+        counts.update({name: self.count(text) for name, text in prompts.items()})
+        available = self.context_window - config.PROMPT_RESERVED_TOKENS
+        lines = [f"Prompt tokens for {label} ({self.backend or 'default'} backend, "
+                 f"context window {self.context_window}, {config.PROMPT_RESERVED_TOKENS} reserved for tools and answers):"]
+        lines += [f"  {name:<32}{tokens:>8}" + ("  TOO LONG" if name in prompts and tokens > available else "")
+                  for name, tokens in counts.items()]
+        logger.info("\n".join(lines))
+        for name in prompts:
+            if counts[name] > available:
+                logger.warning(f"{label}: the {name} prompt ({counts[name]} tokens) leaves less than "
+                               f"{config.PROMPT_RESERVED_TOKENS} tokens of the {self.context_window}-token context window")
+        return dict(counts, context_window=self.context_window)
@@ -0,0 +1,178 @@
+import time
+import queue
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+
+import config
+from instrumentation import span
+
+logger = logging.getLogger(__name__)
+
+_services = {}
+_services_lock = threading.Lock()
+
+
+def get_embedding_service(model_name=None):
+    """Returns the process-wide `EmbeddingService` of a model, loading the model on first use."""
+    model_name = model_name or config.EMBEDDING_MODEL
+    with _services_lock:
+        if model_name not in _services:
+            _services[model_name] = EmbeddingService(model_name)
+        return _services[model_name]
+
+
+def quantize(embeddings, dtype):
+    """Converts normalized float32 embeddings to `dtype`: float32, float16, or int8 (scaled by 127)."""
+    dtype = np.dtype(dtype)
+    if dtype == np.int8:
+        return np.clip(np.rint(embeddings * 127), -127, 127).astype(np.int8)
+    return embeddings.astype(dtype, copy=False)
+
+
+def dequantize(embeddings):
+    """Inverse of `quantize`: returns float32 embeddings."""
+    if embeddings.dtype == np.int8:
+        return embeddings.astype(np.float32) / 127
+    return embeddings.astype(np.float32, copy=False)
+
+
+class EmbeddingService:
+    """
+    One embedding model per process, shared by preprocessing and every search tool.
+
+    - `encode` embeds a list of texts in batches (e.g. the chunks of a document).
+    - `encode_query` embeds a single query. Concurrent queries (from several tools or
+      agents) are micro-batched: the first waiting query is held for at most
+      `max_wait_ms` while more arrive, and up to `max_batch_size` are embedded in one
+      forward pass. Query embeddings are kept in an LRU cache, keyed by the query with
+      whitespace (and, for uncased models, case) normalized.
+
+    All embeddings are L2-normalized once, here, so cosine similarity is a dot product.
+    """
+
+    def __init__(self, model_name, max_batch_size=None, max_wait_ms=None, query_cache_size=None, device=None):
+        # Imported here so that importing this module doesn't load torch.
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name = model_name
+        logger.info(f"Loading embedding model {model_name}")
+        self.model = SentenceTransformer(model_name, device=device)
+        self.tokenizer = self.model.tokenizer
+        self.max_seq_length = self.model.max_seq_length
+        self.max_batch_size = max_batch_size or config.EMBEDDING_MAX_BATCH_SIZE
+        self.max_wait = (config.EMBEDDING_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms) / 1000
+        self.query_cache_size = config.EMBEDDING_QUERY_CACHE_SIZE if query_cache_size is None else query_cache_size
+        self.lowercase = bool(getattr(self.tokenizer, 'do_lower_case', False))
+
+        self._model_lock = threading.Lock() # One forward pass at a time
+        self._cache = OrderedDict() # normalized query -> float32 embedding
+        self._cache_lock = threading.Lock()
+        self._requests = queue.Queue() # (normalized query, Future)
+        self._batcher = None
+        self._batcher_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.batches = 0
+        self.batched_queries = 0
+
+    def _encode(self, texts, batch_size):
+        texts = list(texts)
+        with self._model_lock, span("embedding.encode", "embedding", items=len(texts)):
+            embeddings = self.model.encode(texts, batch_size=batch_size,
+                                           normalize_embeddings=True, convert_to_numpy=True)
+        return np.asarray(embeddings, dtype=np.float32)
+
+    def encode(self, texts, batch_size=None, dtype='float32'):
+        """Embeds `texts` in batches.
+
+        Args:
+            texts (list[str]): The texts to embed.
+            batch_size (int, optional): Texts per forward pass. Defaults to `max_batch_size`.
+            dtype (str, optional): 'float32' (default), 'float16' or 'int8' (see `quantize`).
+
+        Returns:
+            np.ndarray: One normalized embedding per text, of shape (len(texts), dim).
+        """
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, self.model.get_sentence_embedding_dimension()), dtype=np.dtype(dtype))
+        return quantize(self._encode(texts, batch_size or self.max_batch_size), dtype)
+
+    def query_key(self, query):
+        key = " ".join(str(query).split())
+        return key.lower() if self.lowercase else key
+
+    def encode_query(self, query):
+        """Embeds a single query, via the query cache and the micro-batcher. Returns a float32 vector."""
+        with span("embedding.query", "embedding") as s:
+            key = self.query_key(query)
+            with self._cache_lock:
+                embedding = self._cache.get(key)
+                if embedding is not None:
+                    self._cache.move_to_end(key)
+                    self.hits += 1
+                    s.set(cache_hit=True)
+                    return embedding
+                self.misses += 1
+            s.set(cache_hit=False)
+
+            future = Future()
+            self._ensure_batcher()
+            self._requests.put((key, future))
+            embedding = future.result()
+
+            with self._cache_lock:
+                self._cache[key] = embedding
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.query_cache_size:
+                    self._cache.popitem(last=False)
+            return embedding
+
+    def _ensure_batcher(self):
+        with self._batcher_lock:
+            if self._batcher is None:
+                self._batcher = threading.Thread(target=self._batch_queries, name="embedding-batcher", daemon=True)
+                self._batcher.start()
+
+    def _batch_queries(self):
+        while True:
+            batch = [self._requests.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._requests.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            # Identical queries in one batch are embedded once.
+            unique = list(dict.fromkeys(key for key, _ in batch))
+            try:
+                embeddings = dict(zip(unique, self._encode(unique, len(unique))))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.batched_queries += len(batch)
+            for key, future in batch:
+                future.set_result(embeddings[key])
+
+    def stats(self):
+        with self._cache_lock:
+            lookups = self.hits + self.misses
+            return {
+                'model': self.model_name,
+                'query_cache_entries': len(self._cache),
+                'query_cache_hits': self.hits,
+                'query_cache_misses': self.misses,
+                'query_cache_hit_rate': self.hits / lookups if lookups else 0.0,
+                'query_batches': self.batches,
+                'mean_query_batch_size': self.batched_queries / self.batches if self.batches else 0.0,
+            }
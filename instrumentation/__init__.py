@@ -0,0 +1,10 @@
+from .tracer import Tracer, Span, get_tracer, span, traced, traced_tool_run
+
+__all__ = ['Tracer', 'Span', 'get_tracer', 'span', 'traced', 'traced_tool_run', 'LLMTraceHandler', 'trace_llm']
+
+def __getattr__(name):
+    # The LLM callbacks import langchain, so they are only imported when used
+    if name in ('LLMTraceHandler', 'trace_llm'):
+        from . import llm
+        return getattr(llm, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
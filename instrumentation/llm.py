@@ -0,0 +1,73 @@
+import threading
+from langchain_core.callbacks import BaseCallbackHandler
+
+from .tracer import Span, get_tracer
+
+
+def trace_llm(llm, backend):
+    """Records every call of `llm` (any LangChain LLM or chat model) as an `llm:<backend>` span. Returns the handler."""
+    callbacks = list(llm.callbacks or [])
+    handler = next((callback for callback in callbacks if isinstance(callback, LLMTraceHandler)), None)
+    if handler is None:
+        # After the concurrency limiter (see analysis/limits.py), so that the wait for a slot isn't counted
+        handler = LLMTraceHandler(backend)
+        llm.callbacks = callbacks + [handler]
+    return handler
+
+
+class LLMTraceHandler(BaseCallbackHandler):
+    """
+    LangChain callback recording each LLM call as a span, with its prompt and completion tokens.
+
+    Tokens come from the backend's `llm_output['token_usage']` (OpenAI), or from each
+    generation's `generation_info` (Ollama, see ollama_wrapper.py, which also reports
+    the time to first token). Calls answered from the LLM cache don't reach the backend
+    and aren't recorded here (see the `llm_cache.lookup` spans).
+    """
+
+    run_inline = True
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._spans = {} # run_id -> Span
+        self._lock = threading.Lock()
+
+    def _start(self, run_id, prompts):
+        span = Span(f"llm:{self.backend}", "llm", {'prompts': len(prompts), 'prompt_chars': sum(map(len, prompts))})
+        with self._lock:
+            self._spans[run_id] = span
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id, prompts)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(run_id, [str(message.content) for batch in messages for message in batch])
+
+    def _finish(self, run_id, **attributes):
+        with self._lock:
+            span = self._spans.pop(run_id, None)
+        if span is None:
+            return
+        span.set(**attributes)
+        span.finish()
+        get_tracer().record(span.to_event())
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        usage = (response.llm_output or {}).get('token_usage') or {}
+        tokens_in, tokens_out = usage.get('prompt_tokens', 0), usage.get('completion_tokens', 0)
+        ttfts = []
+        for generations in response.generations:
+            for generation in generations:
+                info = generation.generation_info or {}
+                if not usage:
+                    tokens_in += info.get('prompt_tokens', 0)
+                    tokens_out += info.get('completion_tokens', 0)
+                if 'ttft_s' in info:
+                    ttfts.append(info['ttft_s'] * 1000)
+        attributes = {'tokens_in': tokens_in, 'tokens_out': tokens_out}
+        if ttfts:
+            attributes['ttft_ms'] = max(ttfts)
+        self._finish(run_id, **attributes)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, error=type(error).__name__)
@@ -0,0 +1,52 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+
+# Add the parent directory to the Python path to allow importing from instrumentation
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from instrumentation.tracer import Tracer, TRACE_FILE, SUMMARY_FILE
+
+class TestTracer(unittest.TestCase):
+    def test_summary_sums_tokens_and_cache_hits(self):
+        tracer = Tracer()
+        for tokens_out, hit in [(10, True), (30, False)]:
+            with tracer.span("llm:ollama", "llm", tokens_in=100) as s:
+                s.set(tokens_out=tokens_out, cache_hit=hit)
+        with self.assertRaises(ValueError):
+            with tracer.span("tool:Web Search", "tool"):
+                raise ValueError("timeout")
+
+        summary = tracer.summary()
+        self.assertEqual(summary["llm:ollama"]["calls"], 2)
+        self.assertEqual(summary["llm:ollama"]["tokens_in"], 200)
+        self.assertEqual(summary["llm:ollama"]["tokens_out"], 40)
+        self.assertEqual(summary["llm:ollama"]["cache_hit"], 1)
+        self.assertEqual(summary["tool:Web Search"]["errors"], 1)
+
+    def test_captured_spans_are_merged_into_the_trace(self):
+        worker, parent = Tracer(), Tracer()
+        with worker.capture() as spans:
+            with worker.span("pdf.read", "pdf", bytes=2048):
+                pass
+        self.assertEqual(worker.events, [])
+
+        parent.merge(spans)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            parent.write_trace(tmp_dir)
+            with open(os.path.join(tmp_dir, TRACE_FILE)) as f:
+                events = json.load(f)['traceEvents']
+            self.assertTrue(os.path.exists(os.path.join(tmp_dir, SUMMARY_FILE)))
+        self.assertEqual([(e['name'], e['ph'], e['args']['bytes']) for e in events], [("pdf.read", "X", 2048)])
+
+    def test_disabled_tracer_records_nothing(self):
+        tracer = Tracer(enabled=False)
+        with tracer.span("embedding.encode"):
+            pass
+        self.assertEqual(tracer.summary(), {})
+        self.assertIsNone(tracer.write_trace("unused"))
+
+if __name__ == '__main__':
+    unittest.main()
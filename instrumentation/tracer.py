@@ -0,0 +1,204 @@
+import os
+import json
+import time
+import logging
+import functools
+import threading
+from contextlib import contextmanager
+
+import config
+
+logger = logging.getLogger(__name__)
+
+TRACE_FILE = "trace.json"
+SUMMARY_FILE = "trace_summary.txt"
+# Span attributes summed per span name in the summary (others are kept in the trace only)
+SUMMED_ATTRIBUTES = ('tokens_in', 'tokens_out', 'bytes', 'items', 'cache_hit')
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer():
+    """Returns the process-wide `Tracer`."""
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            _tracer = Tracer(enabled=config.TRACE_ENABLED, max_spans=config.TRACE_MAX_SPANS)
+        return _tracer
+
+
+def span(name, category="app", **attributes):
+    """Times a block as a span of the process-wide tracer (see `Tracer.span`)."""
+    return get_tracer().span(name, category, **attributes)
+
+
+def traced(name, category="app"):
+    """Decorator timing every call of a function as a span."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name, category):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def traced_tool_run(run):
+    """Decorator for an agent tool's `_run`: times each call as a `tool:<tool name>` span, with the output's size."""
+    @functools.wraps(run)
+    def wrapper(self, **kwargs):
+        with span(f"tool:{self.name}", "tool", **{key: str(value)[:200] for key, value in kwargs.items()}) as s:
+            output = run(self, **kwargs)
+            s.set(output_chars=len(str(output)) if output is not None else 0)
+            return output
+    return wrapper
+
+
+class Span:
+    """A timed operation: a name, a category, a start, a duration, and attributes (tokens, bytes, cache hits...)."""
+
+    __slots__ = ('name', 'category', 'start_us', 'duration_us', 'pid', 'tid', 'attributes', '_start')
+
+    def __init__(self, name, category, attributes):
+        self.name = name
+        self.category = category
+        self.attributes = attributes
+        self.pid = os.getpid()
+        self.tid = threading.get_ident()
+        self.start_us = time.time_ns() // 1000 # wall clock, so that spans of several processes line up
+        self.duration_us = None
+        self._start = time.perf_counter()
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def finish(self):
+        self.duration_us = int((time.perf_counter() - self._start) * 1e6)
+
+    def to_event(self):
+        """Returns the span as a Chrome trace "complete" event."""
+        return {'name': self.name, 'cat': self.category, 'ph': 'X', 'ts': self.start_us, 'dur': self.duration_us,
+                'pid': self.pid, 'tid': self.tid, 'args': self.attributes}
+
+
+class Tracer:
+    """
+    Records spans (timed operations with attributes) for the whole process, from any thread.
+
+    Spans are written as a Chrome trace (`write_trace`; open it in chrome://tracing or
+    Perfetto) and summarized per span name: calls, total / mean / max time, and the sum of
+    the token, byte, item and cache-hit attributes (`summary`).
+
+    Spans recorded in worker processes are `capture`d there, returned with the worker's
+    result and `merge`d into the parent's tracer.
+    """
+
+    def __init__(self, enabled=True, max_spans=None):
+        self.enabled = enabled
+        self.max_spans = max_spans
+        self.events = []
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._local = threading.local() # .captured: list of events, while capturing
+
+    @contextmanager
+    def span(self, name, category="app", **attributes):
+        """Times the block as a span. Yields it, so that attributes can be added with `span.set(...)`."""
+        s = Span(name, category, attributes)
+        try:
+            yield s
+        except BaseException as e:
+            s.set(error=type(e).__name__)
+            raise
+        finally:
+            s.finish()
+            self.record(s.to_event())
+
+    def record(self, event):
+        if not self.enabled:
+            return
+        captured = getattr(self._local, 'captured', None)
+        if captured is not None:
+            captured.append(event)
+            return
+        with self._lock:
+            if self.max_spans is not None and len(self.events) >= self.max_spans:
+                self.dropped += 1
+                return
+            self.events.append(event)
+
+    @contextmanager
+    def capture(self):
+        """Diverts the spans recorded by this thread into a list (yielded), e.g. to return them from a worker process."""
+        previous = getattr(self._local, 'captured', None)
+        self._local.captured = captured = []
+        try:
+            yield captured
+        finally:
+            self._local.captured = previous
+
+    def merge(self, events):
+        """Records spans captured elsewhere (e.g. in a worker process)."""
+        for event in events or ():
+            self.record(event)
+
+    def summary(self):
+        """Returns {span name: {calls, total_s, mean_ms, max_ms, errors, <summed attributes>}}, slowest first."""
+        with self._lock:
+            events = list(self.events)
+        rows = {}
+        for event in events:
+            row = rows.setdefault(event['name'], {'category': event['cat'], 'calls': 0, 'total_s': 0.0,
+                                                  'max_ms': 0.0, 'errors': 0})
+            duration_ms = event['dur'] / 1000
+            row['calls'] += 1
+            row['total_s'] += duration_ms / 1000
+            row['max_ms'] = max(row['max_ms'], duration_ms)
+            row['errors'] += 'error' in event['args']
+            for attribute in SUMMED_ATTRIBUTES:
+                value = event['args'].get(attribute)
+                if isinstance(value, (bool, int, float)):
+                    row[attribute] = row.get(attribute, 0) + value
+            if 'ttft_ms' in event['args']:
+                row['ttft_ms_total'] = row.get('ttft_ms_total', 0) + event['args']['ttft_ms']
+        for row in rows.values():
+            row['mean_ms'] = row['total_s'] * 1000 / row['calls']
+            if 'ttft_ms_total' in row:
+                row['mean_ttft_ms'] = row.pop('ttft_ms_total') / row['calls']
+        return dict(sorted(rows.items(), key=lambda item: -item[1]['total_s']))
+
+    def format_summary(self):
+        """Returns the summary as a table."""
+        summary = self.summary()
+        width = max([len(name) for name in summary] + [10])
+        lines = [f"{'span':<{width}}  {'calls':>7}{'total s':>10}{'mean ms':>10}{'max ms':>10}"
+                 f"{'tokens in':>11}{'tokens out':>11}{'cache hits':>11}{'MB':>8}"]
+        for name, row in summary.items():
+            mb = f"{row['bytes'] / 1e6:.1f}" if 'bytes' in row else "-"
+            lines.append(f"{name:<{width}}  {row['calls']:>7}{row['total_s']:>10.1f}{row['mean_ms']:>10.0f}"
+                         f"{row['max_ms']:>10.0f}{row.get('tokens_in', '-'):>11}{row.get('tokens_out', '-'):>11}"
+                         f"{row.get('cache_hit', '-'):>11}{mb:>8}"
+                         + (f"  ttft {row['mean_ttft_ms']:.0f}ms" if 'mean_ttft_ms' in row else "")
+                         + (f"  {row['errors']} errors" if row['errors'] else ""))
+        if self.dropped:
+            lines.append(f"({self.dropped} spans dropped beyond config.TRACE_MAX_SPANS)")
+        return "\n".join(lines)
+
+    def write_trace(self, directory):
+        """Writes the Chrome trace and the summary table into `directory`. Returns the trace's path."""
+        if not self.enabled:
+            return None
+        os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            events = list(self.events)
+        path = os.path.join(directory, TRACE_FILE)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+        os.replace(tmp_path, path)
+        summary = self.format_summary()
+        with open(os.path.join(directory, SUMMARY_FILE), 'w') as f:
+            f.write(summary + "\n")
+        logger.info(f"Trace written to {path}:\n{summary}")
+        return path
@@ -0,0 +1,34 @@
+import threading
+
+import config
+from .store import ResponseStore
+
+__all__ = ['ResponseStore', 'LLMResponseCache', 'get_llm_cache', 'with_llm_cache']
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache():
+    """Returns the process-wide `LLMResponseCache` (see `config.LLM_CACHE_*`)."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            from .cache import LLMResponseCache
+            _cache = LLMResponseCache()
+        return _cache
+
+
+def with_llm_cache(llm):
+    """Makes `llm` (any LangChain LLM or chat model) use the response cache, unless disabled in config. Returns `llm`."""
+    if config.LLM_CACHE_ENABLED:
+        llm.cache = get_llm_cache()
+    return llm
+
+
+def __getattr__(name):
+    # The cache imports langchain, so it's only imported when used
+    if name == 'LLMResponseCache':
+        from .cache import LLMResponseCache
+        return LLMResponseCache
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
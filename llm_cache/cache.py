@@ -0,0 +1,111 @@
+import hashlib
+import logging
+import threading
+from typing import Any, Optional
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+
+import config
+from instrumentation import span
+from .store import ResponseStore
+
+logger = logging.getLogger(__name__)
+
+SEMANTIC_EXCERPT_CHARS = 2000 # prompt head and tail embedded by the semantic tier
+
+
+def digest(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache(BaseCache):
+    """
+    LangChain cache of LLM responses, for any backend returned by `get_llm`.
+
+    LangChain looks a prompt up before calling the model, with an `llm_string` that
+    identifies the model and its parameters (temperature, stop words...).
+
+    - Exact tier: responses are keyed on the hash of the model / parameters and of the
+      prompt, and stored in a `ResponseStore` (SQLite, with a TTL and a size limit).
+    - Semantic tier (optional, when `semantic_threshold` is set): a prompt that isn't
+      cached exactly may reuse the response to a near-duplicate prompt of the same model
+      and parameters. Agent prompts share long preambles and differ at the end, so a
+      prompt is embedded as both its head and its tail, and both must match.
+    """
+
+    def __init__(self, path=None, ttl=None, max_bytes=None, semantic_threshold=None):
+        """
+        Args:
+            path (str, optional): The cache database. Defaults to `config.LLM_CACHE_PATH`.
+            ttl (float, optional): Seconds a response stays valid. Defaults to `config.LLM_CACHE_TTL_DAYS`.
+            max_bytes (int, optional): Max size of the cached responses. Defaults to `config.LLM_CACHE_MAX_BYTES`.
+            semantic_threshold (float, optional): Min cosine similarity of a near-duplicate prompt.
+                Defaults to `config.LLM_CACHE_SEMANTIC_THRESHOLD`; None disables the semantic tier.
+        """
+        if ttl is None and config.LLM_CACHE_TTL_DAYS is not None:
+            ttl = config.LLM_CACHE_TTL_DAYS * 24 * 3600
+        self.store = ResponseStore(path or config.LLM_CACHE_PATH, ttl=ttl,
+                                   max_bytes=max_bytes or config.LLM_CACHE_MAX_BYTES)
+        self.semantic_threshold = (config.LLM_CACHE_SEMANTIC_THRESHOLD
+                                   if semantic_threshold is None else semantic_threshold)
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _embed(self, prompt):
+        """Returns the prompt's semantic vector: its normalized head and tail embeddings, concatenated."""
+        # Imported here so that the exact tier doesn't load the embedding model.
+        from embedding_service import get_embedding_service
+        import numpy as np
+        head, tail = get_embedding_service().encode([prompt[:SEMANTIC_EXCERPT_CHARS], prompt[-SEMANTIC_EXCERPT_CHARS:]])
+        return np.concatenate([head, tail]) / np.sqrt(2)
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[Any]:
+        with span("llm_cache.lookup", "cache") as s:
+            namespace = digest(llm_string)
+            value = self.store.get(digest(namespace + prompt))
+            if value is not None:
+                self._count('exact_hits')
+                s.set(cache_hit=True, tier='exact')
+                return loads(value)
+
+            if self.semantic_threshold is not None:
+                match = self.store.nearest(namespace, self._embed(prompt), self.semantic_threshold)
+                value = self.store.get(match[0]) if match else None
+                if value is not None:
+                    logger.info(f"LLM cache: reusing the response to a prompt with similarity {match[1]:.3f}")
+                    self._count('semantic_hits')
+                    s.set(cache_hit=True, tier='semantic')
+                    return loads(value)
+
+            self._count('misses')
+            s.set(cache_hit=False)
+            return None
+
+    def update(self, prompt: str, llm_string: str, return_val: Any) -> None:
+        namespace = digest(llm_string)
+        vector = self._embed(prompt) if self.semantic_threshold is not None else None
+        self.store.put(digest(namespace + prompt), namespace, dumps(return_val), vector)
+        self._count('writes')
+
+    def clear(self, **kwargs: Any) -> None:
+        self.store.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            stats = {
+                'exact_hits': self.exact_hits,
+                'semantic_hits': self.semantic_hits,
+                'misses': self.misses,
+                'writes': self.writes,
+                'hit_rate': (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0,
+            }
+        stats.update(self.store.stats())
+        return stats
@@ -0,0 +1,149 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    namespace TEXT NOT NULL,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+CREATE TABLE IF NOT EXISTS vectors (
+    key TEXT PRIMARY KEY REFERENCES entries (key) ON DELETE CASCADE,
+    namespace TEXT NOT NULL,
+    vector BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS vectors_namespace ON vectors (namespace);
+"""
+
+
+class ResponseStore:
+    """
+    On-disk key-value store (SQLite) with a time-to-live and a size limit.
+
+    Entries older than `ttl` seconds are never returned and are deleted on eviction;
+    when the stored values exceed `max_bytes`, the least recently used entries are
+    evicted. Eviction runs every `evict_every` writes.
+
+    Entries belong to a namespace (e.g. one per model and parameters) and can carry a
+    normalized vector, for nearest-neighbour lookups within their namespace.
+    """
+
+    def __init__(self, path, ttl=None, max_bytes=None, evict_every=100):
+        """
+        Args:
+            path (str): The SQLite database file; created if missing.
+            ttl (float, optional): Seconds an entry stays valid. None = forever.
+            max_bytes (int, optional): Max total size of the stored values. None = unlimited.
+            evict_every (int, optional): Writes between evictions.
+        """
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.evict_every = evict_every
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._vectors = {} # namespace -> (keys, matrix), loaded on first lookup
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA foreign_keys=ON")
+        self._db.executescript(SCHEMA)
+
+    def _expired_before(self):
+        return time.time() - self.ttl if self.ttl is not None else float("-inf")
+
+    def get(self, key):
+        """Returns the value of `key`, or None if it's missing or expired."""
+        with self._lock:
+            row = self._db.execute("SELECT value FROM entries WHERE key = ? AND created >= ?",
+                                   (key, self._expired_before())).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key))
+            return row[0]
+
+    def put(self, key, namespace, value, vector=None):
+        """Stores `value` (a string) under `key`, with an optional normalized vector for `nearest`."""
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                                 (key, namespace, value, len(value.encode("utf-8")), now, now))
+                if vector is not None:
+                    vector = np.asarray(vector, dtype=np.float32)
+                    self._db.execute("INSERT OR REPLACE INTO vectors VALUES (?, ?, ?)",
+                                     (key, namespace, vector.tobytes()))
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+            self._vectors.pop(namespace, None)
+            self._writes += 1
+            if self._writes % self.evict_every == 0:
+                self._evict()
+
+    def nearest(self, namespace, vector, threshold):
+        """Returns (key, similarity) of the most similar vector of `namespace`, if at least `threshold`; else None."""
+        with self._lock:
+            if namespace not in self._vectors:
+                rows = self._db.execute(
+                    "SELECT v.key, v.vector FROM vectors v JOIN entries e ON e.key = v.key "
+                    "WHERE v.namespace = ? AND e.created >= ?", (namespace, self._expired_before())).fetchall()
+                keys = [key for key, _ in rows]
+                matrix = np.stack([np.frombuffer(blob, dtype=np.float32) for _, blob in rows]) if rows else None
+                self._vectors[namespace] = (keys, matrix)
+            keys, matrix = self._vectors[namespace]
+        if matrix is None:
+            return None
+        similarities = matrix @ np.asarray(vector, dtype=np.float32)
+        best = int(np.argmax(similarities))
+        if similarities[best] < threshold:
+            return None
+        return keys[best], float(similarities[best])
+
+    def evict(self):
+        """Deletes expired entries, then the least recently used ones beyond `max_bytes`. Returns the count deleted."""
+        with self._lock:
+            return self._evict()
+
+    def _evict(self):
+        deleted = self._db.execute("DELETE FROM entries WHERE created < ?", (self._expired_before(),)).rowcount
+        if self.max_bytes is not None:
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            excess = total - self.max_bytes
+            if excess > 0:
+                victims = []
+                for key, size in self._db.execute("SELECT key, size FROM entries ORDER BY accessed"):
+                    if excess <= 0:
+                        break
+                    victims.append((key,))
+                    excess -= size
+                self._db.executemany("DELETE FROM entries WHERE key = ?", victims)
+                deleted += len(victims)
+        if deleted:
+            self._vectors.clear()
+            logger.info(f"Evicted {deleted} entries from {self.path}")
+        return deleted
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM entries")
+            self._vectors.clear()
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {'entries': entries, 'bytes': size}
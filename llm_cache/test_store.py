@@ -0,0 +1,52 @@
+import unittest
+import sys
+import os
+import time
+import tempfile
+import numpy as np
+
+# Add the parent directory to the Python path to allow importing from llm_cache
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm_cache.store import ResponseStore
+
+class TestResponseStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'cache.sqlite')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_ttl_and_least_recently_used_eviction(self):
+        store = ResponseStore(self.path, ttl=60, max_bytes=10)
+        store.put('a', 'llm', 'aaaa')
+        store.put('b', 'llm', 'bbbb')
+        store.put('c', 'llm', 'cccc')
+        self.assertEqual(store.get('a'), 'aaaa') # a is now more recently used than b
+
+        self.assertEqual(store.evict(), 1)
+        self.assertIsNone(store.get('b'))
+        self.assertEqual(store.get('c'), 'cccc')
+
+        # Expired entries are never returned
+        store.ttl = 0.01
+        time.sleep(0.02)
+        self.assertIsNone(store.get('a'))
+
+    def test_nearest_vector_within_namespace(self):
+        store = ResponseStore(self.path)
+        store.put('x', 'llm-1', 'x', vector=[1.0, 0.0])
+        store.put('y', 'llm-1', 'y', vector=[0.0, 1.0])
+        store.put('z', 'llm-2', 'z', vector=[0.8, 0.6])
+
+        key, similarity = store.nearest('llm-1', np.array([0.8, 0.6]), threshold=0.7)
+        self.assertEqual(key, 'x')
+        self.assertAlmostEqual(similarity, 0.8, places=5)
+        self.assertIsNone(store.nearest('llm-1', np.array([0.8, 0.6]), threshold=0.9))
+
+        # Persisted across instances
+        self.assertEqual(ResponseStore(self.path).nearest('llm-2', np.array([0.8, 0.6]), 0.99)[0], 'z')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,26 +1,266 @@
+import json
+import time
+import asyncio
+import logging
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Iterator, List, Mapping, Optional
 import requests
-from typing import Any, List, Mapping, Optional, Dict
+from requests.adapters import HTTPAdapter
 from pydantic import BaseModel, Field
 from langchain.llms.base import LLM
+from langchain_core.outputs import Generation, GenerationChunk, LLMResult
+from langchain_core.pydantic_v1 import PrivateAttr
+
+import config
+from instrumentation import span
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS_CODES = {500, 502, 503, 504} # 503: the server's request queue is full
+POOL_SIZE = 16 # pooled connections; enough for every crew and task calling at once
+
+
+class OllamaError(Exception):
+    """An error returned by the Ollama API, or a request that failed after all its retries."""
+
 
 class OllamaConfig(BaseModel):
     model_name: str
-    api_url: str = Field(default="http://localhost:11434/api/generate")
-    temperature: float = Field(default=0.7)
-    max_tokens: int = Field(default=1000)
-    top_p: float = Field(default=0.95)
+    base_url: str = Field(default=config.OLLAMA_BASE_URL)
+    temperature: float = Field(default=config.TEMPERATURE)
+    top_p: float = Field(default=config.TOP_P)
+    num_predict: int = Field(default=config.OLLAMA_NUM_PREDICT) # max generated tokens; clamped to num_ctx
+    num_ctx: int = Field(default=config.OLLAMA_NUM_CTX)
+    keep_alive: str = Field(default=config.OLLAMA_KEEP_ALIVE)
+    stream: bool = Field(default=True)
+    connect_timeout: float = Field(default=config.OLLAMA_CONNECT_TIMEOUT)
+    read_timeout: float = Field(default=config.OLLAMA_READ_TIMEOUT)
+    max_retries: int = Field(default=config.OLLAMA_MAX_RETRIES)
+    num_parallel: int = Field(default=config.OLLAMA_NUM_PARALLEL)
+
+
+class OllamaMetrics:
+    """Latency and throughput of the calls of one `OllamaWrapper`, aggregated across threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.failures = 0
+        self.retries = 0
+        self.total_ttft = 0.0
+        self.max_ttft = 0.0
+        self.total_duration = 0.0
+        self.total_load = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def record(self, start, first_token, final):
+        """Records a finished call from its timings and Ollama's final response. Returns its generation info."""
+        now = time.perf_counter()
+        info = {
+            'ttft_s': (first_token or now) - start,
+            'duration_s': now - start,
+            'load_s': final.get('load_duration', 0) / 1e9, # model (re)load; ~0 while it's kept alive
+            'prompt_tokens': final.get('prompt_eval_count', 0),
+            'completion_tokens': final.get('eval_count', 0),
+            'done_reason': final.get('done_reason'),
+        }
+        eval_s = final.get('eval_duration', 0) / 1e9
+        info['tokens_per_s'] = info['completion_tokens'] / eval_s if eval_s else 0.0
+        with self._lock:
+            self.calls += 1
+            self.total_ttft += info['ttft_s']
+            self.max_ttft = max(self.max_ttft, info['ttft_s'])
+            self.total_duration += info['duration_s']
+            self.total_load += info['load_s']
+            self.prompt_tokens += info['prompt_tokens']
+            self.completion_tokens += info['completion_tokens']
+        logger.info(f"Ollama call: first token after {info['ttft_s']:.2f}s, {info['completion_tokens']} tokens in "
+                    f"{info['duration_s']:.1f}s ({info['tokens_per_s']:.1f} tokens/s, {info['prompt_tokens']} prompt tokens)")
+        return info
+
+    def retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'failures': self.failures,
+                'retries': self.retries,
+                'mean_ttft_s': self.total_ttft / self.calls if self.calls else 0.0,
+                'max_ttft_s': self.max_ttft,
+                'mean_duration_s': self.total_duration / self.calls if self.calls else 0.0,
+                'total_load_s': self.total_load,
+                'prompt_tokens': self.prompt_tokens,
+                'completion_tokens': self.completion_tokens,
+            }
+
 
 class OllamaWrapper(LLM):
+    """
+    LangChain LLM for a local Ollama server (/api/generate).
+
+    - Requests go through a pooled HTTP session (a pooled async client for the async
+      API), so connections are reused across calls, crews and threads.
+    - Generation parameters are sent in `options` (temperature, top_p, num_predict,
+      num_ctx, stop), and `keep_alive` keeps the model loaded between calls.
+    - Responses are streamed: tokens reach the callbacks as they're generated, and the
+      time to first token is measured (see `stats`). A timeout applies between tokens,
+      not to the whole generation.
+    - Connection errors, timeouts and 5xx responses are retried with backoff, until
+      the first token is received.
+    - `generate` / `agenerate` with several prompts run up to `num_parallel` of them at once.
+    """
+
     config: OllamaConfig
+    _session: Any = PrivateAttr()
+    _async_clients: Any = PrivateAttr()
+    _metrics: Any = PrivateAttr()
 
     def __init__(self, **kwargs):
         config = OllamaConfig(**kwargs)
         super().__init__(config=config)
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._async_clients = weakref.WeakKeyDictionary() # event loop -> httpx.AsyncClient
+        self._metrics = OllamaMetrics()
 
     @property
     def _llm_type(self) -> str:
         return "ollama"
 
+    @property
+    def _identifying_params(self) -> Mapping[str, Any]:
+        """Get the identifying parameters."""
+        return {
+            "model_name": self.config.model_name,
+            "temperature": self.config.temperature,
+            "top_p": self.config.top_p,
+            "num_predict": self.config.num_predict,
+            "num_ctx": self.config.num_ctx,
+        }
+
+    @property
+    def url(self):
+        return self.config.base_url.rstrip("/") + "/api/generate"
+
+    def stats(self):
+        """Returns the aggregated metrics of this LLM's calls (count, time to first token, tokens...)."""
+        return self._metrics.snapshot()
+
+    def _payload(self, prompt, stop, stream, **kwargs):
+        num_ctx = kwargs.get("num_ctx", self.config.num_ctx)
+        num_predict = kwargs.get("num_predict", kwargs.get("max_tokens", self.config.num_predict))
+        # Past the context window, a model that never emits a stop token keeps generating through context shifts
+        if num_predict is None or num_predict < 0 or num_predict > num_ctx:
+            num_predict = num_ctx
+        options = {
+            "temperature": kwargs.get("temperature", self.config.temperature),
+            "top_p": kwargs.get("top_p", self.config.top_p),
+            "num_predict": num_predict,
+            "num_ctx": num_ctx,
+        }
+        if stop:
+            options["stop"] = stop
+        return {
+            "model": self.config.model_name,
+            "prompt": prompt,
+            "stream": stream,
+            "keep_alive": self.config.keep_alive,
+            "options": options,
+        }
+
+    def _backoff(self, attempt, reason):
+        if attempt >= self.config.max_retries:
+            self._metrics.failure()
+            raise OllamaError(f"Error from Ollama API after {attempt + 1} attempt(s): {reason}")
+        self._metrics.retry()
+        delay = 0.5 * 2 ** attempt
+        logger.warning(f"Ollama request failed ({reason}), retrying in {delay:.1f}s")
+        return delay
+
+    def _post(self, payload):
+        """POSTs a generation request, retrying failures. Returns the (possibly streaming) response."""
+        attempt = 0
+        while True:
+            try:
+                response = self._session.post(self.url, json=payload, stream=payload["stream"],
+                                              timeout=(self.config.connect_timeout, self.config.read_timeout))
+            except (requests.ConnectionError, requests.Timeout) as e:
+                time.sleep(self._backoff(attempt, e))
+                attempt += 1
+                continue
+            if response.status_code == 200:
+                return response
+            error = response.text
+            response.close()
+            if response.status_code not in RETRY_STATUS_CODES:
+                self._metrics.failure()
+                raise OllamaError(f"Error from Ollama API: {error}")
+            time.sleep(self._backoff(attempt, f"HTTP {response.status_code}: {error}"))
+            attempt += 1
+
+    @staticmethod
+    def _check(part):
+        if "error" in part:
+            raise OllamaError(f"Error from Ollama API: {part['error']}")
+        return part
+
+    def _stream(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[Any] = None,
+        **kwargs: Any,
+    ) -> Iterator[GenerationChunk]:
+        """Streams the generated text, token by token; the last chunk carries the call's metrics."""
+        start, first_token = time.perf_counter(), None
+        with self._post(self._payload(prompt, stop, stream=True, **kwargs)) as response:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                part = self._check(json.loads(line))
+                if part.get("response"):
+                    first_token = first_token or time.perf_counter()
+                    chunk = GenerationChunk(text=part["response"])
+                    if run_manager:
+                        run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                    yield chunk
+                if part.get("done"):
+                    yield GenerationChunk(text="", generation_info=self._metrics.record(start, first_token, part))
+
+    @staticmethod
+    def _trace(s, generation_info):
+        s.set(tokens_in=generation_info['prompt_tokens'], tokens_out=generation_info['completion_tokens'],
+              ttft_ms=generation_info['ttft_s'] * 1000, load_ms=generation_info['load_s'] * 1000)
+
+    def _generate_one(self, prompt, stop, run_manager, **kwargs):
+        with span("ollama.generate", "llm", model=self.config.model_name) as s:
+            if not self.config.stream:
+                start = time.perf_counter()
+                with self._post(self._payload(prompt, stop, stream=False, **kwargs)) as response:
+                    part = self._check(response.json())
+                generation = Generation(text=part.get("response", ""), generation_info=self._metrics.record(start, None, part))
+            else:
+                generation = None
+                for chunk in self._stream(prompt, stop, run_manager, **kwargs):
+                    generation = chunk if generation is None else generation + chunk
+                if generation is None:
+                    raise OllamaError("Error from Ollama API: empty response")
+                generation = Generation(text=generation.text, generation_info=generation.generation_info)
+            self._trace(s, generation.generation_info)
+            return generation
+
     def _call(
         self,
         prompt: str,
@@ -29,29 +269,138 @@ class OllamaWrapper(LLM):
         **kwargs: Any,
     ) -> str:
         """Generates text using the Ollama API."""
-        data = {
-            "model": self.config.model_name,
-            "prompt": prompt,
-            "stream": False,
-            "max_tokens": kwargs.get("max_tokens", self.config.max_tokens),
-            "temperature": kwargs.get("temperature", self.config.temperature),
-            "top_p": kwargs.get("top_p", self.config.top_p),
-        }
-        if stop:
-            data["stop"] = stop
+        return self._generate_one(prompt, stop, run_manager, **kwargs).text
 
-        response = requests.post(self.config.api_url, json=data)
-        if response.status_code == 200:
-            return response.json().get('response', '')
+    def _generate(
+        self,
+        prompts: List[str],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[Any] = None,
+        **kwargs: Any,
+    ) -> LLMResult:
+        """Generates one completion per prompt, up to `num_parallel` at a time."""
+        if len(prompts) == 1:
+            generations = [self._generate_one(prompts[0], stop, run_manager, **kwargs)]
         else:
-            raise Exception(f"Error from Ollama API: {response.text}")
+            # LangChain passes the run manager of the first prompt only, so tokens of a batch aren't streamed
+            with ThreadPoolExecutor(max_workers=self.config.num_parallel) as pool:
+                generations = list(pool.map(lambda prompt: self._generate_one(prompt, stop, None, **kwargs), prompts))
+        return LLMResult(generations=[[generation] for generation in generations],
+                         llm_output={"model_name": self.config.model_name})
 
-    @property
-    def _identifying_params(self) -> Mapping[str, Any]:
-        """Get the identifying parameters."""
-        return {"model_name": self.config.model_name}
+    def _async_client(self):
+        # An httpx client is bound to the event loop it's first used in, so keep one per loop.
+        import httpx
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.config.read_timeout, connect=self.config.connect_timeout),
+                limits=httpx.Limits(max_connections=POOL_SIZE, max_keepalive_connections=POOL_SIZE))
+            self._async_clients[loop] = client
+        return client
 
-    @property
-    def _identifying_params(self) -> Mapping[str, Any]:
-        """Get the identifying parameters."""
-        return {"model_name": self.config.model_name}
\ No newline at end of file
+    async def _apost(self, payload):
+        """Async `_post`. The caller must close the returned response."""
+        import httpx
+        client = self._async_client()
+        attempt = 0
+        while True:
+            try:
+                response = await client.send(client.build_request("POST", self.url, json=payload), stream=True)
+            except httpx.TransportError as e: # includes timeouts
+                await asyncio.sleep(self._backoff(attempt, e))
+                attempt += 1
+                continue
+            if response.status_code == 200:
+                return response
+            error = (await response.aread()).decode(errors="replace")
+            await response.aclose()
+            if response.status_code not in RETRY_STATUS_CODES:
+                self._metrics.failure()
+                raise OllamaError(f"Error from Ollama API: {error}")
+            await asyncio.sleep(self._backoff(attempt, f"HTTP {response.status_code}: {error}"))
+            attempt += 1
+
+    async def _astream(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[Any] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[GenerationChunk]:
+        """Async `_stream`."""
+        start, first_token = time.perf_counter(), None
+        response = await self._apost(self._payload(prompt, stop, stream=True, **kwargs))
+        try:
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                part = self._check(json.loads(line))
+                if part.get("response"):
+                    first_token = first_token or time.perf_counter()
+                    chunk = GenerationChunk(text=part["response"])
+                    if run_manager:
+                        await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                    yield chunk
+                if part.get("done"):
+                    yield GenerationChunk(text="", generation_info=self._metrics.record(start, first_token, part))
+        finally:
+            await response.aclose()
+
+    async def _agenerate_one(self, prompt, stop, run_manager, **kwargs):
+        with span("ollama.generate", "llm", model=self.config.model_name) as s:
+            generation = None
+            async for chunk in self._astream(prompt, stop, run_manager, **kwargs):
+                generation = chunk if generation is None else generation + chunk
+            if generation is None:
+                raise OllamaError("Error from Ollama API: empty response")
+            self._trace(s, generation.generation_info)
+            return Generation(text=generation.text, generation_info=generation.generation_info)
+
+    async def _acall(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[Any] = None,
+        **kwargs: Any,
+    ) -> str:
+        """Async `_call`."""
+        return (await self._agenerate_one(prompt, stop, run_manager, **kwargs)).text
+
+    async def _agenerate(
+        self,
+        prompts: List[str],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[Any] = None,
+        **kwargs: Any,
+    ) -> LLMResult:
+        """Async `_generate`: the prompts run concurrently, up to `num_parallel` at a time."""
+        semaphore = asyncio.Semaphore(self.config.num_parallel)
+        single = len(prompts) == 1
+
+        async def generate(prompt):
+            async with semaphore:
+                return await self._agenerate_one(prompt, stop, run_manager if single else None, **kwargs)
+
+        generations = await asyncio.gather(*(generate(prompt) for prompt in prompts))
+        return LLMResult(generations=[[generation] for generation in generations],
+                         llm_output={"model_name": self.config.model_name})
+
+    async def aclose(self):
+        """Closes the pooled connections of the async API in the running event loop."""
+        client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+    def close(self):
+        """Closes the pooled connections of the sync API, and of the async API in every event loop."""
+        self._session.close()
+        for loop, client in list(self._async_clients.items()):
+            self._async_clients.pop(loop, None)
+            if loop.is_closed():
+                continue # Its connections went with it
+            if loop.is_running():
+                asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+            else:
+                loop.run_until_complete(client.aclose())
@@ -1 +1,9 @@
-from .document_preprocessor import DocumentPreprocessor
\ No newline at end of file
+__all__ = ['DocumentPreprocessor']
+
+def __getattr__(name):
+    # The preprocessor imports the Google APIs and the embedding model, so it's only imported when
+    # used; the lightweight modules (e.g. chunker.py) can be imported on their own.
+    if name == 'DocumentPreprocessor':
+        from .document_preprocessor import DocumentPreprocessor
+        return DocumentPreprocessor
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,139 @@
+import io
+import re
+from typing import NamedTuple
+
+CHUNKER_VERSION = "1" # Bump whenever chunk boundaries change, so that every source is rechunked
+
+# Sentence ends: terminal punctuation (optionally closing a quote / bracket), then the next sentence.
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])["”’)\]]?\s+(?=["“(\[]?[A-Z0-9])')
+HEADING = re.compile(
+    r'^(#{1,6}\s+\S'                                    # Markdown headings
+    r'|(\d+(\.\d+)*\.?|[IVX]+\.|[A-Z]\.)\s+[A-Z]'        # "1.2 Use of Funds", "IV. Risks", "A. Escrow"
+    r'|(ARTICLE|Article|SECTION|Section|EXHIBIT|Exhibit|SCHEDULE|Schedule|APPENDIX|Appendix)\b)'
+)
+MAX_HEADING_CHARS = 80
+
+
+class Chunk(NamedTuple):
+    text: str
+    page_start: int # 1-based; 0 when the source has no pages (e.g. websites)
+    page_end: int
+
+
+class TokenChunker:
+    """
+    Splits text into chunks that fit the embedding model's input window.
+
+    Chunk sizes are measured with the embedding model's tokenizer (or in words, without
+    one). Chunks end at sentence boundaries where possible, a heading always starts a new
+    chunk, and consecutive chunks within a section share up to `overlap_tokens` tokens of
+    whole sentences. Sentences longer than a chunk are split between words.
+
+    Text is consumed one page (and one paragraph) at a time, so a document is never held
+    as a single word list; `chunk_pages` yields chunks as soon as they are complete.
+    """
+
+    def __init__(self, tokenizer=None, max_tokens=256, overlap_tokens=32):
+        if overlap_tokens >= max_tokens:
+            raise ValueError(f"overlap_tokens ({overlap_tokens}) must be smaller than max_tokens ({max_tokens})")
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+
+    def count_tokens(self, texts):
+        """Returns the token count of each of `texts` (excluding special tokens)."""
+        if not texts:
+            return []
+        if self.tokenizer is None:
+            return [len(text.split()) for text in texts]
+        return [len(ids) for ids in self.tokenizer(list(texts), add_special_tokens=False)['input_ids']]
+
+    @staticmethod
+    def is_heading(line):
+        return (len(line) <= MAX_HEADING_CHARS and not line.endswith(('.', ',', ';'))
+                and (HEADING.match(line) is not None or (line.isupper() and any(c.isalpha() for c in line))))
+
+    def split_units(self, text):
+        """Yields the (unit, is_heading) units of `text`: headings, and the sentences of each paragraph.
+
+        Line breaks within a paragraph are treated as spaces, since PDF text layers break
+        lines mid-sentence; blank lines end a paragraph.
+        """
+        paragraph = []
+
+        def sentences():
+            joined = " ".join(paragraph)
+            paragraph.clear()
+            return ((sentence, False) for sentence in SENTENCE_BOUNDARY.split(joined) if sentence.strip())
+
+        for line in io.StringIO(text):
+            line = line.strip()
+            if not line:
+                yield from sentences()
+            elif self.is_heading(line):
+                yield from sentences()
+                yield line, True
+            else:
+                paragraph.append(line)
+        yield from sentences()
+
+    def _fit(self, unit, tokens):
+        """Yields (piece, tokens) pieces of a unit, splitting it between words if it exceeds a chunk."""
+        if tokens <= self.max_tokens:
+            yield unit, tokens
+            return
+        words = unit.split()
+        piece, piece_tokens = [], 0
+        for word, word_tokens in zip(words, self.count_tokens(words)):
+            if piece and piece_tokens + word_tokens > self.max_tokens:
+                yield " ".join(piece), piece_tokens
+                piece, piece_tokens = [], 0
+            piece.append(word)
+            piece_tokens += word_tokens
+        if piece:
+            yield " ".join(piece), piece_tokens
+
+    def _overlap(self, window):
+        """Returns the trailing units of `window` that fit in `overlap_tokens`."""
+        tail, tokens = [], 0
+        for unit in reversed(window):
+            if tokens + unit[1] > self.overlap_tokens:
+                break
+            tail.insert(0, unit)
+            tokens += unit[1]
+        return tail
+
+    @staticmethod
+    def _emit(window):
+        pages = [page for _, _, page in window]
+        return Chunk(" ".join(text for text, _, _ in window), min(pages), max(pages))
+
+    def chunk_pages(self, pages):
+        """Chunks a document given as (page_number, text) pairs, yielding `Chunk`s with their page span.
+
+        Args:
+            pages (Iterable[tuple[int, str]]): The pages, in order; may be a generator.
+
+        Yields:
+            Chunk: The chunks, in document order.
+        """
+        window, window_tokens = [], 0
+        for page_number, text in pages:
+            units = list(self.split_units(text or ""))
+            for (unit, is_heading), tokens in zip(units, self.count_tokens([u for u, _ in units])):
+                for piece, piece_tokens in self._fit(unit, tokens):
+                    if window and (is_heading or window_tokens + piece_tokens > self.max_tokens):
+                        yield self._emit(window)
+                        # A new section starts without overlap
+                        window = [] if is_heading else self._overlap(window)
+                        while window and sum(t for _, t, _ in window) + piece_tokens > self.max_tokens:
+                            window.pop(0)
+                        window_tokens = sum(t for _, t, _ in window)
+                    window.append((piece, piece_tokens, page_number))
+                    window_tokens += piece_tokens
+        if window:
+            yield self._emit(window)
+
+    def chunk_text(self, text, page_number=0):
+        """Chunks a single text (e.g. a website) without page information."""
+        return list(self.chunk_pages([(page_number, text)]))
@@ -1,20 +1,47 @@
 import os
 import json
 import logging
-from tools.google_drive_reader import list_files_in_folder, read_file_from_drive
-from tools.web_scraper import scrape_website
-from tools.pdf_reader import read_pdf
-from sentence_transformers import SentenceTransformer
-import numpy as np
+import tempfile
+from tools.google_drive_reader import list_files_recursive, download_files
+from tools.web_scraper import scrape_many
+from tools.pdf_reader import read_pdf, EXTRACTOR_VERSION
+from tools.extraction_cache import get_extraction_cache
+from tools.chunk_store import ChunkStore, ChunkStoreWriter, STORE_FORMAT_VERSION, store_key
+
+import config
+from embedding_service import get_embedding_service
+from .chunker import TokenChunker, CHUNKER_VERSION
+from .manifest import InvestmentManifest
+from .pipeline import PreprocessingPipeline, StageCounters
 
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
+class InvestmentState:
+    """Book-keeping for one investment while its sources move through preprocessing."""
+
+    def __init__(self, investment, investment_dir, manifest):
+        self.investment = investment
+        self.investment_dir = investment_dir
+        self.manifest = manifest
+        self.store = ChunkStore.open(investment_dir) # The previous chunk store, if any
+        self.pending = {} # Drive file id / URL -> chunks and embeddings of new or changed sources
+        self.files = [] # Listed PDF files, in listing order
+        self.results = {} # Drive file id -> {"name": ...} (plus "error", if processing failed)
+        self.remaining = 0 # New or changed sources not yet written
+
+
 class DocumentPreprocessor:
-    def __init__(self, base_dir='preprocessing/outputs', chunk_size=1000):
+    def __init__(self, base_dir='preprocessing/outputs', chunk_size=None, chunk_overlap=None):
+        """
+        Args:
+            base_dir (str, optional): Where preprocessed data and the log are written.
+            chunk_size (int, optional): Maximum tokens per chunk. Defaults to `config.CHUNK_MAX_TOKENS`,
+                or else the embedding model's input window.
+            chunk_overlap (int, optional): Tokens shared by consecutive chunks. Defaults to `config.CHUNK_OVERLAP_TOKENS`.
+        """
         self.base_dir = base_dir
         self.output_dir = os.path.join(base_dir, 'preprocessed_data')
         self.log_file = os.path.join(base_dir, 'preprocessing.log')
-        self.chunk_size = chunk_size
         os.makedirs(self.output_dir, exist_ok=True)
         
         # Set up logging
@@ -24,30 +51,253 @@ class DocumentPreprocessor:
         file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
         self.logger.addHandler(file_handler)
         
-        self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-        self.total_files = 0
-        self.processed_files = 0
+        self.embedding_model_name = config.EMBEDDING_MODEL
+        self.embedding_model = get_embedding_service(self.embedding_model_name)
+        # Chunks are sized by the embedding model's tokenizer, so that no chunk is truncated when embedded
+        self.chunk_size = chunk_size or config.CHUNK_MAX_TOKENS or self.embedding_model.max_seq_length - 2 # [CLS], [SEP]
+        self.chunk_overlap = config.CHUNK_OVERLAP_TOKENS if chunk_overlap is None else chunk_overlap
+        self.chunker = TokenChunker(self.embedding_model.tokenizer, self.chunk_size, self.chunk_overlap)
+        self.progress = StageCounters()
+
+    def preprocess_investments(self, investments_file, workers=None):
+        """Preprocesses every investment in `investments_file` through the pipelined scheduler.
 
-    def preprocess_investments(self, investments_file):
+        Args:
+            investments_file (str): Path to the JSON list of investments (e.g. inputs/options.json).
+            workers (int, optional): Size of the extraction process pool. Defaults to the CPU count.
+        """
         with open(investments_file, 'r') as f:
             investments = json.load(f)
         
-        for i, investment in enumerate(investments, 1):
-            self.logger.info(f"Processing investment {i}/{len(investments)}: {investment['name']}")
-            self.preprocess_investment(investment)
+        self.logger.info(f"Processing {len(investments)} investments")
+        PreprocessingPipeline(self, workers=workers).run(investments)
+
+        self.logger.info(f"Preprocessing finished: {self.progress.summary()}")
+        self.logger.info(f"PDF extraction cache stats: {get_extraction_cache().stats()}")
+
+    def processing_params(self):
+        """Parameters that affect the outputs; changing any of them reprocesses every source."""
+        return {
+            'chunk_size': self.chunk_size,
+            'chunk_overlap': self.chunk_overlap,
+            'chunker_version': CHUNKER_VERSION,
+            'embedding_model': self.embedding_model_name,
+            'extractor_version': EXTRACTOR_VERSION,
+            'storage': f"chunk_store/{STORE_FORMAT_VERSION}/{config.CHUNK_STORE_EMBEDDING_DTYPE}"
+        }
 
     def preprocess_investment(self, investment):
+        """Preprocesses a single investment, one stage after the other."""
+        state, changed_files, changed_websites = self.plan_investment(investment)
+
+        # Download new or changed files concurrently, processing each as soon as it's on disk
+        with tempfile.TemporaryDirectory(prefix="eb5_downloads_") as download_dir:
+            for file, file_path, error in download_files(changed_files, download_dir):
+                if error is not None:
+                    self.progress.failed('download')
+                    self.record_failure(state, file, error)
+                    continue
+                self.progress.done('download')
+                try:
+                    with open(file_path, 'rb') as f:
+                        pdf_content = read_pdf(f.read())
+                    self.progress.done('extract')
+                except Exception as e:
+                    self.progress.failed('extract')
+                    self.record_failure(state, file, e)
+                    continue
+                finally:
+                    os.remove(file_path)
+                self.write_pdf_outputs(state, file, pdf_content)
+
+        self.logger.info(f"Scraping {len(changed_websites)} website(s)")
+        for website, content in scrape_many(changed_websites).items():
+            if isinstance(content, Exception):
+                self.progress.failed('scrape')
+                self.logger.error(f"Error scraping website {website}: {str(content)}")
+                continue
+            self.progress.done('scrape')
+            self.write_website_outputs(state, website, content)
+
+        self.finalize_investment(state)
+        self.logger.info(f"PDF extraction cache stats: {get_extraction_cache().stats()}")
+
+    def plan_investment(self, investment):
+        """Lists an investment's sources and compares them against its manifest.
+
+        Returns:
+            tuple: (state, changed_files, changed_websites), where the changed files and
+                websites are the ones that are new or changed since the last run.
+        """
         investment_dir = os.path.join(self.output_dir, investment['id'])
         os.makedirs(investment_dir, exist_ok=True)
-        
-        if os.path.exists(os.path.join(investment_dir, 'metadata.json')):
-            self.logger.info(f"Skipping already processed investment: {investment['name']}")
-            return
 
+        # Only new or changed files and websites are processed; see manifest.py
+        state = InvestmentState(investment, investment_dir, InvestmentManifest.load(investment_dir))
         self.logger.info(f"Processing investment: {investment['name']}")
-        
-        folder_content = self.process_folder(investment['folder_id'], investment_dir)
-        website_content = self.process_websites(investment['websites'], investment_dir)
+
+        # One recursive listing (skipping "(ignored) " subfolders), then only PDFs are processed
+        state.files = [f for f in list_files_recursive(investment['folder_id']) if f['mimeType'] == 'application/pdf']
+        self.logger.info(f"Found {len(state.files)} PDF files in the folder tree of {investment['name']}")
+
+        params = self.processing_params()
+        changed_files = []
+        def in_store(doc_id):
+            return state.store is not None and state.store.document(doc_id) is not None
+
+        for file in state.files:
+            if state.manifest.is_file_current(file, params) and (
+                    in_store(file['id']) or state.manifest.is_file_empty(file['id'])):
+                self.logger.info(f"File {file['name']} unchanged, skipping")
+                if not state.manifest.is_file_empty(file['id']):
+                    state.results[file['id']] = {"name": file['name']}
+                self.progress.skip()
+            else:
+                changed_files.append(file)
+
+        changed_websites = []
+        for website in dict.fromkeys(investment['websites']): # Scraped once, however often it's listed
+            # Scraped again once the page cache would revalidate it; see write_website_outputs
+            if state.manifest.is_website_current(website, params, config.SCRAPER_CACHE_FRESH_SECONDS) \
+                    and in_store(website):
+                self.logger.info(f"Website {website} recently processed, skipping")
+                self.progress.skip()
+            else:
+                changed_websites.append(website)
+
+        state.remaining = len(changed_files) + len(changed_websites)
+        self.progress.queued('download', len(changed_files))
+        self.progress.queued('extract', len(changed_files))
+        self.progress.queued('scrape', len(changed_websites))
+        self.progress.queued('embed', len(changed_files) + len(changed_websites))
+        return state, changed_files, changed_websites
+
+    def record_failure(self, state, file, error):
+        self.logger.error(f"Error processing file {file['name']}: {str(error)}")
+        state.results[file['id']] = {"name": file['name'], "error": str(error)}
+
+    def write_pdf_outputs(self, state, file, pdf_content):
+        """Chunks and embeds an extracted PDF, keeping the result for the investment's chunk store."""
+        # New or changed: drop the previous outputs (including a now stale summary) first
+        state.manifest.forget_file(file['id'])
+        try:
+            # Chunked page by page, so that each chunk records the pages it comes from
+            pages = pdf_content.get('pages') or [
+                {'page': 0, 'text': pdf_content['text_content'], 'visual': pdf_content['visual_content']}]
+            text_chunks = list(self.chunker.chunk_pages((page['page'], page['text']) for page in pages))
+            visual_chunks = list(self.chunker.chunk_pages((page['page'], page['visual']) for page in pages))
+            
+            if not text_chunks and not visual_chunks:
+                self.logger.warning(f"No content extracted from file: {file['name']}")
+                # Recorded, so that the file isn't downloaded and extracted again until it changes
+                state.manifest.record_file(file, self.processing_params(), [], empty=True)
+                self.progress.done('embed')
+                return None
+
+            file_data = {
+                "id": file['id'],
+                "name": file['name'],
+                "type": "file",
+                "path": os.path.join(file.get('folder_path', ''), file['name']),
+                "page_triage": pdf_content.get('page_triage', []),
+                "chunks": {
+                    "text": self.embed_with_pages(text_chunks),
+                    "visual": self.embed_with_pages(visual_chunks)
+                }
+            }
+            state.pending[file['id']] = file_data
+            state.manifest.record_file(file, self.processing_params(), [self.summary_output('file', file['id'])])
+            state.results[file['id']] = {"name": file['name']}
+            
+            self.progress.done('embed')
+            self.logger.info(f"File {file['name']} processed successfully ({self.progress.summary()})")
+            return file_data
+        except Exception as e:
+            self.progress.failed('embed')
+            self.logger.error(f"Error processing file {file['name']}: {str(e)}", exc_info=True)
+            state.results[file['id']] = {"name": file['name'], "error": str(e)}
+            return None
+
+    def write_website_outputs(self, state, website, content):
+        """Chunks and embeds a scraped website, keeping the result for the investment's chunk store.
+
+        A website whose text is unchanged since it was last processed keeps its chunks and summary.
+        """
+        params = self.processing_params()
+        if state.manifest.is_website_unchanged(website, params, content) and \
+                state.store is not None and state.store.document(website) is not None:
+            state.manifest.record_website(website, params, state.manifest.websites[website]['outputs'], content)
+            self.progress.done('embed')
+            self.logger.info(f"Website {website} unchanged, keeping its chunks")
+            return None
+        state.manifest.forget_website(website)
+        try:
+            self.logger.info(f"Website content scraped. Size: {len(content)}")
+            
+            chunks = self.chunker.chunk_text(content)
+            self.logger.info(f"Website content chunked. Number of chunks: {len(chunks)}")
+            
+
+            website_data = {
+                "id": website,
+                "name": website,
+                "type": "website",
+                "path": website,
+                "chunks": {"text": self.embed_with_pages(chunks)}
+            }
+            state.pending[website] = website_data
+            state.manifest.record_website(website, params, [self.summary_output('website', website)], content)
+            
+            self.progress.done('embed')
+            self.logger.info(f"Website {website} processed successfully")
+            return website_data
+        except Exception as e:
+            self.progress.failed('embed')
+            self.logger.error(f"Error processing website {website}: {str(e)}", exc_info=True)
+            return None
+
+    @staticmethod
+    def summary_output(doc_type, doc_id):
+        """Returns the summary file of a document, as written by the context assembler."""
+        return os.path.join('summaries', f"{store_key(doc_type, doc_id)}.txt")
+
+    def write_chunk_store(self, state):
+        """Writes the investment's chunk store: new and changed sources, plus unchanged ones carried over."""
+        writer = ChunkStoreWriter(config.CHUNK_STORE_EMBEDDING_DTYPE)
+        doc_ids = [f['id'] for f in state.files if f['id'] in state.manifest.files] + \
+                  [url for url in dict.fromkeys(state.investment['websites']) if url in state.manifest.websites]
+        for doc_id in doc_ids:
+            data = state.pending.get(doc_id)
+            if data is None:
+                old = state.store.document(doc_id) if state.store is not None else None
+                if old is not None:
+                    writer.copy_document(state.store, old)
+                continue
+            doc = writer.add_document(data['id'], data['name'], data['type'], data['path'], data.get('page_triage'))
+            for kind, (chunks, embeddings, pages) in data['chunks'].items():
+                if chunks:
+                    writer.add_chunks(doc, kind, chunks, embeddings, pages)
+        writer.write(state.investment_dir)
+        state.pending.clear()
+
+    def finalize_investment(self, state):
+        """Removes outputs of deleted sources, then writes the chunk store, manifest and metadata.json."""
+        investment = state.investment
+        manifest = state.manifest
+
+        # Remove the outputs of files deleted from the folder and websites no longer listed
+        for file_id in set(manifest.files) - {f['id'] for f in state.files}:
+            entry = manifest.forget_file(file_id)
+            self.logger.info(f"Removed outputs of deleted file: {entry['name']}")
+        for url in set(manifest.websites) - set(investment['websites']):
+            manifest.forget_website(url)
+            self.logger.info(f"Removed outputs of website no longer listed: {url}")
+        self.write_chunk_store(state)
+        manifest.save()
+
+        folder_content = [state.results[f['id']] for f in state.files if state.results.get(f['id'])] # Listing order
+        if not folder_content:
+            self.logger.warning(f"No files were successfully processed for investment: {investment['name']}")
 
         metadata = {
             'id': investment['id'],
@@ -56,114 +306,18 @@ class DocumentPreprocessor:
             'websites': investment['websites']
         }
 
-        with open(os.path.join(investment_dir, 'metadata.json'), 'w') as f:
+        with open(os.path.join(state.investment_dir, 'metadata.json'), 'w') as f:
             json.dump(metadata, f, indent=2)
 
-        self.logger.info(f"Preprocessed investment {investment['name']} saved to {investment_dir}")
-
-    def process_folder(self, folder_id, investment_dir):
-        self.logger.info(f"Processing folder: {folder_id}")
-        files = list_files_in_folder(folder_id)
-        self.total_files += len(files)
-        self.logger.info(f"Found {len(files)} files in folder. Total files: {self.total_files}")
-
-        results = []
-        for file in files:
-            result = self.process_file(file, investment_dir)
-            if result:
-                results.append(result)
-        
-        if not results:
-            self.logger.warning(f"No files were successfully processed in folder: {folder_id}")
-        
-        return results
-
-    def process_file(self, file, investment_dir):
-        self.processed_files += 1
-        self.logger.info(f"Processing file {self.processed_files}/{self.total_files}: {file['name']} (Type: {file['mimeType']})")
-        if file['mimeType'] == 'application/vnd.google-apps.folder':
-            if not file['name'].startswith("(ignored) "):
-                return self.process_folder(file['id'], investment_dir)
-        elif file['mimeType'] == 'application/pdf':
-            try:
-                self.logger.info(f"Reading PDF file {self.processed_files}/{self.total_files}: {file['name']}")
-                file_content = read_file_from_drive(file['id'])
-                pdf_content = read_pdf(file_content)
-                
-                text_chunks = self.chunk_text(pdf_content['text_content'])
-                visual_chunks = self.chunk_text(pdf_content['visual_content'])
-                
-                if not text_chunks and not visual_chunks:
-                    self.logger.warning(f"No content extracted from file: {file['name']}")
-                    return None
-
-                file_data = {
-                    "name": file['name'],
-                    "text_chunks": text_chunks,
-                    "visual_chunks": visual_chunks,
-                    "text_chunk_count": len(text_chunks),
-                    "visual_chunk_count": len(visual_chunks)
-                }
-
-                if text_chunks:
-                    text_embeddings = self.embed_chunks(text_chunks)
-                    np.save(os.path.join(investment_dir, f"{os.path.splitext(file['name'])[0]}_text_embeddings.npy"), text_embeddings)
-                
-                if visual_chunks:
-                    visual_embeddings = self.embed_chunks(visual_chunks)
-                    np.save(os.path.join(investment_dir, f"{os.path.splitext(file['name'])[0]}_visual_embeddings.npy"), visual_embeddings)
-                
-                file_base_name = os.path.splitext(file['name'])[0]
-                with open(os.path.join(investment_dir, f"{file_base_name}_chunks.json"), 'w') as f:
-                    json.dump(file_data, f)
-                
-                self.logger.info(f"File {self.processed_files}/{self.total_files}: {file['name']} processed and saved successfully")
-                return file_data
-            except Exception as e:
-                self.logger.error(f"Error processing file {self.processed_files}/{self.total_files}: {file['name']}: {str(e)}", exc_info=True)
-                return {
-                    "name": file['name'],
-                    "error": str(e)
-                }
-        return None
-
-    def process_websites(self, websites, investment_dir):
-        website_content = []
-        for website in websites:
-            try:
-                self.logger.info(f"Scraping website: {website}")
-                content = scrape_website(website)
-                self.logger.info(f"Website content scraped. Size: {len(content)}")
-                
-                chunks = self.chunk_text(content)
-                self.logger.info(f"Website content chunked. Number of chunks: {len(chunks)}")
-                
-                embeddings = self.embed_chunks(chunks)
-                self.logger.info(f"Website embeddings created. Shape: {embeddings.shape}")
-                
-                website_data = {
-                    "url": website,
-                    "chunks": chunks,
-                    "chunk_count": len(chunks)
-                }
-                
-                website_file_name = website.replace('https://', '').replace('http://', '').replace('/', '_')
-                with open(os.path.join(investment_dir, f"{website_file_name}_chunks.json"), 'w') as f:
-                    json.dump(website_data, f)
-                
-                np.save(os.path.join(investment_dir, f"{website_file_name}_embeddings.npy"), embeddings)
-                
-                website_content.append(website_data)
-                self.logger.info(f"Website {website} processed and saved successfully")
-            except Exception as e:
-                self.logger.error(f"Error scraping website {website}: {str(e)}", exc_info=True)
-        return website_content
+        self.logger.info(f"Preprocessed investment {investment['name']} saved to {state.investment_dir}")
 
     def chunk_text(self, text):
-        words = text.split()
-        return [' '.join(words[i:i+self.chunk_size]) for i in range(0, len(words), self.chunk_size)]
+        return [chunk.text for chunk in self.chunker.chunk_text(text)]
+
+    def embed_with_pages(self, chunks):
+        """Embeds `Chunk`s, returning (texts, embeddings, page spans)."""
+        texts = [chunk.text for chunk in chunks]
+        return texts, self.embed_chunks(texts), [(chunk.page_start, chunk.page_end) for chunk in chunks]
 
     def embed_chunks(self, chunks):
-        if not chunks:
-            return np.array([])  # Return an empty numpy array if chunks is empty
         return self.embedding_model.encode(chunks)
\ No newline at end of file
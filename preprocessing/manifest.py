@@ -0,0 +1,106 @@
+import os
+import json
+import time
+import hashlib
+
+MANIFEST_FILE = 'manifest.json'
+
+
+def content_hash(text):
+    """Returns the hash identifying a version of a website's scraped text."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def file_version(file):
+    """Returns what identifies a version of a Drive file: its md5Checksum, else its modifiedTime."""
+    return file.get('md5Checksum') or file.get('modifiedTime')
+
+
+class InvestmentManifest:
+    """
+    Records what was preprocessed for one investment, so that re-runs are incremental.
+
+    For every Drive file (keyed by its id) and website (keyed by its URL), the manifest
+    stores the version that was processed, the processing parameters (chunking, embedding
+    model, extractor version) and the output files that were written. An entry is current
+    when both the version and the parameters match; otherwise the source is reprocessed.
+
+    Websites have no version to list, so their entries record when they were fetched and
+    the hash of their text: one fetched more than `max_age` seconds ago is scraped again
+    (a cheap conditional GET, see `PageCache`), and only re-chunked if its text changed.
+    Files that yielded no content are recorded as `empty`, so they aren't re-extracted.
+    """
+
+    def __init__(self, investment_dir, files=None, websites=None):
+        self.investment_dir = investment_dir
+        self.path = os.path.join(investment_dir, MANIFEST_FILE)
+        self.files = files or {}
+        self.websites = websites or {}
+
+    @classmethod
+    def load(cls, investment_dir):
+        path = os.path.join(investment_dir, MANIFEST_FILE)
+        if not os.path.exists(path):
+            return cls(investment_dir)
+        with open(path, 'r') as f:
+            data = json.load(f)
+        return cls(investment_dir, data.get('files', {}), data.get('websites', {}))
+
+    def save(self):
+        """Writes the manifest atomically, so an interrupted run never leaves it half-written."""
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'files': self.files, 'websites': self.websites}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def is_file_current(self, file, params):
+        entry = self.files.get(file['id'])
+        return entry is not None and entry['version'] == file_version(file) and entry['params'] == params
+
+    def is_file_empty(self, file_id):
+        """Returns whether a file was processed and yielded no content (so it has nothing in the chunk store)."""
+        return self.files.get(file_id, {}).get('empty', False)
+
+    def record_file(self, file, params, outputs, empty=False):
+        self.files[file['id']] = {
+            'name': file['name'],
+            'version': file_version(file),
+            'params': params,
+            'outputs': outputs,
+            'empty': empty
+        }
+
+    def is_website_current(self, url, params, max_age):
+        """Returns whether a website was processed with `params` less than `max_age` seconds ago."""
+        entry = self.websites.get(url)
+        return entry is not None and entry['params'] == params and time.time() - entry.get('fetched', 0) < max_age
+
+    def is_website_unchanged(self, url, params, text):
+        """Returns whether a website was processed with `params` from the same `text`."""
+        entry = self.websites.get(url)
+        return entry is not None and entry['params'] == params and entry.get('content_hash') == content_hash(text)
+
+    def record_website(self, url, params, outputs, text):
+        self.websites[url] = {'params': params, 'outputs': outputs,
+                              'fetched': time.time(), 'content_hash': content_hash(text)}
+
+    def remove_outputs(self, outputs):
+        """Deletes the given output files of this investment, ignoring ones already gone."""
+        for output in outputs:
+            path = os.path.join(self.investment_dir, output)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def forget_file(self, file_id):
+        """Removes a file from the manifest, deleting its outputs."""
+        entry = self.files.pop(file_id, None)
+        if entry:
+            self.remove_outputs(entry['outputs'])
+        return entry
+
+    def forget_website(self, url):
+        """Removes a website from the manifest, deleting its outputs."""
+        entry = self.websites.pop(url, None)
+        if entry:
+            self.remove_outputs(entry['outputs'])
+        return entry
@@ -0,0 +1,235 @@
+import os
+import queue
+import logging
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from tools.google_drive_reader import download_files, DOWNLOAD_WORKERS
+from tools.pdf_reader import read_pdf_file
+from tools.extraction_cache import get_extraction_cache
+from tools.web_scraper import scrape_many
+from instrumentation import get_tracer, span
+
+logger = logging.getLogger(__name__)
+
+SCRAPE_WORKERS = 2 # investments whose websites are scraped at once (each one's websites are scraped concurrently)
+_DONE = object() # Sentinel closing a stage's queue
+
+
+class StageCounters:
+    """Thread-safe progress counters (queued / done / failed) for each preprocessing stage."""
+
+    STAGES = ('download', 'scrape', 'extract', 'embed')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {stage: {'queued': 0, 'done': 0, 'failed': 0} for stage in self.STAGES}
+        self.skipped = 0
+
+    def queued(self, stage, count=1):
+        with self._lock:
+            self.counts[stage]['queued'] += count
+
+    def done(self, stage):
+        with self._lock:
+            self.counts[stage]['done'] += 1
+
+    def failed(self, stage):
+        with self._lock:
+            self.counts[stage]['failed'] += 1
+
+    def skip(self, count=1):
+        with self._lock:
+            self.skipped += count
+
+    def snapshot(self):
+        with self._lock:
+            return {stage: dict(counts) for stage, counts in self.counts.items()}, self.skipped
+
+    def summary(self):
+        """Returns a one-line progress summary, e.g. "download 3/10, extract 2/10 (1 failed), ..."."""
+        counts, skipped = self.snapshot()
+        parts = []
+        for stage, c in counts.items():
+            part = f"{stage} {c['done']}/{c['queued']}"
+            if c['failed']:
+                part += f" ({c['failed']} failed)"
+            parts.append(part)
+        parts.append(f"{skipped} unchanged")
+        return ", ".join(parts)
+
+
+class PreprocessingPipeline:
+    """
+    Runs preprocessing as a pipeline of stages connected by bounded queues.
+
+    - fetch (thread): lists and plans one investment after the other, downloads their
+      new or changed files concurrently and scrapes their websites on a small thread pool;
+    - extract (process pool): runs `read_pdf` on up to `workers` documents at once;
+    - embed (calling thread): chunks, embeds and writes each document or website, and
+      finalizes an investment once all of its sources are written.
+
+    Downloading the next documents thus overlaps with extracting and embedding the
+    current ones, across investments. At most `max_in_flight` downloaded documents wait
+    for extraction, `max_in_flight` are in extraction or embedding, and `download_workers`
+    are being downloaded (or wait to be queued), which bounds memory and disk use.
+    """
+
+    def __init__(self, preprocessor, workers=None, max_in_flight=None, download_workers=DOWNLOAD_WORKERS):
+        self.preprocessor = preprocessor
+        self.progress = preprocessor.progress
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.max_in_flight = max_in_flight or 2 * self.workers
+        self.download_workers = download_workers
+        self.downloaded = queue.Queue(maxsize=self.max_in_flight) # (state, file, path, error)
+        self.extracted = queue.Queue() # (kind, state, source, content, error, holds_slot); bounded by the slots
+        self.slots = threading.BoundedSemaphore(self.max_in_flight)
+
+    def run(self, investments):
+        """Preprocesses `investments`, returning once every one of them is finalized."""
+        with tempfile.TemporaryDirectory(prefix="eb5_downloads_") as download_dir:
+            fetcher = threading.Thread(target=self._fetch, args=(investments, download_dir),
+                                       name="preprocess-fetch", daemon=True)
+            extractor = threading.Thread(target=self._extract, name="preprocess-extract", daemon=True)
+            fetcher.start()
+            extractor.start()
+            self._embed()
+            fetcher.join()
+            extractor.join()
+
+    def _fetch(self, investments, download_dir):
+        try:
+            with ThreadPoolExecutor(max_workers=SCRAPE_WORKERS, thread_name_prefix="scrape") as scrape_pool:
+                for investment in investments:
+                    try:
+                        state, changed_files, changed_websites = self.preprocessor.plan_investment(investment)
+                    except Exception as e:
+                        logger.error(f"Error listing investment {investment['name']}: {str(e)}", exc_info=True)
+                        continue
+                    if not changed_files and not changed_websites:
+                        self.extracted.put(('finalize', state, None, None, None, False))
+                        continue
+
+                    try:
+                        self._fetch_investment(state, changed_files, changed_websites, download_dir, scrape_pool)
+                    except Exception as e:
+                        logger.error(f"Error fetching investment {investment['name']}: {str(e)}", exc_info=True)
+        finally:
+            self.downloaded.put(_DONE)
+
+    def _fetch_investment(self, state, changed_files, changed_websites, download_dir, scrape_pool):
+        """Downloads an investment's changed files and scrapes its changed websites.
+
+        If fetching fails part way, the sources not queued yet are queued as failed,
+        so that the investment is still finalized with what was fetched.
+        """
+        pending_files = {file['id']: file for file in changed_files}
+        pending_websites = list(changed_websites)
+        try:
+            scrapes = scrape_pool.submit(scrape_many, changed_websites) if changed_websites else None
+            for file, path, error in download_files(changed_files, download_dir, self.download_workers,
+                                                    max_in_flight=self.download_workers):
+                if error is None:
+                    self.progress.done('download')
+                else:
+                    self.progress.failed('download')
+                del pending_files[file['id']]
+                self.downloaded.put((state, file, path, error)) # Blocks while extraction is behind
+            for url, content in (scrapes.result() if scrapes else {}).items():
+                if isinstance(content, Exception):
+                    content, error = None, content
+                    self.progress.failed('scrape')
+                else:
+                    error = None
+                    self.progress.done('scrape')
+                pending_websites.remove(url)
+                self.extracted.put(('website', state, url, content, error, False))
+        except Exception as e:
+            for file in pending_files.values():
+                self.progress.failed('download')
+                self.extracted.put(('pdf', state, file, None, e, False))
+            for url in pending_websites:
+                self.progress.failed('scrape')
+                self.extracted.put(('website', state, url, None, e, False))
+            raise
+
+    def _extract(self):
+        # Spawned workers don't inherit the embedding model or the parent's threads. Documents
+        # are extracted in parallel, so each one's pages are OCRed sequentially (max_workers=1).
+        context = multiprocessing.get_context("spawn")
+        broken = None # Set once the pool can't take more work (e.g. BrokenProcessPool after an OOM kill)
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers, mp_context=context) as pool:
+                while True:
+                    item = self.downloaded.get()
+                    if item is _DONE:
+                        break
+                    state, file, path, error = item
+                    if error is None and broken is not None:
+                        error = broken
+                        self.progress.failed('extract')
+                    if error is not None:
+                        # Keep draining, so that the fetcher never blocks and every investment is finalized
+                        self.extracted.put(('pdf', state, file, None, error, False))
+                        continue
+                    self.slots.acquire() # Released once the document is written
+                    try:
+                        future = pool.submit(read_pdf_file, path, max_workers=1, remove=True)
+                    except Exception as e:
+                        logger.error(f"Extraction pool failed, failing the remaining documents: {str(e)}")
+                        broken = e
+                        self.slots.release()
+                        self.progress.failed('extract')
+                        self.extracted.put(('pdf', state, file, None, e, False))
+                        continue
+                    future.add_done_callback(
+                        lambda future, state=state, file=file: self._on_extracted(future, state, file))
+        finally:
+            # The pool has shut down, so every extraction result is already queued.
+            self.extracted.put(_DONE)
+
+    def _on_extracted(self, future, state, file):
+        try:
+            content, error = future.result(), None
+            get_tracer().merge(content.pop('trace', None)) # Spans of the worker process
+            hit = content.pop('cache_hit', False) # Counted in the worker's cache, which the parent never sees
+            get_extraction_cache().record_lookups(hits=int(hit), misses=int(not hit))
+            self.progress.done('extract')
+        except Exception as e:
+            content, error = None, e
+            self.progress.failed('extract')
+        self.extracted.put(('pdf', state, file, content, error, True))
+
+    def _embed(self):
+        while True:
+            item = self.extracted.get()
+            if item is _DONE:
+                break
+            kind, state, source, content, error, holds_slot = item
+            try:
+                if kind == 'pdf':
+                    if error is None:
+                        with span("preprocess.write_pdf", "preprocess"): # chunk, embed and store
+                            self.preprocessor.write_pdf_outputs(state, source, content)
+                    else:
+                        self.preprocessor.record_failure(state, source, error)
+                elif kind == 'website':
+                    if error is None:
+                        with span("preprocess.write_website", "preprocess"):
+                            self.preprocessor.write_website_outputs(state, source, content)
+                    else:
+                        logger.error(f"Error scraping website {source}: {str(error)}")
+            finally:
+                if holds_slot:
+                    self.slots.release()
+
+            if kind != 'finalize':
+                state.remaining -= 1
+            if state.remaining == 0:
+                try:
+                    self.preprocessor.finalize_investment(state)
+                except Exception as e:
+                    logger.error(f"Error finalizing investment {state.investment['name']}: {str(e)}", exc_info=True)
+                logger.info(f"Progress: {self.progress.summary()}")
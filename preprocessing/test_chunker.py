@@ -0,0 +1,40 @@
+import unittest
+import sys
+import os
+
+# Add the parent directory to the Python path to allow importing from preprocessing
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from preprocessing.chunker import TokenChunker
+
+class TestTokenChunker(unittest.TestCase):
+    def setUp(self):
+        # Without a tokenizer, tokens are counted as words
+        self.chunker = TokenChunker(max_tokens=12, overlap_tokens=7)
+
+    def test_chunks_fit_and_overlap_on_sentence_boundaries(self):
+        pages = [
+            (1, "The Company is offering units. Each unit costs $800,000 and\nfunds construction."),
+            (2, "Jobs will be created. Escrow is held by the bank until approval.")
+        ]
+        chunks = list(self.chunker.chunk_pages(iter(pages)))
+
+        self.assertEqual([c.text for c in chunks], [
+            "The Company is offering units. Each unit costs $800,000 and funds construction.",
+            "Each unit costs $800,000 and funds construction. Jobs will be created.",
+            "Jobs will be created. Escrow is held by the bank until approval."
+        ])
+        self.assertEqual([(c.page_start, c.page_end) for c in chunks], [(1, 1), (1, 2), (2, 2)])
+        self.assertTrue(all(len(c.text.split()) <= 12 for c in chunks))
+
+    def test_headings_start_chunks_and_long_sentences_are_split(self):
+        text = "1. SUMMARY\nShort intro.\n\nRISK FACTORS\n" + "risk " * 30
+        chunks = self.chunker.chunk_text(text)
+
+        self.assertEqual(chunks[0].text, "1. SUMMARY Short intro.")
+        self.assertTrue(chunks[1].text.startswith("RISK FACTORS"))
+        self.assertEqual(sum(c.text.split().count("risk") for c in chunks), 30)
+        self.assertTrue(all(len(c.text.split()) <= 12 for c in chunks))
+
+if __name__ == '__main__':
+    unittest.main()
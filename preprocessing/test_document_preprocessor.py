@@ -0,0 +1,44 @@
+import unittest
+import sys
+import os
+import tempfile
+import numpy as np
+
+# Add the parent directory to the Python path to allow importing from preprocessing
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from preprocessing.manifest import InvestmentManifest
+from tools.chunk_store import ChunkStore
+
+class TestWriteChunkStore(unittest.TestCase):
+    def setUp(self):
+        try:
+            from preprocessing.document_preprocessor import DocumentPreprocessor, InvestmentState
+        except ImportError as e:
+            self.skipTest(f"Preprocessing dependencies are not installed ({e})")
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        # write_chunk_store only uses the state, so the embedding model isn't loaded
+        self.preprocessor = DocumentPreprocessor.__new__(DocumentPreprocessor)
+        self.new_state = lambda investment: InvestmentState(
+            investment, self.tmp_dir.name, InvestmentManifest(self.tmp_dir.name))
+
+    def test_website_listed_twice_is_stored_once(self):
+        url = "https://example.com/deal"
+        state = self.new_state({'id': '1', 'name': 'Hotel', 'websites': [url, url]})
+        state.manifest.record_website(url, {}, [], "Hotel development")
+        state.pending[url] = {'id': url, 'name': url, 'type': 'website', 'path': url,
+                              'chunks': {'text': (["Hotel development"], np.ones((1, 3)), [(0, 0)])}}
+        self.preprocessor.write_chunk_store(state)
+
+        # Rewritten, the website is carried over from the previous store once as well
+        state = self.new_state(state.investment)
+        state.manifest.record_website(url, {}, [], "Hotel development")
+        self.preprocessor.write_chunk_store(state)
+
+        store = ChunkStore.open(self.tmp_dir.name)
+        self.assertEqual([doc['id'] for doc in store.documents], [url])
+        self.assertEqual(list(store.chunks(store.document(url))), ["Hotel development"])
+
+if __name__ == '__main__':
+    unittest.main()
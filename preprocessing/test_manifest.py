@@ -0,0 +1,42 @@
+import unittest
+import sys
+import os
+import tempfile
+
+# Add the parent directory to the Python path to allow importing from preprocessing
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from preprocessing.manifest import InvestmentManifest
+
+class TestInvestmentManifest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.params = {'chunking': 'tokens', 'extractor': 3}
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_websites_are_revalidated_once_stale(self):
+        manifest = InvestmentManifest(self.tmp_dir.name)
+        manifest.record_website("https://example.com/rc", self.params, ["summaries/rc.txt"], "Regional center")
+        self.assertTrue(manifest.is_website_current("https://example.com/rc", self.params, max_age=60))
+        manifest.websites["https://example.com/rc"]['fetched'] -= 120
+        self.assertFalse(manifest.is_website_current("https://example.com/rc", self.params, max_age=60))
+
+        self.assertTrue(manifest.is_website_unchanged("https://example.com/rc", self.params, "Regional center"))
+        self.assertFalse(manifest.is_website_unchanged("https://example.com/rc", self.params, "New project"))
+        self.assertFalse(manifest.is_website_unchanged("https://example.com/rc", {'chunking': 'words'}, "Regional center"))
+
+    def test_empty_files_are_recorded(self):
+        manifest = InvestmentManifest(self.tmp_dir.name)
+        file = {'id': 'f1', 'name': 'scan.pdf', 'md5Checksum': 'abc'}
+        manifest.record_file(file, self.params, [], empty=True)
+        manifest.save()
+
+        manifest = InvestmentManifest.load(self.tmp_dir.name)
+        self.assertTrue(manifest.is_file_current(file, self.params))
+        self.assertTrue(manifest.is_file_empty('f1'))
+        self.assertFalse(manifest.is_file_current(dict(file, md5Checksum='def'), self.params))
+
+if __name__ == '__main__':
+    unittest.main()
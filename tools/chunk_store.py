@@ -0,0 +1,248 @@
+import os
+import json
+import uuid
+import shutil
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+STORE_FORMAT_VERSION = 1
+POINTER_FILE = 'chunk_store.json' # Names the current store generation of an investment
+CHUNK_KINDS = ('text', 'visual')
+
+# One row per chunk. Pages are 1-based; 0 when the page span is unknown.
+ROW_DTYPE = np.dtype([
+    ('doc', '<i4'),
+    ('kind', 'i1'),
+    ('chunk_index', '<i4'),
+    ('page_start', '<i4'),
+    ('page_end', '<i4')
+])
+
+
+def store_key(doc_type, doc_id):
+    """Returns the file-system safe key of a document: its Drive file id, or the website URL's stem."""
+    if doc_type == 'website':
+        return doc_id.replace('https://', '').replace('http://', '').replace('/', '_')
+    return doc_id
+
+
+class ChunkView:
+    """
+    Read-only sequence of the chunk texts of some rows of a `ChunkStore`.
+
+    Texts are decoded from the memory-mapped blob on access, so building a view copies nothing.
+    """
+
+    def __init__(self, store, start, end):
+        self.store = store
+        self.start = start
+        self.end = end
+
+    def __len__(self):
+        return self.end - self.start
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("chunk index out of range")
+        return self.store.text(self.start + i)
+
+    def __iter__(self):
+        return (self.store.text(row) for row in range(self.start, self.end))
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+
+class ChunkStore:
+    """
+    Columnar, memory-mapped store of every chunk of one investment.
+
+    A store generation is a directory holding:
+        - `texts.bin`: the UTF-8 chunk texts back to back, and `text_offsets.npy`, where
+          row i's text is `texts[offsets[i]:offsets[i + 1]]`;
+        - `embeddings.npy`: one row-normalized float32 (or float16) embedding per row;
+        - `rows.npy`: the metadata table (document, kind, chunk index, page span, see ROW_DTYPE);
+        - `documents.json`: the documents (id, key, name, type, path, page triage) and the
+          rows each one spans, per kind.
+    Rows are ordered by kind, then document, so each document's chunks of one kind, and
+    all text chunks of the investment, are contiguous slices. Documents are keyed by their
+    Drive file id (or URL), so equally named files in different folders don't collide.
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, 'store_info.json'), 'r') as f:
+            self.info = json.load(f)
+        with open(os.path.join(store_dir, 'documents.json'), 'r') as f:
+            self.documents = json.load(f)
+        self.rows = np.load(os.path.join(store_dir, 'rows.npy'))
+        self.offsets = np.load(os.path.join(store_dir, 'text_offsets.npy'))
+        self.embeddings = np.load(os.path.join(store_dir, 'embeddings.npy'), mmap_mode='r')
+        texts_file = os.path.join(store_dir, 'texts.bin')
+        if os.path.getsize(texts_file):
+            self._texts = np.memmap(texts_file, dtype=np.uint8, mode='r')
+        else:
+            self._texts = np.zeros(0, dtype=np.uint8) # Empty files can't be mapped
+        self._by_id = {doc['id']: doc for doc in self.documents}
+
+    @staticmethod
+    def exists(investment_dir):
+        return os.path.isfile(os.path.join(investment_dir, POINTER_FILE))
+
+    @classmethod
+    def open(cls, investment_dir):
+        """Opens the current store of an investment, or returns None if it has none."""
+        if not cls.exists(investment_dir):
+            return None
+        with open(os.path.join(investment_dir, POINTER_FILE), 'r') as f:
+            pointer = json.load(f)
+        if pointer.get('version') != STORE_FORMAT_VERSION:
+            logger.warning(f"Chunk store of {investment_dir} has format {pointer.get('version')}, ignoring it")
+            return None
+        return cls(os.path.join(investment_dir, pointer['dir']))
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def text_rows(self):
+        """Number of text chunks; they are the first rows of the store."""
+        return int(self.info['text_rows'])
+
+    def text(self, row):
+        return bytes(self._texts[self.offsets[row]:self.offsets[row + 1]]).decode('utf-8')
+
+    def document(self, doc_id):
+        return self._by_id.get(doc_id)
+
+    def row_range(self, doc, kind='text'):
+        """Returns the (start, end) rows of a document's chunks of one kind."""
+        start, end = doc['rows'].get(kind, (0, 0))
+        return start, end
+
+    def chunks(self, doc, kind='text'):
+        """Returns a document's chunks of one kind as a zero-copy `ChunkView`."""
+        return ChunkView(self, *self.row_range(doc, kind))
+
+    def doc_embeddings(self, doc, kind='text'):
+        start, end = self.row_range(doc, kind)
+        return self.embeddings[start:end]
+
+    def pages(self, doc, kind='text'):
+        """Returns the (page_start, page_end) of each of a document's chunks of one kind."""
+        start, end = self.row_range(doc, kind)
+        return [(int(r['page_start']), int(r['page_end'])) for r in self.rows[start:end]]
+
+
+class ChunkStoreWriter:
+    """
+    Collects the chunks and embeddings of an investment's documents, then writes them
+    as a new `ChunkStore` generation.
+
+    The generation is written to its own directory and published by atomically replacing
+    the investment's pointer file, so readers always see a complete store. The previous
+    generation is kept until the next write, so readers that still map it keep working;
+    only older generations are removed.
+    """
+
+    def __init__(self, embedding_dtype='float32'):
+        self.embedding_dtype = np.dtype(embedding_dtype)
+        self.documents = []
+        self.parts = {kind: [] for kind in CHUNK_KINDS} # kind -> [(doc position, texts, embeddings, pages)]
+
+    def add_document(self, doc_id, name, doc_type='file', path=None, page_triage=None):
+        """Registers a document and returns its position, to pass to `add_chunks`."""
+        self.documents.append({
+            'id': doc_id,
+            'key': store_key(doc_type, doc_id),
+            'name': name,
+            'type': doc_type,
+            'path': path if path is not None else name,
+            'page_triage': page_triage or []
+        })
+        return len(self.documents) - 1
+
+    def add_chunks(self, doc, kind, texts, embeddings, pages=None):
+        """Adds a document's chunks of one kind, with one embedding and (optional) page span per chunk."""
+        if not len(texts):
+            return
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if embeddings.ndim != 2 or embeddings.shape[0] != len(texts):
+            raise ValueError(f"{len(texts)} chunks but embeddings of shape {embeddings.shape}")
+        self.parts[kind].append((doc, list(texts), embeddings, pages or [(0, 0)] * len(texts)))
+
+    def copy_document(self, store, doc):
+        """Carries a document, with all of its chunks, over from an existing store."""
+        position = self.add_document(doc['id'], doc['name'], doc['type'], doc.get('path'), doc.get('page_triage'))
+        for kind in CHUNK_KINDS:
+            self.add_chunks(position, kind, list(store.chunks(doc, kind)),
+                            store.doc_embeddings(doc, kind), store.pages(doc, kind))
+        return position
+
+    def write(self, investment_dir):
+        """Writes a new store generation for the investment, then removes the ones before the previous one."""
+        generation = f"chunk_store-{uuid.uuid4().hex[:12]}"
+        store_dir = os.path.join(investment_dir, generation)
+        os.makedirs(store_dir)
+
+        rows, texts, matrices = [], [], []
+        for doc in self.documents:
+            doc['rows'] = {}
+        for kind_id, kind in enumerate(CHUNK_KINDS):
+            for doc, doc_texts, embeddings, pages in self.parts[kind]:
+                start = len(texts)
+                self.documents[doc]['rows'][kind] = [start, start + len(doc_texts)]
+                rows.extend((doc, kind_id, i, page_start, page_end)
+                            for i, (page_start, page_end) in enumerate(pages))
+                texts.extend(doc_texts)
+                matrices.append(embeddings)
+
+        encoded = [text.encode('utf-8') for text in texts]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        with open(os.path.join(store_dir, 'texts.bin'), 'wb') as f:
+            f.write(b''.join(encoded))
+        np.save(os.path.join(store_dir, 'text_offsets.npy'), offsets)
+        np.save(os.path.join(store_dir, 'rows.npy'), np.array(rows, dtype=ROW_DTYPE))
+
+        if matrices:
+            embeddings = np.vstack(matrices)
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            embeddings = (embeddings / norms).astype(self.embedding_dtype)
+        else:
+            embeddings = np.zeros((0, 0), dtype=self.embedding_dtype)
+        np.save(os.path.join(store_dir, 'embeddings.npy'), embeddings)
+
+        with open(os.path.join(store_dir, 'documents.json'), 'w') as f:
+            json.dump(self.documents, f)
+        with open(os.path.join(store_dir, 'store_info.json'), 'w') as f:
+            json.dump({
+                'version': STORE_FORMAT_VERSION,
+                'rows': len(rows),
+                'text_rows': sum(len(part[1]) for part in self.parts['text']),
+                'dim': int(embeddings.shape[1]) if embeddings.ndim == 2 else 0,
+                'embedding_dtype': self.embedding_dtype.name
+            }, f, indent=2)
+
+        pointer_file = os.path.join(investment_dir, POINTER_FILE)
+        try:
+            with open(pointer_file, 'r') as f:
+                previous = json.load(f).get('dir')
+        except (FileNotFoundError, json.JSONDecodeError):
+            previous = None
+        with open(pointer_file + '.tmp', 'w') as f:
+            json.dump({'version': STORE_FORMAT_VERSION, 'dir': generation}, f)
+        os.replace(pointer_file + '.tmp', pointer_file)
+
+        for entry in os.listdir(investment_dir):
+            if entry.startswith('chunk_store-') and entry not in (generation, previous):
+                shutil.rmtree(os.path.join(investment_dir, entry), ignore_errors=True)
+        logger.info(f"Wrote chunk store {store_dir}: {len(self.documents)} documents, {len(rows)} chunks")
+        return store_dir
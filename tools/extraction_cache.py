@@ -0,0 +1,203 @@
+import os
+import json
+import gzip
+import uuid
+import time
+import shutil
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.path.join("cache", "extraction")
+DEFAULT_MAX_BYTES = 5 * 1024 ** 3 # 5 GB
+SCAN_EVERY_WRITES = 64 # Rescan the cache after this many writes, to account for other workers' writes
+TMP_MAX_AGE = 3600 # Seconds after which a temporary entry is an orphan of a crashed writer
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_extraction_cache():
+    """Returns the process-wide extraction cache.
+
+    Its location and size cap can be set with the EB5_EXTRACTION_CACHE_DIR and
+    EB5_EXTRACTION_CACHE_MAX_BYTES environment variables, e.g. to share one cache volume.
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ExtractionCache(
+                os.getenv("EB5_EXTRACTION_CACHE_DIR", DEFAULT_CACHE_DIR),
+                int(os.getenv("EB5_EXTRACTION_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+            )
+        return _cache
+
+
+class ExtractionCache:
+    """
+    Content-addressed, on-disk cache of per-page extraction results.
+
+    An entry is keyed by the hash of the file's bytes plus the hash of the extraction
+    parameters and extractor version, and stored as a directory of gzipped per-page
+    records under a two-level shard (`ab/cd/<key>/`). Entries are written to a temporary
+    directory and renamed into place, so readers (possibly other processes sharing the
+    volume) never see partial entries. Once the cache exceeds `max_bytes`, the least
+    recently used entries are evicted.
+
+    Each process tracks the cache size from its own writes, and only scans the cache
+    (evicting, and removing temporary entries orphaned by crashed writers) when that
+    estimate exceeds `max_bytes` or every `SCAN_EVERY_WRITES` writes, so a write doesn't
+    cost a scan of the whole volume. Entries removed by other workers during a scan are skipped.
+    """
+
+    MANIFEST = "manifest.json"
+
+    def __init__(self, root=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._size = None # Estimated size, from the last scan plus this process's writes since
+        self._writes_since_scan = 0
+        os.makedirs(os.path.join(self.root, ".tmp"), exist_ok=True)
+
+    @staticmethod
+    def key(file_content, params, extractor_version):
+        """Returns the cache key of a file extracted with the given parameters and extractor version."""
+        content_hash = hashlib.sha256(file_content).hexdigest()
+        params_hash = hashlib.sha256(
+            json.dumps({"params": params, "version": extractor_version}, sort_keys=True).encode("utf-8")
+        ).hexdigest()[:16]
+        return f"{content_hash}-{params_hash}"
+
+    def _entry_dir(self, key):
+        return os.path.join(self.root, key[:2], key[2:4], key)
+
+    def get(self, key):
+        """Returns the cached page records for `key`, or None on a miss."""
+        entry_dir = self._entry_dir(key)
+        manifest_file = os.path.join(entry_dir, self.MANIFEST)
+        try:
+            with open(manifest_file, "r") as f:
+                manifest = json.load(f)
+            pages = []
+            for page_file in manifest["pages"]:
+                with gzip.open(os.path.join(entry_dir, page_file), "rt", encoding="utf-8") as f:
+                    pages.append(json.load(f))
+            # The manifest's mtime records the last access, for LRU eviction.
+            os.utime(manifest_file)
+        except (FileNotFoundError, KeyError, ValueError, OSError):
+            # Missing, or evicted by another worker while being read.
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return pages
+
+    def record_lookups(self, hits=0, misses=0):
+        """Adds lookups made by another process (e.g. a preprocessing worker) to the stats."""
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def put(self, key, pages):
+        """Stores the page records for `key` atomically, evicting entries when the cache is over its cap."""
+        tmp_dir = os.path.join(self.root, ".tmp", uuid.uuid4().hex)
+        os.makedirs(tmp_dir)
+        page_files = []
+        for i, page in enumerate(pages):
+            page_file = f"page-{i:05d}.json.gz"
+            with gzip.open(os.path.join(tmp_dir, page_file), "wt", encoding="utf-8") as f:
+                json.dump(page, f)
+            page_files.append(page_file)
+        with open(os.path.join(tmp_dir, self.MANIFEST), "w") as f:
+            json.dump({"key": key, "pages": page_files}, f)
+        entry_size = sum(entry.stat().st_size for entry in os.scandir(tmp_dir))
+
+        entry_dir = self._entry_dir(key)
+        os.makedirs(os.path.dirname(entry_dir), exist_ok=True)
+        try:
+            os.rename(tmp_dir, entry_dir)
+        except OSError:
+            # Another worker stored the same entry first; keep theirs.
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        else:
+            with self._lock:
+                self.writes += 1
+                if self._size is not None:
+                    self._size += entry_size
+                self._writes_since_scan += 1
+                scan = self._size is None or self._size > self.max_bytes or \
+                    self._writes_since_scan >= SCAN_EVERY_WRITES
+            if scan:
+                self.evict()
+
+    @staticmethod
+    def _scandir(path):
+        """Lists a directory, or nothing if another worker removed it."""
+        try:
+            with os.scandir(path) as entries:
+                return list(entries)
+        except (FileNotFoundError, NotADirectoryError):
+            return []
+
+    def _entries(self):
+        """Yields (last_access, size_in_bytes, entry_dir) for every complete entry."""
+        for shard in self._scandir(self.root):
+            if shard.name == ".tmp" or not shard.is_dir():
+                continue
+            for subshard in self._scandir(shard.path):
+                for entry in self._scandir(subshard.path):
+                    try:
+                        last_access = os.stat(os.path.join(entry.path, self.MANIFEST)).st_mtime
+                        yield last_access, sum(f.stat().st_size for f in self._scandir(entry.path)), entry.path
+                    except FileNotFoundError:
+                        continue
+
+    def remove_orphans(self, max_age=TMP_MAX_AGE):
+        """Removes temporary entries older than `max_age` seconds, left behind by crashed writers."""
+        now = time.time()
+        for tmp_dir in self._scandir(os.path.join(self.root, ".tmp")):
+            try:
+                if now - tmp_dir.stat().st_mtime > max_age:
+                    shutil.rmtree(tmp_dir.path, ignore_errors=True)
+                    logger.info(f"Removed orphaned temporary entry {tmp_dir.path}")
+            except FileNotFoundError:
+                continue
+
+    def size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """Removes least recently used entries until the cache fits in `max_bytes`."""
+        self.remove_orphans()
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry_dir in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= size
+            with self._lock:
+                self.evictions += 1
+            logger.info(f"Evicted {entry_dir} from the extraction cache")
+        with self._lock:
+            self._size = total
+            self._writes_since_scan = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "writes": self.writes,
+                "evictions": self.evictions,
+            }
@@ -4,36 +4,167 @@ from google.auth.transport.requests import Request
 from google_auth_oauthlib.flow import Flow
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaIoBaseDownload
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 import io
 import os
+import time
+import logging
+import threading
 from dotenv import load_dotenv
 
+from instrumentation import span
+
 load_dotenv('secrets/.env')
 
+logger = logging.getLogger(__name__)
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+FILE_FIELDS = "id, name, mimeType, modifiedTime, md5Checksum, size, parents"
+PAGE_SIZE = 1000 # Maximum allowed by the Drive API
+PARENTS_PER_QUERY = 40 # Folders listed together in one query (keeps the query string short)
+DOWNLOAD_WORKERS = 8
+DOWNLOAD_CHUNK_SIZE = 8 * 1024 * 1024 # 8 MB per request
+API_RETRIES = 5 # Retries (with exponential backoff) of rate-limited / 5xx API calls
+
+_thread_local = threading.local()
+
 def get_drive_service():
-    # Try service account first
-    service_account_file = 'secrets/service_account_key.json'
-    if os.path.exists(service_account_file):
+    """Returns this thread's authorized Drive client, building it on first use.
+
+    The underlying HTTP client is not thread-safe, so each (download) thread gets its own.
+    """
+    service = getattr(_thread_local, 'service', None)
+    if service is None:
+        service_account_file = 'secrets/service_account_key.json'
+        if not os.path.exists(service_account_file):
+            raise FileNotFoundError(f"Drive service account key not found at {service_account_file}")
         creds = service_account.Credentials.from_service_account_file(
             service_account_file, scopes=['https://www.googleapis.com/auth/drive.readonly']
         )
-    return build('drive', 'v3', credentials=creds)
+        service = build('drive', 'v3', credentials=creds, cache_discovery=False)
+        _thread_local.service = service
+    return service
 
-def list_files_in_folder(folder_id):
+def _list(query):
+    """Returns every file matching `query`, following nextPageToken across pages."""
     service = get_drive_service()
-    results = service.files().list(
-        q=f"'{folder_id}' in parents",
-        fields="nextPageToken, files(id, name, mimeType)"
-    ).execute()
-    items = results.get('files', [])
-    return items
+    items, page_token = [], None
+    while True:
+        results = service.files().list(
+            q=query,
+            fields=f"nextPageToken, files({FILE_FIELDS})",
+            pageSize=PAGE_SIZE,
+            pageToken=page_token
+        ).execute(num_retries=API_RETRIES)
+        items.extend(results.get('files', []))
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            return items
+
+def list_files_in_folder(folder_id):
+    return _list(f"'{folder_id}' in parents and trashed = false")
+
+def list_files_recursive(folder_id, skip_folder=lambda folder: folder['name'].startswith("(ignored) ")):
+    """Lists every non-folder file below `folder_id`, descending into subfolders.
+
+    Walks the tree level by level, listing the children of many folders per query.
+    Folders for which `skip_folder` returns True are not descended into.
+
+    Returns:
+        list[dict]: The files, in listing order, each with an added 'folder_path' key.
+    """
+    files = []
+    level = {folder_id: ""}
+    while level:
+        next_level = {}
+        folder_ids = list(level)
+        for start in range(0, len(folder_ids), PARENTS_PER_QUERY):
+            batch = folder_ids[start:start + PARENTS_PER_QUERY]
+            parents = " or ".join(f"'{parent}' in parents" for parent in batch)
+            for item in _list(f"({parents}) and trashed = false"):
+                parent = next((p for p in item.get('parents', []) if p in level), batch[0])
+                path = os.path.join(level[parent], item['name'])
+                if item['mimeType'] == FOLDER_MIME_TYPE:
+                    if not skip_folder(item):
+                        next_level[item['id']] = path
+                else:
+                    item['folder_path'] = level[parent]
+                    files.append(item)
+        level = next_level
+    return files
 
 def read_file_from_drive(file_id):
     service = get_drive_service()
     request = service.files().get_media(fileId=file_id)
     file = io.BytesIO()
-    downloader = MediaIoBaseDownload(file, request)
-    done = False
-    while done is False:
-        status, done = downloader.next_chunk()
-    return file.getvalue()
\ No newline at end of file
+    with span("drive.download", "io", file_id=file_id) as s:
+        downloader = MediaIoBaseDownload(file, request, chunksize=DOWNLOAD_CHUNK_SIZE)
+        done = False
+        while done is False:
+            status, done = downloader.next_chunk(num_retries=API_RETRIES)
+        s.set(bytes=file.tell())
+    return file.getvalue()
+
+def download_file(file_id, dest_path, chunk_size=DOWNLOAD_CHUNK_SIZE, retries=3, backoff=2.0):
+    """Streams a Drive file to `dest_path`, `chunk_size` bytes per request.
+
+    The file is written under a temporary name and renamed once complete. Failed
+    downloads are restarted up to `retries` times, with exponential backoff.
+    """
+    tmp_path = dest_path + '.part'
+    for attempt in range(retries + 1):
+        try:
+            with span("drive.download", "io", file_id=file_id, attempt=attempt) as s:
+                request = get_drive_service().files().get_media(fileId=file_id)
+                with open(tmp_path, 'wb') as f:
+                    downloader = MediaIoBaseDownload(f, request, chunksize=chunk_size)
+                    done = False
+                    while done is False:
+                        status, done = downloader.next_chunk(num_retries=API_RETRIES)
+                s.set(bytes=os.path.getsize(tmp_path))
+            os.replace(tmp_path, dest_path)
+            return dest_path
+        except Exception as e:
+            if attempt == retries:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            delay = backoff * (2 ** attempt)
+            logger.warning(f"Download of {file_id} failed ({e}), retrying in {delay:.0f}s")
+            time.sleep(delay)
+
+def download_files(files, dest_dir, max_workers=DOWNLOAD_WORKERS, chunk_size=DOWNLOAD_CHUNK_SIZE, max_in_flight=None):
+    """Downloads Drive files concurrently into `dest_dir`, with at most `max_workers` at a time.
+
+    A download is only started once an earlier one has been consumed, so that at most
+    `max_in_flight` (default: `max_workers`) finished or running downloads are waiting
+    for the caller, which bounds disk use when the caller falls behind.
+
+    Yields:
+        tuple: (file, path, error) for each file as its download finishes; `path` is None
+            and `error` the exception if the download failed.
+    """
+    os.makedirs(dest_dir, exist_ok=True)
+    max_in_flight = max(1, max_in_flight or max_workers)
+    files = iter(files)
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="drive-download") as pool:
+        def submit(file):
+            return pool.submit(download_file, file['id'], os.path.join(dest_dir, file['id']), chunk_size)
+
+        in_flight = {}
+        for file in files:
+            in_flight[submit(file)] = file
+            if len(in_flight) >= max_in_flight:
+                break
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                file = in_flight.pop(future)
+                try:
+                    result = file, future.result(), None
+                except Exception as e:
+                    result = file, None, e
+                yield result # The next download starts once the caller took this one
+                next_file = next(files, None)
+                if next_file is not None:
+                    in_flight[submit(next_file)] = next_file
@@ -0,0 +1,132 @@
+import os
+import json
+import uuid
+import shutil
+import hashlib
+import logging
+import threading
+import numpy as np
+
+import config
+
+logger = logging.getLogger(__name__)
+
+INDEX_FORMAT_VERSION = 1
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def index_version(text, embedding_model, chunk_size, chunk_overlap, chunker_version):
+    """Returns the version of a knowledge base's index: a hash of its text and of how it's chunked and embedded."""
+    key = json.dumps([INDEX_FORMAT_VERSION, embedding_model, chunk_size, chunk_overlap, chunker_version])
+    return hashlib.sha256(key.encode('utf-8') + b'\0' + text.encode('utf-8')).hexdigest()[:16]
+
+
+def get_knowledge_base(path, index_dir=None):
+    """Returns the process-wide index of the knowledge base at `path`, loading (or building) it on first use."""
+    path = os.path.normpath(path)
+    with _indexes_lock:
+        if path not in _indexes:
+            _indexes[path] = KnowledgeBaseIndex.load_or_build(path, index_dir or config.KB_INDEX_DIR)
+        return _indexes[path]
+
+
+def build_knowledge_bases(paths, index_dir=None):
+    """Builds the index of each knowledge base that doesn't have a current one; missing files are skipped."""
+    indexes = []
+    for path in paths:
+        if not os.path.exists(path):
+            logger.warning(f"Knowledge base {path} not found, not indexed")
+            continue
+        indexes.append(get_knowledge_base(path, index_dir))
+    return indexes
+
+
+class KnowledgeBaseIndex:
+    """
+    Persistent semantic index of one knowledge-base text file, shared by every agent and crew.
+
+    The text is chunked and embedded once, with the same chunker and embedding model as
+    the investment documents, into `<index_dir>/<name>-<version>/`: the chunks as JSON
+    and their normalized embeddings as a .npy file, loaded memory-mapped. The version
+    hashes the text and the chunking / embedding parameters, so editing a knowledge base
+    (or changing the model) builds a new index; older versions are then removed.
+    """
+
+    def __init__(self, name, version, chunks, embeddings):
+        self.name = name
+        self.version = version
+        self.chunks = chunks
+        self.embeddings = embeddings
+
+    def __len__(self):
+        return len(self.chunks)
+
+    @classmethod
+    def load_or_build(cls, path, index_dir):
+        """Loads the current index of the knowledge base at `path`, building it if there's none.
+
+        Loading only reads the text (to hash it) and the index; the embedding model is only
+        loaded to build an index.
+        """
+        from preprocessing.chunker import CHUNKER_VERSION
+        name = os.path.splitext(os.path.basename(path))[0]
+        with open(path, 'r', encoding='utf-8') as f:
+            text = f.read()
+        # CHUNK_MAX_TOKENS = None means the model's input window, which the model name determines
+        version = index_version(text, config.EMBEDDING_MODEL, config.CHUNK_MAX_TOKENS,
+                                config.CHUNK_OVERLAP_TOKENS, CHUNKER_VERSION)
+
+        index_path = os.path.join(index_dir, f"{name}-{version}")
+        if os.path.exists(index_path):
+            return cls.load(index_path, name, version)
+        return cls.build(text, index_dir, name, version)
+
+    @classmethod
+    def load(cls, index_path, name, version):
+        with open(os.path.join(index_path, 'chunks.json'), 'r', encoding='utf-8') as f:
+            chunks = json.load(f)['chunks']
+        embeddings = np.load(os.path.join(index_path, 'embeddings.npy'), mmap_mode='r')
+        logger.info(f"Loaded knowledge base index {name} ({len(chunks)} chunks, version {version})")
+        return cls(name, version, chunks, embeddings)
+
+    @classmethod
+    def build(cls, text, index_dir, name, version):
+        # Imported here, so that loading an index doesn't load the embedding model
+        from preprocessing.chunker import TokenChunker
+        from embedding_service import get_embedding_service
+        service = get_embedding_service(config.EMBEDDING_MODEL)
+        chunk_size = config.CHUNK_MAX_TOKENS or service.max_seq_length - 2 # [CLS], [SEP]
+        chunker = TokenChunker(service.tokenizer, chunk_size, config.CHUNK_OVERLAP_TOKENS)
+        chunks = [chunk.text for chunk in chunker.chunk_text(text)]
+        embeddings = service.encode(chunks)
+        logger.info(f"Built knowledge base index {name}: {len(chunks)} chunks")
+
+        # Written to a temporary directory, then renamed into place, so a partial index is never loaded
+        os.makedirs(index_dir, exist_ok=True)
+        index_path = os.path.join(index_dir, f"{name}-{version}")
+        tmp_path = os.path.join(index_dir, f".{name}-{uuid.uuid4().hex}")
+        os.makedirs(tmp_path)
+        with open(os.path.join(tmp_path, 'chunks.json'), 'w', encoding='utf-8') as f:
+            json.dump({'name': name, 'version': version, 'embedding_model': service.model_name, 'chunks': chunks}, f)
+        np.save(os.path.join(tmp_path, 'embeddings.npy'), embeddings)
+        try:
+            os.rename(tmp_path, index_path)
+        except OSError: # Built concurrently by another process
+            shutil.rmtree(tmp_path)
+
+        for entry in os.listdir(index_dir):
+            if entry.startswith(f"{name}-") and entry != f"{name}-{version}":
+                shutil.rmtree(os.path.join(index_dir, entry), ignore_errors=True)
+        return cls.load(index_path, name, version)
+
+    def search(self, query_embedding, top_k=5):
+        """Returns the `top_k` (similarity, chunk) pairs most similar to a normalized query embedding."""
+        if not len(self.chunks):
+            return []
+        similarities = self.embeddings @ query_embedding
+        top_k = min(top_k, len(similarities))
+        top = np.argpartition(-similarities, top_k - 1)[:top_k]
+        top = top[np.argsort(-similarities[top])]
+        return [(float(similarities[i]), self.chunks[i]) for i in top]
@@ -0,0 +1,57 @@
+from crewai_tools import BaseTool
+
+import os
+import logging
+import threading
+from typing import Type, Any
+from pydantic.v1 import BaseModel, Field
+
+from instrumentation import traced_tool_run
+from tools.knowledge_base import get_knowledge_base
+
+logger = logging.getLogger(__name__)
+
+_tools = {}
+_tools_lock = threading.Lock()
+
+
+def get_knowledge_search_tool(path):
+    """Returns the search tool of the knowledge base at `path`, shared by every agent that uses it."""
+    path = os.path.normpath(path)
+    with _tools_lock:
+        if path not in _tools:
+            _tools[path] = KnowledgeSearchTool(path)
+        return _tools[path]
+
+
+class KnowledgeSearchToolSchema(BaseModel):
+    """Input for KnowledgeSearchTool."""
+    query: str = Field(..., description="Search query.")
+    top_k: int = Field(5, description="Number of top results to return.")
+
+class KnowledgeSearchTool(BaseTool):
+    name: str = "Knowledge Search"
+    description: str = "Performs a semantic search in the agent's knowledge base (background knowledge of its domain)."
+    args_schema: Type[BaseModel] = KnowledgeSearchToolSchema
+    path: str = Field(..., description="knowledge base file", init_var=True)
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self.description = f"Performs a semantic search in the {os.path.splitext(os.path.basename(path))[0]} knowledge base."
+
+    @traced_tool_run
+    def _run(self, **kwargs: Any) -> Any:
+        query = kwargs.get("query")
+        top_k = kwargs.get("top_k", 5)
+        if not os.path.exists(self.path):
+            logger.error(f"Knowledge base {self.path} not found")
+            return "Error: This knowledge base is not available."
+
+        # The index is loaded (or built) on first use, then shared with every other agent and crew
+        from embedding_service import get_embedding_service
+        index = get_knowledge_base(self.path)
+        results = index.search(get_embedding_service().encode_query(query), int(top_k))
+        if not results:
+            return "No results found in the knowledge base."
+        return "\n\n".join(f"[{similarity:.2f}] {chunk}" for similarity, chunk in results)
@@ -1,59 +1,227 @@
 import PyPDF2
-import pytesseract
-from pdf2image import convert_from_bytes
 from io import BytesIO
-import cv2
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 import numpy as np
-import hashlib
 import os
-import json
-
-def read_pdf(file_content, max_pages=50):
-    file_hash = hashlib.md5(file_content).hexdigest()
-    cache_file = f"cache/{file_hash}.json"
-    
-    if os.path.exists(cache_file):
-        with open(cache_file, 'r') as f:
-            return json.load(f)
-    
-    text_content = extract_text(file_content, max_pages)
-    visual_content = extract_visual_content(file_content, max_pages)
-    
-    result = {
-        "text_content": text_content,
-        "visual_content": visual_content
+import tempfile
+
+from tools.extraction_cache import get_extraction_cache
+from instrumentation import get_tracer, span
+
+# Bump whenever extraction output changes, so that cached results are not reused.
+EXTRACTOR_VERSION = "3"
+
+# Page triage: pages with at least this many characters in their text layer don't need OCR...
+TRIAGE_MIN_TEXT_CHARS = 200
+# ...unless they also embed an image at least this large (in pixels), e.g. a scanned exhibit or a chart.
+TRIAGE_LARGE_IMAGE_PIXELS = 250_000
+
+def read_pdf(file_content, max_pages=50, max_workers=None, cache=None):
+    cache = cache or get_extraction_cache()
+    params = {
+        "max_pages": max_pages,
+        "triage_min_text_chars": TRIAGE_MIN_TEXT_CHARS,
+        "triage_large_image_pixels": TRIAGE_LARGE_IMAGE_PIXELS
     }
-    
-    os.makedirs("cache", exist_ok=True)
-    with open(cache_file, 'w') as f:
-        json.dump(result, f)
-    
-    return result
+    with span("pdf.cache_lookup", "cache", bytes=len(file_content)) as s:
+        cache_key = cache.key(file_content, params, EXTRACTOR_VERSION)
+        page_records = cache.get(cache_key)
+        cache_hit = page_records is not None
+        s.set(cache_hit=cache_hit)
+    if not cache_hit:
+        page_records = extract_page_records(file_content, max_pages, max_workers)
+        with span("pdf.cache_write", "cache"):
+            cache.put(cache_key, page_records)
+
+    return {
+        "text_content": "".join(record["text"] for record in page_records),
+        "visual_content": "".join(record["visual"] for record in page_records),
+        "page_triage": [record["triage"] for record in page_records],
+        "pages": [{"page": record["page"], "text": record["text"], "visual": record["visual"]} for record in page_records],
+        "cache_hit": cache_hit
+    }
+
+def read_pdf_file(file_path, max_pages=50, max_workers=None, remove=False):
+    """Runs `read_pdf` on a PDF on disk, deleting the file afterwards if `remove` is set.
+
+    Used as a process-pool task, so that workers are handed a path instead of the PDF's bytes.
+    The spans of the extraction are returned in the content's "trace" (see `Tracer.capture`),
+    and whether it was served from the extraction cache in its "cache_hit", for the parent
+    process to merge.
+    """
+    try:
+        with get_tracer().capture() as spans:
+            with span("pdf.read", "pdf", file=os.path.basename(file_path)):
+                with open(file_path, 'rb') as f:
+                    content = read_pdf(f.read(), max_pages, max_workers)
+        content["trace"] = spans
+        return content
+    finally:
+        if remove:
+            os.remove(file_path)
+
+def extract_page_records(file_content, max_pages, max_workers=None):
+    """Extracts one record (page, text, visual, triage) per page of the first `max_pages` pages."""
+    with span("pdf.text_layer", "pdf") as s:
+        pages = extract_pages(file_content, max_pages)
+        s.set(items=len(pages))
+
+    # Only rasterize and OCR the pages whose text layer is missing or incomplete.
+    with span("pdf.triage", "pdf"):
+        page_triage = [triage_page(page) for page in pages]
+    ocr_pages = [t["page"] for t in page_triage if t["path"] == "ocr"]
+    with span("pdf.ocr", "pdf", items=len(ocr_pages)):
+        visual_by_page = ocr_pages_content(file_content, max_pages, max_workers, pages=ocr_pages)
+
+    return [{
+        "page": page["page"],
+        "text": page["text"],
+        "visual": visual_by_page.get(page["page"], ""),
+        "triage": triage
+    } for page, triage in zip(pages, page_triage)]
 
 def extract_text(file_content, max_pages):
+    return "".join(page["text"] for page in extract_pages(file_content, max_pages))
+
+def extract_pages(file_content, max_pages):
+    """Reads the text layer and image statistics of the first `max_pages` pages, in a single pass."""
     reader = PyPDF2.PdfReader(BytesIO(file_content))
-    text = ""
+    pages = []
     for i, page in enumerate(reader.pages):
         if i >= max_pages:
             break
-        text += page.extract_text()
-    return text
-
-def extract_visual_content(file_content, max_pages):
-    images = convert_from_bytes(file_content, last_page=max_pages)
-    visual_content = ""
-    for i, image in enumerate(images):
-        image_np = np.array(image)
-        gray = cv2.cvtColor(image_np, cv2.COLOR_RGB2GRAY)
-        
-        # OCR for text in images
-        text = pytesseract.image_to_string(gray)
-        visual_content += f"Page {i+1} Image Text:\n{text}\n"
-        
-        # Basic shape detection (for charts/tables)
-        edges = cv2.Canny(gray, 50, 150, apertureSize=3)
-        lines = cv2.HoughLines(edges, 1, np.pi/180, 200)
-        if lines is not None:
-            visual_content += f"Page {i+1} contains potential charts/tables.\n"
-    
-    return visual_content
\ No newline at end of file
+        image_sizes = _image_sizes(page.get("/Resources"))
+        pages.append({
+            "page": i + 1,
+            "text": page.extract_text() or "",
+            "image_count": len(image_sizes),
+            "largest_image_pixels": max(image_sizes, default=0)
+        })
+    return pages
+
+def _image_sizes(resources, depth=0):
+    """Returns the pixel areas of the images a page draws, without decoding them."""
+    sizes = []
+    if resources is None or depth > 2:
+        return sizes
+    xobjects = resources.get_object().get("/XObject")
+    if xobjects is None:
+        return sizes
+    xobjects = xobjects.get_object()
+    for name in xobjects:
+        xobject = xobjects[name].get_object()
+        subtype = xobject.get("/Subtype")
+        if subtype == "/Image":
+            sizes.append(int(xobject.get("/Width", 0)) * int(xobject.get("/Height", 0)))
+        elif subtype == "/Form":
+            sizes.extend(_image_sizes(xobject.get("/Resources"), depth + 1))
+    return sizes
+
+def triage_page(page):
+    """Classifies a page as "text" (born-digital), "scanned" or "mixed" (text plus large figures).
+
+    Returns the classification and the extraction path the page takes: "text_layer" for
+    text-native pages, "ocr" for everything else.
+    """
+    text_chars = len(page["text"].strip())
+    if text_chars < TRIAGE_MIN_TEXT_CHARS:
+        kind = "scanned"
+    elif page["largest_image_pixels"] >= TRIAGE_LARGE_IMAGE_PIXELS:
+        kind = "mixed"
+    else:
+        kind = "text"
+    return {
+        "page": page["page"],
+        "kind": kind,
+        "path": "text_layer" if kind == "text" else "ocr",
+        "text_chars": text_chars,
+        "image_count": page["image_count"]
+    }
+
+def extract_visual_content(file_content, max_pages, max_workers=None, max_in_flight=None, pages=None):
+    """OCRs the first `max_pages` pages of a PDF (or only the 1-based `pages`) into one string, in page order."""
+    visual_by_page = ocr_pages_content(file_content, max_pages, max_workers, max_in_flight, pages)
+    return "".join(visual_by_page[page] for page in sorted(visual_by_page))
+
+def ocr_pages_content(file_content, max_pages, max_workers=None, max_in_flight=None, pages=None):
+    """OCRs the first `max_pages` pages of a PDF (or only the 1-based `pages`), spreading them over a process pool.
+
+    Each worker rasterizes and OCRs a single page at a time, and at most `max_in_flight`
+    pages (default: twice the number of workers) are being processed at once, so the
+    rasterized document is never held in memory as a whole.
+
+    Returns:
+        dict: The visual content of each processed page, by page number.
+    """
+    if pages is None:
+        pages = range(1, min(max_pages, len(PyPDF2.PdfReader(BytesIO(file_content)).pages)) + 1)
+    pages = [page for page in pages if page <= max_pages]
+    if not pages:
+        return {}
+    max_workers = min(max_workers or os.cpu_count() or 1, len(pages))
+    max_in_flight = max_in_flight or 2 * max_workers
+
+    # Workers render pages from a file on disk instead of receiving the PDF bytes per task.
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as pdf_file:
+        pdf_file.write(file_content)
+    try:
+        if max_workers == 1:
+            _init_page_worker(pdf_file.name, set_thread_limit=False)
+            page_results = dict(_process_page(page) for page in pages)
+        else:
+            page_results = _process_pages_in_pool(pdf_file.name, pages, max_workers, max_in_flight)
+    finally:
+        os.remove(pdf_file.name)
+
+    return page_results
+
+def _process_pages_in_pool(pdf_path, pages, max_workers, max_in_flight):
+    page_results = {}
+    pages = iter(pages)
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_page_worker, initargs=(pdf_path,)) as pool:
+        in_flight = set()
+        for page in pages:
+            in_flight.add(pool.submit(_process_page, page))
+            if len(in_flight) >= max_in_flight:
+                break
+        while in_flight:
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                page, content = future.result()
+                page_results[page] = content
+                next_page = next(pages, None)
+                if next_page is not None:
+                    in_flight.add(pool.submit(_process_page, next_page))
+    return page_results
+
+_worker_pdf_path = None
+
+def _init_page_worker(pdf_path, set_thread_limit=True):
+    global _worker_pdf_path
+    _worker_pdf_path = pdf_path
+    if set_thread_limit:
+        # One Tesseract thread per worker process; the pool already provides the parallelism.
+        os.environ["OMP_THREAD_LIMIT"] = "1"
+
+def _process_page(page_number):
+    """Rasterizes and OCRs one (1-based) page of the worker's PDF. Returns (page_number, content)."""
+    # Imported on first OCR only: text-layer pages, and processes that never OCR, don't pay for them
+    import cv2
+    import pytesseract
+    from pdf2image import convert_from_path
+
+    image = convert_from_path(_worker_pdf_path, first_page=page_number, last_page=page_number)[0]
+    image_np = np.array(image)
+    gray = cv2.cvtColor(image_np, cv2.COLOR_RGB2GRAY)
+
+    # OCR for text in images
+    text = pytesseract.image_to_string(gray)
+    content = f"Page {page_number} Image Text:\n{text}\n"
+
+    # Basic shape detection (for charts/tables)
+    edges = cv2.Canny(gray, 50, 150, apertureSize=3)
+    lines = cv2.HoughLines(edges, 1, np.pi/180, 200)
+    if lines is not None:
+        content += f"Page {page_number} contains potential charts/tables.\n"
+
+    return page_number, content
@@ -0,0 +1,69 @@
+import unittest
+import sys
+import os
+import tempfile
+import numpy as np
+
+# Add the parent directory to the Python path to allow importing from tools
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.chunk_store import ChunkStore, ChunkStoreWriter
+
+class TestChunkStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.investment_dir = self.tmp_dir.name
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write_store(self):
+        writer = ChunkStoreWriter()
+        # Two files with the same name, in different folders
+        first = writer.add_document('drive-id-1', 'Exhibit A.pdf', path='Legal/Exhibit A.pdf')
+        writer.add_chunks(first, 'text', ['Job creation', 'Escrow terms'], np.eye(3)[:2] * 2)
+        writer.add_chunks(first, 'visual', ['Page 1 Image Text:\nOrg chart'], np.eye(3)[2:])
+        second = writer.add_document('drive-id-2', 'Exhibit A.pdf', path='Financial/Exhibit A.pdf')
+        writer.add_chunks(second, 'text', ['Prix de l’unité: 800 000 $'], np.ones((1, 3)), pages=[(3, 4)])
+        website = writer.add_document('https://example.com/deal', 'https://example.com/deal', doc_type='website')
+        writer.add_chunks(website, 'text', ['Website chunk'], np.ones((1, 3)))
+        writer.write(self.investment_dir)
+        return ChunkStore.open(self.investment_dir)
+
+    def test_round_trip_keeps_equally_named_documents_apart(self):
+        store = self.write_store()
+
+        first, second = store.document('drive-id-1'), store.document('drive-id-2')
+        self.assertEqual(list(store.chunks(first)), ['Job creation', 'Escrow terms'])
+        self.assertEqual(list(store.chunks(first, 'visual')), ['Page 1 Image Text:\nOrg chart'])
+        self.assertEqual(list(store.chunks(second)), ['Prix de l’unité: 800 000 $'])
+        self.assertEqual(store.pages(second), [(3, 4)])
+        self.assertEqual(store.document('https://example.com/deal')['key'], 'example.com_deal')
+
+        # Text chunks come first, then visual ones; embeddings are normalized and memory-mapped
+        self.assertEqual(store.text_rows, 4)
+        self.assertEqual(store.row_range(first, 'visual'), (4, 5))
+        self.assertIsInstance(store.embeddings, np.memmap)
+        np.testing.assert_allclose(np.linalg.norm(store.embeddings, axis=1), 1.0, rtol=1e-6)
+
+    def test_rewrite_carries_documents_over_and_keeps_the_previous_generation(self):
+        old = self.write_store()
+        writer = ChunkStoreWriter('float16')
+        writer.copy_document(old, old.document('drive-id-2'))
+        writer.write(self.investment_dir)
+        self.assertTrue(os.path.isdir(old.store_dir)) # Readers of the previous generation keep working
+
+        store = ChunkStore.open(self.investment_dir)
+        self.assertIsNone(store.document('drive-id-1'))
+        self.assertEqual(list(store.chunks(store.document('drive-id-2'))), ['Prix de l’unité: 800 000 $'])
+        self.assertEqual(store.embeddings.dtype, np.float16)
+        generations = [d for d in os.listdir(self.investment_dir) if d.startswith('chunk_store-')]
+        self.assertEqual(len(generations), 2)
+
+        ChunkStoreWriter().write(self.investment_dir) # Removes the first generation
+        generations = [d for d in os.listdir(self.investment_dir) if d.startswith('chunk_store-')]
+        self.assertEqual(len(generations), 2)
+        self.assertNotIn(os.path.basename(old.store_dir), generations)
+
+if __name__ == '__main__':
+    unittest.main()
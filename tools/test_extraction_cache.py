@@ -0,0 +1,75 @@
+import unittest
+import sys
+import os
+import time
+import tempfile
+
+# Add the parent directory to the Python path to allow importing from tools
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.extraction_cache import ExtractionCache
+
+PAGES = [
+    {"page": 1, "text": "Subscription Booklet", "visual": "", "triage": {"page": 1, "kind": "text"}},
+    {"page": 2, "text": "", "visual": "Page 2 Image Text:\nExhibit A\n", "triage": {"page": 2, "kind": "scanned"}},
+]
+
+class TestExtractionCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = ExtractionCache(self.tmp_dir.name, max_bytes=10 * 1024 ** 2)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_round_trip_and_stats(self):
+        key = ExtractionCache.key(b"%PDF-1.4 test", {"max_pages": 50}, "1")
+        self.assertIsNone(self.cache.get(key))
+
+        self.cache.put(key, PAGES)
+        self.assertEqual(self.cache.get(key), PAGES)
+        self.assertTrue(os.path.isdir(os.path.join(self.tmp_dir.name, key[:2], key[2:4], key)))
+        self.assertEqual(self.cache.stats()["hits"], 1)
+        self.assertEqual(self.cache.stats()["misses"], 1)
+
+    def test_key_depends_on_params_and_version(self):
+        content = b"%PDF-1.4 test"
+        key = ExtractionCache.key(content, {"max_pages": 50}, "1")
+        self.assertNotEqual(key, ExtractionCache.key(content, {"max_pages": 10}, "1"))
+        self.assertNotEqual(key, ExtractionCache.key(content, {"max_pages": 50}, "2"))
+        self.assertEqual(key, ExtractionCache.key(content, {"max_pages": 50}, "1"))
+
+    def test_evicts_least_recently_used(self):
+        keys = [ExtractionCache.key(bytes([i]), {}, "1") for i in range(3)]
+        for key in keys:
+            self.cache.put(key, PAGES)
+            time.sleep(0.01)
+        entry_size = self.cache.size() // 3
+
+        # Touch the first entry so that the second one is the least recently used.
+        self.cache.get(keys[0])
+        self.cache.max_bytes = 2 * entry_size
+        self.cache.evict()
+
+        self.assertIsNotNone(self.cache.get(keys[0]))
+        self.assertIsNone(self.cache.get(keys[1]))
+        self.assertIsNotNone(self.cache.get(keys[2]))
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+
+    def test_scans_only_over_the_cap_and_removes_orphans(self):
+        orphan = os.path.join(self.tmp_dir.name, ".tmp", "crashed-writer")
+        os.makedirs(orphan)
+        os.utime(orphan, (time.time() - 2 * 3600,) * 2)
+        self.cache.put(ExtractionCache.key(b"first", {}, "1"), PAGES) # First write: scans
+        self.assertFalse(os.path.exists(orphan))
+
+        scans = []
+        self.cache.evict = lambda: scans.append(True)
+        self.cache.put(ExtractionCache.key(b"second", {}, "1"), PAGES)
+        self.assertEqual(scans, []) # Under the cap
+        self.cache.max_bytes = 1
+        self.cache.put(ExtractionCache.key(b"third", {}, "1"), PAGES)
+        self.assertEqual(scans, [True])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,27 @@
+import unittest
+import sys
+import os
+import numpy as np
+
+# Add the parent directory to the Python path to allow importing from tools
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.knowledge_base import KnowledgeBaseIndex, index_version
+
+class TestKnowledgeBase(unittest.TestCase):
+    def test_version_changes_with_text_and_parameters(self):
+        version = index_version("EB-5 basics", "all-MiniLM-L6-v2", None, 32, 1)
+        self.assertEqual(version, index_version("EB-5 basics", "all-MiniLM-L6-v2", None, 32, 1))
+        self.assertNotEqual(version, index_version("EB-5 basics.", "all-MiniLM-L6-v2", None, 32, 1))
+        self.assertNotEqual(version, index_version("EB-5 basics", "all-mpnet-base-v2", None, 32, 1))
+        self.assertNotEqual(version, index_version("EB-5 basics", "all-MiniLM-L6-v2", 128, 32, 1))
+
+    def test_search_returns_most_similar_chunks_first(self):
+        embeddings = np.array([[1, 0], [0, 1], [0.6, 0.8]], dtype=np.float32)
+        index = KnowledgeBaseIndex("eb5_program", "v", ["TEA", "Jobs", "Regional centers"], embeddings)
+        results = index.search(np.array([0, 1], dtype=np.float32), top_k=2)
+        self.assertEqual([chunk for _, chunk in results], ["Jobs", "Regional centers"])
+        self.assertEqual(len(index.search(np.array([1, 0], dtype=np.float32), top_k=10)), 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+import sys
+import os
+import time
+import tempfile
+
+# Add the parent directory to the Python path to allow importing from tools
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.web_scraper import PageCache, WebScraper, extract_text
+
+class TestWebScraper(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = PageCache(self.tmp_dir.name, fresh_seconds=60)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_fresh_pages_are_served_from_the_cache(self):
+        self.cache.put("https://example.com/rc", "Regional center", etag='"v1"')
+        scraper = WebScraper(cache=self.cache)
+        self.assertEqual(scraper.scrape("https://example.com/rc"), "Regional center")
+        self.assertEqual(scraper.stats()['cache_hits'], 1)
+        self.assertEqual(scraper.stats()['fetches'], 0)
+
+    def test_stale_pages_keep_their_validators(self):
+        entry = self.cache.put("https://example.com/rc", "Regional center", etag='"v1"', last_modified="Mon, 01 Jan 2024")
+        entry['fetched'] = time.time() - 120
+        self.assertFalse(self.cache.is_fresh(entry))
+        entry = self.cache.touch(entry)
+        self.assertTrue(self.cache.is_fresh(entry))
+        self.assertEqual(self.cache.get("https://example.com/rc")['etag'], '"v1"')
+
+    def test_extracts_paragraphs_lists_and_tables(self):
+        try:
+            text = extract_text("""<html><body><script>var x;</script><h1>Project</h1><p>Hotel  development.</p>
+                <ul><li>TEA: yes</li><li>Jobs: 120</li></ul>
+                <table><tr><th>Tranche</th><th>Amount</th></tr><tr><td><p>A</p></td><td>$800,000</td></tr></table>
+                </body></html>""")
+        except ImportError:
+            self.skipTest("Neither lxml nor BeautifulSoup is installed")
+        self.assertEqual(text, "Project\nHotel development.\n- TEA: yes\n- Jobs: 120\nTranche | Amount\nA | $800,000")
+
+    def test_pages_rejected_by_lxml_fall_back_to_beautifulsoup(self):
+        try:
+            import lxml.etree, bs4
+        except ImportError:
+            self.skipTest("lxml and BeautifulSoup are not both installed")
+        html = '<?xml version="1.0" encoding="utf-8"?><html><body><p>Loan terms</p></body></html>'
+        self.assertEqual(extract_text(html), "Loan terms")
+        self.assertEqual(extract_text(""), "")
+
+    def test_fetches_then_revalidates_with_a_conditional_get(self):
+        try:
+            import httpx
+            extract_text("<p>x</p>")
+        except ImportError:
+            self.skipTest("httpx, or lxml / BeautifulSoup, is not installed")
+        requests = []
+        def handler(request):
+            requests.append(request)
+            if request.headers.get('if-none-match') == '"v1"':
+                return httpx.Response(304)
+            return httpx.Response(200, headers={'content-type': 'text/html', 'etag': '"v1"',
+                                                'last-modified': 'Mon, 01 Jan 2024 00:00:00 GMT'},
+                                  content=b"<html><body><p>Job creation report</p></body></html>")
+
+        cache = PageCache(self.tmp_dir.name, fresh_seconds=0) # Every page is stale, so revalidated
+        scraper = WebScraper(cache=cache, transport=httpx.MockTransport(handler))
+        self.assertEqual(scraper.scrape("https://example.com/jobs"), "Job creation report")
+        self.assertEqual(cache.get("https://example.com/jobs")['etag'], '"v1"')
+        self.assertNotIn('if-none-match', requests[0].headers)
+
+        self.assertEqual(scraper.scrape("https://example.com/jobs"), "Job creation report")
+        self.assertEqual(requests[1].headers['if-none-match'], '"v1"')
+        self.assertEqual(requests[1].headers['if-modified-since'], 'Mon, 01 Jan 2024 00:00:00 GMT')
+        self.assertEqual(scraper.stats(), {'fetches': 2, 'cache_hits': 0, 'not_modified': 1, 'failures': 0})
+
+if __name__ == '__main__':
+    unittest.main()
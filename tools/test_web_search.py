@@ -0,0 +1,58 @@
+import unittest
+import sys
+import os
+import tempfile
+
+# Add the parent directory to the Python path to allow importing from tools
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.web_search import WebSearch, WebSearchError, normalize_query
+
+class FixtureBackend:
+    """Search backend returning numbered results, and counting its calls."""
+    name = "fixture"
+
+    def __init__(self, available=10):
+        self.available = available
+        self.calls = []
+
+    def search(self, query, num):
+        self.calls.append((query, num))
+        if query == "fail":
+            raise WebSearchError("status code 500")
+        return [{'title': f"{query} {i}", 'link': f"https://example.com/{i}", 'snippet': "", 'position': i}
+                for i in range(1, min(num, self.available) + 1)]
+
+class TestWebSearch(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_path = os.path.join(self.tmp_dir.name, "search.sqlite")
+        self.backend = FixtureBackend()
+        self.web_search = WebSearch(self.backend, cache_path=self.cache_path, rate=1000, burst=1000)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_normalized_queries_are_cached_across_instances(self):
+        self.assertEqual(len(self.web_search.search("Acme Regional  Center", 3)), 3)
+        rerun = WebSearch(self.backend, cache_path=self.cache_path, rate=1000, burst=1000)
+        self.assertEqual(len(rerun.search("acme regional center", 5)), 5)
+        self.assertEqual(self.backend.calls, [("acme regional center", 6)])
+        self.assertEqual(normalize_query(" A\tB "), "a b")
+
+    def test_more_results_than_cached_refetches(self):
+        self.web_search.search("acme", 6)
+        self.assertEqual(len(self.web_search.search("acme", 10)), 10)
+        self.assertEqual(len(self.web_search.search("acme", 8)), 8)
+        self.assertEqual(self.backend.calls, [("acme", 6), ("acme", 10)])
+
+    def test_batch_shares_identical_searches(self):
+        results = self.web_search.search_many(["acme", "fail", "acme", "beta"], n_results=2)
+        self.assertEqual(list(results), ["acme", "fail", "beta"])
+        self.assertEqual([r['title'] for r in results["beta"]], ["beta 1", "beta 2"])
+        self.assertIsInstance(results["fail"], WebSearchError)
+        self.assertEqual(self.web_search.search("BETA", 2), results["beta"])
+        self.assertEqual(len(self.backend.calls), 3)
+
+if __name__ == '__main__':
+    unittest.main()
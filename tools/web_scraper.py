@@ -1,12 +1,293 @@
-import requests
-from bs4 import BeautifulSoup
+import os
+import json
+import time
+import uuid
+import asyncio
+import hashlib
+import logging
+import threading
+from urllib.parse import urlsplit
+
+import config
+from instrumentation import span
+
+logger = logging.getLogger(__name__)
+
+PARSER_VERSION = 1 # Bump when extract_text changes, to re-extract cached pages
+BLOCK_TAGS = ('p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'li', 'table', 'pre', 'blockquote')
+USER_AGENT = "Mozilla/5.0 (compatible; eb5-investor-research/2.0)"
+
+_scraper = None
+_scraper_lock = threading.Lock()
+
+
+class ScrapeError(Exception):
+    """Raised when a page can't be fetched (error status, timeout, unsupported content...)."""
+
+
+def get_web_scraper():
+    """Returns the process-wide `WebScraper`, shared by the agents' tool and preprocessing."""
+    global _scraper
+    with _scraper_lock:
+        if _scraper is None:
+            _scraper = WebScraper()
+        return _scraper
+
 
 def scrape_website(url):
+    """Returns the text of the page at `url` (paragraphs, headings, lists and tables). Raises ScrapeError."""
+    return get_web_scraper().scrape(url)
+
+
+def scrape_many(urls):
+    """Scrapes `urls` concurrently. Returns {url: text, or the exception}, in order."""
+    return get_web_scraper().scrape_many(urls)
+
+
+def _clean(text):
+    return " ".join(text.split())
+
+
+def _render_block(tag, text, rows):
+    """Renders a block element, given its text or (for tables) the text of its rows' cells."""
+    if tag == 'table':
+        return "\n".join(" | ".join(cells) for cells in rows if any(cells))
+    if tag == 'li':
+        return f"- {text}" if text else ""
+    return text
+
+
+def _extract_lxml(html):
+    import lxml.html
+    tree = lxml.html.document_fromstring(html)
+    for element in tree.xpath('//script|//style|//noscript|//template'):
+        element.drop_tree()
+    blocks = []
+    for element in tree.iter(*BLOCK_TAGS):
+        # Nested blocks (e.g. paragraphs in a table) are part of their outermost block
+        if any(ancestor.tag in BLOCK_TAGS for ancestor in element.iterancestors()):
+            continue
+        rows = [[_clean(cell.text_content()) for cell in row.iter('th', 'td')] for row in element.iter('tr')]
+        blocks.append(_render_block(element.tag, _clean(element.text_content()), rows))
+    return "\n".join(block for block in blocks if block)
+
+
+def _extract_bs4(html):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, 'html.parser')
+    for element in soup(['script', 'style', 'noscript', 'template']):
+        element.decompose()
+    blocks = []
+    for element in soup.find_all(BLOCK_TAGS):
+        if element.find_parent(BLOCK_TAGS):
+            continue
+        rows = [[_clean(cell.get_text(" ")) for cell in row.find_all(['th', 'td'])] for row in element.find_all('tr')]
+        blocks.append(_render_block(element.name, _clean(element.get_text(" ")), rows))
+    return "\n".join(block for block in blocks if block)
+
+
+def extract_text(html):
+    """Extracts the text of an HTML page, one line per block: paragraphs, headings, list items and table rows.
+
+    Uses lxml when it's installed (several times faster), else BeautifulSoup's html.parser,
+    which also takes the pages lxml rejects (empty documents, text with an encoding declaration).
+    """
+    try:
+        import lxml.etree
+    except ImportError:
+        return _extract_bs4(html)
     try:
-        response = requests.get(url)
-        soup = BeautifulSoup(response.content, 'html.parser')
-        # Extract text from paragraphs as an example
-        text = ' '.join([p.get_text() for p in soup.find_all('p')])
+        return _extract_lxml(html)
+    except (ValueError, lxml.etree.ParserError):
+        return _extract_bs4(html)
+
+
+class PageCache:
+    """
+    On-disk cache of scraped pages: the extracted text and the validators (ETag, Last-Modified) of each URL.
+
+    A page fetched less than `fresh_seconds` ago is served as is. After that, it's
+    revalidated with a conditional GET, and reused if the server answers 304 Not Modified.
+    Entries are written to a temporary file and renamed into place.
+    """
+
+    def __init__(self, root=None, fresh_seconds=None):
+        self.root = root or config.SCRAPER_CACHE_DIR
+        self.fresh_seconds = config.SCRAPER_CACHE_FRESH_SECONDS if fresh_seconds is None else fresh_seconds
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, url):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.root, key[:2], f"{key}.json")
+
+    def get(self, url):
+        """Returns the cached entry of `url` (url, text, etag, last_modified, fetched), or None."""
+        try:
+            with open(self._path(url), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if entry.get('parser_version') != PARSER_VERSION:
+            return None
+        return entry
+
+    def is_fresh(self, entry):
+        return time.time() - entry['fetched'] < self.fresh_seconds
+
+    def put(self, url, text, etag=None, last_modified=None):
+        entry = {'url': url, 'text': text, 'etag': etag, 'last_modified': last_modified,
+                 'fetched': time.time(), 'parser_version': PARSER_VERSION}
+        path = self._path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+        return entry
+
+    def touch(self, entry):
+        """Marks a revalidated entry as fresh again."""
+        return self.put(entry['url'], entry['text'], entry['etag'], entry['last_modified'])
+
+
+class WebScraper:
+    """
+    Scraping engine shared by the agents' `WebScraperTool` and preprocessing.
+
+    Pages are fetched by one asyncio event loop, in a background thread, through a
+    pooled HTTP client (httpx): at most `config.SCRAPER_MAX_CONNECTIONS` at once and
+    `config.SCRAPER_PER_HOST_CONNECTIONS` per host, each with connect / read timeouts
+    and an overall deadline, so a slow site fails instead of hanging a crew. Pages are
+    cached (see `PageCache`); the text is extracted in the calling threads.
+    """
+
+    def __init__(self, cache=None, max_connections=None, per_host=None, timeout=None, transport=None):
+        """
+        Args:
+            cache (PageCache, optional): The page cache. Defaults to one in `config.SCRAPER_CACHE_DIR`.
+            max_connections (int, optional): Defaults to `config.SCRAPER_MAX_CONNECTIONS`.
+            per_host (int, optional): Defaults to `config.SCRAPER_PER_HOST_CONNECTIONS`.
+            timeout (float, optional): Overall deadline of a page, in seconds. Defaults to `config.SCRAPER_TOTAL_TIMEOUT`.
+            transport (httpx.AsyncBaseTransport, optional): Replaces the network, e.g. an `httpx.MockTransport` in tests.
+        """
+        self.cache = cache or PageCache()
+        self.max_connections = max_connections or config.SCRAPER_MAX_CONNECTIONS
+        self.per_host = per_host or config.SCRAPER_PER_HOST_CONNECTIONS
+        self.timeout = timeout or config.SCRAPER_TOTAL_TIMEOUT
+        self.transport = transport
+        self._loop = None
+        self._client = None
+        self._host_limits = {} # host -> asyncio.Semaphore, only used in the loop
+        self._lock = threading.Lock()
+        self.fetches = 0
+        self.cache_hits = 0
+        self.not_modified = 0
+        self.failures = 0
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                import httpx
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="web-scraper", daemon=True).start()
+                timeout = httpx.Timeout(config.SCRAPER_READ_TIMEOUT, connect=config.SCRAPER_CONNECT_TIMEOUT)
+                limits = httpx.Limits(max_connections=self.max_connections,
+                                      max_keepalive_connections=self.max_connections)
+                self._client = httpx.AsyncClient(timeout=timeout, limits=limits, follow_redirects=True,
+                                                 headers={'User-Agent': USER_AGENT}, transport=self.transport)
+            return self._loop
+
+    async def _fetch(self, url, entry):
+        """Returns (status, html, etag, last_modified) of `url`, revalidating the validators of its cached `entry`."""
+        headers = {}
+        if entry is not None:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        host = urlsplit(url).netloc
+        limit = self._host_limits.setdefault(host, asyncio.Semaphore(self.per_host))
+        async with limit:
+            async with self._client.stream('GET', url, headers=headers) as response:
+                if response.status_code == 304:
+                    return 304, None, None, None
+                if response.status_code >= 400:
+                    raise ScrapeError(f"Error scraping {url}: status code {response.status_code}")
+                content_type = response.headers.get('content-type', 'text/html')
+                if 'html' not in content_type and not content_type.startswith('text/'):
+                    raise ScrapeError(f"Error scraping {url}: unsupported content type {content_type}")
+                content = bytearray()
+                async for data in response.aiter_bytes():
+                    content.extend(data)
+                    if len(content) > config.SCRAPER_MAX_BYTES:
+                        raise ScrapeError(f"Error scraping {url}: page larger than {config.SCRAPER_MAX_BYTES} bytes")
+                html = bytes(content).decode(response.encoding or 'utf-8', errors='replace')
+                if 'html' not in content_type:
+                    html = f"<pre>{html}</pre>"
+                return response.status_code, html, response.headers.get('etag'), response.headers.get('last-modified')
+
+    async def _fetch_with_deadline(self, url, entry):
+        try:
+            return await asyncio.wait_for(self._fetch(url, entry), self.timeout)
+        except asyncio.TimeoutError:
+            raise ScrapeError(f"Error scraping {url}: no response within {self.timeout}s")
+
+    def _finish(self, url, entry, fetched):
+        status, html, etag, last_modified = fetched
+        if status == 304:
+            if entry is None: # Not a conditional request, so the server shouldn't answer 304
+                raise ScrapeError(f"Error scraping {url}: unexpected 304 Not Modified")
+            self._count('not_modified')
+            return self.cache.touch(entry)['text']
+        text = extract_text(html)
+        self.cache.put(url, text, etag, last_modified)
         return text
-    except Exception as e:
-        return f"Error scraping {url}: {str(e)}"
\ No newline at end of file
+
+    def scrape(self, url):
+        """Returns the text of the page at `url`, from the cache when fresh. Raises ScrapeError."""
+        return self.scrape_many([url], raise_errors=True)[url]
+
+    def scrape_many(self, urls, raise_errors=False):
+        """Scrapes `urls` concurrently (within the connection limits).
+
+        Returns:
+            dict: {url: text, or the exception if `raise_errors` is False}, in the order of `urls`.
+        """
+        with span("web_scraper.scrape", "io", items=len(urls)) as s:
+            return self._scrape_many(urls, raise_errors, s)
+
+    def _scrape_many(self, urls, raise_errors, s):
+        results, entries, futures = {}, {}, {}
+        for url in dict.fromkeys(urls):
+            entry = self.cache.get(url)
+            if entry is not None and self.cache.is_fresh(entry):
+                self._count('cache_hits')
+                s.set(cache_hit=s.attributes.get('cache_hit', 0) + 1)
+                results[url] = entry['text']
+                continue
+            entries[url] = entry
+            self._count('fetches')
+            futures[url] = asyncio.run_coroutine_threadsafe(self._fetch_with_deadline(url, entry), self._ensure_loop())
+
+        for url, future in futures.items():
+            try:
+                fetched = future.result()
+                s.set(bytes=s.attributes.get('bytes', 0) + len(fetched[1] or ""))
+                results[url] = self._finish(url, entries[url], fetched)
+            except Exception as e:
+                self._count('failures')
+                logger.warning(f"Error scraping {url}: {e}")
+                if raise_errors:
+                    raise e if isinstance(e, ScrapeError) else ScrapeError(f"Error scraping {url}: {e}") from e
+                results[url] = e
+        return {url: results[url] for url in dict.fromkeys(urls)}
+
+    def stats(self):
+        with self._lock:
+            return {'fetches': self.fetches, 'cache_hits': self.cache_hits,
+                    'not_modified': self.not_modified, 'failures': self.failures}
@@ -1,8 +1,9 @@
 from crewai_tools import BaseTool
 from typing import Type, Any
 from pydantic.v1 import BaseModel, Field
-import requests
-from bs4 import BeautifulSoup
+
+from instrumentation import traced_tool_run
+from tools.web_scraper import get_web_scraper, ScrapeError
 
 class WebScraperToolSchema(BaseModel):
     """Input for WebScraperTool."""
@@ -10,16 +11,14 @@ class WebScraperToolSchema(BaseModel):
 
 class WebScraperTool(BaseTool):
     name: str = "Web Scraper"
-    description: str = "Scrapes text content from a given website URL."
+    description: str = "Scrapes text content (paragraphs, headings, lists and tables) from a given website URL."
     args_schema: Type[BaseModel] = WebScraperToolSchema
 
+    @traced_tool_run
     def _run(self, **kwargs: Any) -> Any:
         url = kwargs.get("url")
+        # Shared with every agent and crew: pooled, cached and time-limited (see tools/web_scraper.py)
         try:
-            response = requests.get(url)
-            soup = BeautifulSoup(response.content, 'html.parser')
-            # Extract text from all paragraphs
-            text = ' '.join([p.get_text() for p in soup.find_all('p')])
-            return text
-        except Exception as e:
-            return f"Error scraping {url}: {str(e)}"
\ No newline at end of file
+            return get_web_scraper().scrape(url) or f"No text found at {url}"
+        except ScrapeError as e:
+            return str(e)
@@ -0,0 +1,247 @@
+import os
+import json
+import time
+import random
+import hashlib
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import config
+from instrumentation import span
+from llm_cache.store import ResponseStore
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+BATCH_WORKERS = 4 # concurrent backend calls of a batch (still subject to the rate limit)
+
+_web_search = None
+_web_search_lock = threading.Lock()
+
+
+class WebSearchError(Exception):
+    """Raised when the search backend can't be reached or keeps failing."""
+
+
+def normalize_query(query):
+    """Returns the cache key form of a query: lowercased, with collapsed whitespace."""
+    return " ".join(str(query).lower().split())
+
+
+def get_web_search():
+    """Returns the process-wide `WebSearch`, so that every agent and crew shares its cache and rate limit.
+
+    The endpoint can be set with the EB5_WEB_SEARCH_URL environment variable (e.g. a local
+    fixture server speaking Serper's API, for tests).
+    """
+    global _web_search
+    with _web_search_lock:
+        if _web_search is None:
+            _web_search = WebSearch(SerperBackend(os.getenv("EB5_WEB_SEARCH_URL", config.WEB_SEARCH_URL)))
+        return _web_search
+
+
+class TokenBucket:
+    """Rate limiter: allows `burst` calls at once, then `rate` calls per second. Thread-safe."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a call is allowed. Returns the seconds waited."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+class SerperBackend:
+    """
+    Search backend for Serper's API (or any server implementing it).
+
+    Requests go through a pooled session, with a timeout, and are retried with
+    exponential backoff on connection errors, timeouts, 429 and 5xx responses.
+    Results are normalized to dicts with a title, link, snippet and position.
+    """
+
+    name = "serper"
+
+    def __init__(self, url=None, api_key=None, timeout=None, max_retries=None):
+        # Imported here, so that other backends (and the cache) don't need requests
+        import requests
+        from requests.adapters import HTTPAdapter
+        self.url = url or config.WEB_SEARCH_URL
+        self.api_key = api_key or os.getenv('SERPER_API_KEY')
+        self.timeout = timeout or config.WEB_SEARCH_TIMEOUT
+        self.max_retries = config.WEB_SEARCH_MAX_RETRIES if max_retries is None else max_retries
+        self._requests = requests
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=BATCH_WORKERS * 2)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+    def search(self, query, num):
+        """Returns up to `num` normalized results for `query`. Raises WebSearchError on failure."""
+        headers = {'X-API-KEY': self.api_key or "", 'Content-Type': 'application/json'}
+        payload = json.dumps({"q": query, "num": num})
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self._session.post(self.url, headers=headers, data=payload, timeout=self.timeout)
+                if response.status_code == 200:
+                    return self.normalize(response.json())[:num]
+                error = f"status code {response.status_code}"
+                if response.status_code not in RETRY_STATUS_CODES:
+                    break
+            except self._requests.RequestException as e:
+                error = str(e)
+            if attempt < self.max_retries:
+                delay = 0.5 * 2 ** attempt + random.uniform(0, 0.25)
+                logger.warning(f"Web search '{query}' failed ({error}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+        raise WebSearchError(f"Unable to fetch results ({error})")
+
+    @staticmethod
+    def normalize(json_response):
+        results = []
+        for result in json_response.get('organic', []):
+            results.append({
+                'title': result.get('title', 'No title'),
+                'link': result.get('link', 'No link available'),
+                'snippet': result.get('snippet', 'No snippet available'),
+                'position': result.get('position', len(results) + 1),
+            })
+        return results
+
+    def close(self):
+        self._session.close()
+
+
+class WebSearch:
+    """
+    Cached, rate-limited web search, shared by every agent and crew.
+
+    - Results are cached on disk (SQLite, with a TTL and a size limit) by normalized
+      query, so repeated searches (by another agent of the crew, another crew, or a
+      rerun) don't call the backend. A search for more results than cached refetches.
+    - Concurrent searches for the same query wait for a single backend call.
+    - Backend calls go through a token bucket (`config.WEB_SEARCH_RATE` per second).
+
+    The backend is pluggable: any object with a `name` and a `search(query, num)`
+    method returning a list of result dicts.
+    """
+
+    def __init__(self, backend, cache_path=None, ttl=None, rate=None, burst=None):
+        """
+        Args:
+            backend: The search backend (e.g. `SerperBackend`).
+            cache_path (str, optional): The cache database. Defaults to `config.WEB_SEARCH_CACHE_PATH`.
+            ttl (float, optional): Seconds results stay valid. Defaults to `config.WEB_SEARCH_CACHE_TTL_DAYS`.
+            rate (float, optional): Backend calls per second. Defaults to `config.WEB_SEARCH_RATE`.
+            burst (int, optional): Backend calls allowed at once. Defaults to `config.WEB_SEARCH_BURST`.
+        """
+        if ttl is None and config.WEB_SEARCH_CACHE_TTL_DAYS is not None:
+            ttl = config.WEB_SEARCH_CACHE_TTL_DAYS * 24 * 3600
+        self.backend = backend
+        self.cache = ResponseStore(cache_path or config.WEB_SEARCH_CACHE_PATH, ttl=ttl,
+                                   max_bytes=config.WEB_SEARCH_CACHE_MAX_BYTES)
+        self.limiter = TokenBucket(rate or config.WEB_SEARCH_RATE, burst or config.WEB_SEARCH_BURST)
+        self._lock = threading.Lock()
+        self._in_flight = {} # cache key -> Future of the results
+        self.searches = 0
+        self.cache_hits = 0
+        self.shared = 0 # searches that waited for an identical search in flight
+        self.backend_calls = 0
+        self.rate_limited_seconds = 0.0
+
+    def _key(self, query):
+        return hashlib.sha256(f"{self.backend.name}\0{normalize_query(query)}".encode("utf-8")).hexdigest()
+
+    def search(self, query, n_results=None):
+        """Returns up to `n_results` result dicts (title, link, snippet, position) for `query`."""
+        n = max(1, min(int(n_results or config.WEB_SEARCH_DEFAULT_RESULTS), config.WEB_SEARCH_MAX_RESULTS))
+        key = self._key(query)
+        with self._lock:
+            self.searches += 1
+
+        with span("web_search.cache_lookup", "cache") as s:
+            cached = self.cache.get(key)
+            cached = json.loads(cached) if cached is not None else None
+            # Fewer results than fetched means there are no more
+            hit = cached is not None and (n <= cached['num'] or len(cached['results']) < cached['num'])
+            s.set(cache_hit=hit)
+        if hit:
+            with self._lock:
+                self.cache_hits += 1
+            return cached['results'][:n]
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self._in_flight[key] = Future()
+            else:
+                self.shared += 1
+        if not owner:
+            results, num = future.result()
+            if n <= num or len(results) < num:
+                return results[:n]
+            return self.search(query, n) # The search in flight asked for fewer results
+
+        try:
+            num = max(n, config.WEB_SEARCH_DEFAULT_RESULTS)
+            waited = self.limiter.acquire()
+            with self._lock:
+                self.backend_calls += 1
+                self.rate_limited_seconds += waited
+            with span("web_search.backend", "io", backend=self.backend.name, rate_limited_ms=waited * 1000) as s:
+                results = self.backend.search(normalize_query(query), num)
+                s.set(items=len(results))
+            self.cache.put(key, self.backend.name, json.dumps({'query': query, 'num': num, 'results': results}))
+            future.set_result((results, num))
+            return results[:n]
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def search_many(self, queries, n_results=None):
+        """Searches several queries concurrently. Returns {query: results, or the WebSearchError}, in order."""
+        results = {}
+        with ThreadPoolExecutor(max_workers=BATCH_WORKERS) as executor:
+            futures = {query: executor.submit(self.search, query, n_results) for query in dict.fromkeys(queries)}
+        for query, future in futures.items():
+            try:
+                results[query] = future.result()
+            except WebSearchError as e:
+                results[query] = e
+        return results
+
+    def stats(self):
+        with self._lock:
+            return {
+                'searches': self.searches,
+                'cache_hits': self.cache_hits,
+                'shared': self.shared,
+                'backend_calls': self.backend_calls,
+                'rate_limited_seconds': round(self.rate_limited_seconds, 3),
+            }
+
+
+def format_results(results):
+    """Renders result dicts for an agent."""
+    return "\n".join(f"Title: {r['title']}\nSnippet: {r['snippet']}\nLink: {r['link']}\n" for r in results)
@@ -1,20 +1,23 @@
 from crewai_tools import BaseTool
 # NOTE: Alternative implementation could be using "from langchain.tools import tool"
 
-import os
-import requests
-import json
-from typing import Type, Any
+import logging
+from typing import Type, Any, Optional
 from dotenv import load_dotenv
 from pydantic.v1 import BaseModel, Field
 
+from instrumentation import traced_tool_run
+from tools.web_search import get_web_search, format_results, WebSearchError
+
 # Load environment variables
-load_dotenv('secrets/.env') ## for os.getenv('SERPER_API_KEY') below
+load_dotenv('secrets/.env') ## for os.getenv('SERPER_API_KEY') in tools/web_search.py
+
+logger = logging.getLogger(__name__)
 
 class WebSearchToolSchema(BaseModel):
     """Input for WebSearchTool."""
     search_query: str = Field(..., description="Mandatory search query to search the internet.")
-    n_results: str = Field(..., description="Optional param to customize the number of desired results.")
+    n_results: Optional[int] = Field(None, description="Optional param to customize the number of desired results.")
 
 class WebSearchTool(BaseTool):
     name: str = "Web Search"
@@ -22,6 +25,7 @@ class WebSearchTool(BaseTool):
     args_schema: Type[BaseModel] = WebSearchToolSchema
     n_results: int = 6
 
+    @traced_tool_run
     def _run(self, **kwargs: Any) -> Any:
         query = kwargs.get('search_query')
         if query is None:
@@ -30,33 +34,15 @@ class WebSearchTool(BaseTool):
                 print("[WebSearchTool] ERROR: No query specified for searching!")
                 return
 
-        n = kwargs.get('n_results')
-
-        # TODO: Actually use "n" to return the number of results the agent asked for.
-        print(f"Parsed n to be {n}.")
-        
-        api_key = os.getenv('SERPER_API_KEY')
-        url = "https://google.serper.dev/search"
-        payload = json.dumps({"q": query})
-        headers = {
-            'X-API-KEY': api_key,
-            'Content-Type': 'application/json'
-        }
-        response = requests.post(url, headers=headers, data=payload)
-        
-        if response.status_code == 200:
-            return self._parse_results(response.json())
-        else:
-            return f"Error: Unable to fetch results (Status code: {response.status_code})"
-
-    def _parse_results(self, json_response):
-        organic_results = json_response.get('organic', [])
-        parsed_results = []
-        
-        for result in organic_results[:3]:  # Limiting to top 3 results
-            title = result.get('title', 'No title')
-            snippet = result.get('snippet', 'No snippet available')
-            link = result.get('link', 'No link available')
-            parsed_results.append(f"Title: {title}\nSnippet: {snippet}\nLink: {link}\n")
-        
-        return "\n".join(parsed_results)
\ No newline at end of file
+        try:
+            n = int(kwargs.get('n_results') or self.n_results)
+        except (TypeError, ValueError):
+            n = self.n_results
+
+        # Shared by every agent and crew: cached, deduplicated and rate limited
+        try:
+            results = get_web_search().search(query, n)
+        except WebSearchError as e:
+            logger.error(f"Web search '{query}' failed: {e}")
+            return f"Error: {e}"
+        return format_results(results) or "No results found."